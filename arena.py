@@ -1,223 +1,831 @@
-#!/usr/bin/env python3
-import subprocess, sys
-import hasamiShogi
-import pickle
-import pygame
-import time
-
-CELL_SIZE = 60
-MARGIN = 40
-DELAY = 0.3     # seconds
-
-def init_display(nameB, nameW):
-    pygame.init()
-    size = hasamiShogi.BOARD_SIZE * CELL_SIZE + 2 * MARGIN
-    screen = pygame.display.set_mode((size, size))
-    pygame.display.set_caption(f"{nameB} (B) vs {nameW} (W)")
-    return screen
-
-def draw_board(screen, board):
-    screen.fill((200,200,200))
-    
-    # Draw board cells
-    for r in range(len(board)):
-        for c in range(len(board)):
-            x, y = MARGIN + c*CELL_SIZE, MARGIN + r*CELL_SIZE
-            rect = pygame.Rect(x, y, CELL_SIZE, CELL_SIZE)
-            pygame.draw.rect(screen, (255,255,255), rect)
-            pygame.draw.rect(screen, (0,0,0), rect, 1)
-            p = board[r][c]
-            if p == hasamiShogi.BLACK:
-                pygame.draw.circle(screen, (0,0,0), rect.center, CELL_SIZE//2-5)
-            elif p == hasamiShogi.WHITE:
-                pygame.draw.circle(screen, (255,255,255), rect.center, CELL_SIZE//2-5)
-                pygame.draw.circle(screen, (0,0,0), rect.center, CELL_SIZE//2-5, 2)
-    
-    # Draw coordinate labels
-    font = pygame.font.Font(None, 24)
-    
-    # Column labels (0-8)
-    for c in range(len(board)):
-        x = MARGIN + c*CELL_SIZE + CELL_SIZE//2
-        # Top
-        text = font.render(str(c), True, (0,0,0))
-        text_rect = text.get_rect(center=(x, MARGIN//2))
-        screen.blit(text, text_rect)
-        # Bottom
-        text = font.render(str(c), True, (0,0,0))
-        text_rect = text.get_rect(center=(x, MARGIN + len(board)*CELL_SIZE + MARGIN//2))
-        screen.blit(text, text_rect)
-    
-    # Row labels (0-8)
-    for r in range(len(board)):
-        y = MARGIN + r*CELL_SIZE + CELL_SIZE//2
-        # Left
-        text = font.render(str(r), True, (0,0,0))
-        text_rect = text.get_rect(center=(MARGIN//2, y))
-        screen.blit(text, text_rect)
-        # Right
-        text = font.render(str(r), True, (0,0,0))
-        text_rect = text.get_rect(center=(MARGIN + len(board)*CELL_SIZE + MARGIN//2, y))
-        screen.blit(text, text_rect)
-    
-    pygame.display.flip()
-
-class Engine:
-    def send(self, line): pass
-    def recv(self): return None
-    def close(self): pass
-
-class ProcessEngine(Engine):
-    def __init__(self, cmd):
-        self.p = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
-    def send(self, line):
-        self.p.stdin.write(line + "\n"); self.p.stdin.flush()
-    def recv(self):
-        return self.p.stdout.readline().strip()
-    def close(self):
-        self.p.kill()
-
-class ManualEngine(Engine):
-    def __init__(self, color):
-        self.color = color
-    def send(self, line):
-        if line == "OK?":
-            name = input("Enter name: ").strip()
-            self._last = name
-        elif line == "BOARD":
-            print("\n  " + " ".join(map(str, range(hasamiShogi.BOARD_SIZE))))
-            for i,row in enumerate(arena.board):
-                print(f"{i} " + " ".join(row))
-        elif line == "Black":
-            print("Black")
-            while True:
-                mv = input(f"[Manual {self.color}] enter move r1c1r2c2: ").strip()
-                try:
-                    parse_moves(mv)
-                    self._last = mv
-                    break
-                except:
-                    print("Failed")                
-        elif line == "White":
-            print("White")
-        elif "GAME_OVER" in line:
-            print(line)
-        else:
-            # prompt user for move
-            mv = input(f"[Manual {self.color}] enter move r1c1r2c2: ").strip()
-            try:
-                parse_moves(mv)
-            except:
-                print("Failed")
-            self._last = mv
-                
-        # ignore COLOR and GAME_OVER
-    def recv(self):
-        return getattr(self, "_last", "")
-    def close(self):
-        pass
-
-def make_engine(arg, color):
-    if arg.lower()=="manual":
-        return ManualEngine(color)
-    else:
-        return ProcessEngine(arg.split())
-
-def in_bounds(r1, c1, r2, c2):
-    return all(0 <= v < hasamiShogi.BOARD_SIZE for v in (r1, c1, r2, c2))
-
-def parse_moves(s):
-    s = s.strip()
-    if len(s) != 4 or not s.isdigit():
-        raise ValueError("Move must be 4 digits, e.g. '1234'")
-    r1, c1, r2, c2 = map(int, s)
-    if not in_bounds(r1, c1, r2, c2):
-        raise ValueError("Move out of range")
-    return r1, c1, r2, c2
-
-def run_arena(black_arg, white_arg, max_moves=500):
-    global arena
-    arena = hasamiShogi.HasamiShogi()
-
-    engines = {
-        hasamiShogi.BLACK: make_engine(black_arg, hasamiShogi.BLACK),
-        hasamiShogi.WHITE: make_engine(white_arg, hasamiShogi.WHITE)
-    }
-    
-    # send COLOR to both
-    for color, eng in engines.items():
-        eng.send(f"OK?")
-        line = eng.recv()
-        eng.name = line
-        if color == hasamiShogi.BLACK:
-            while True:
-                eng.send("Black")
-                try:
-                    firstMv = eng.recv()
-                    nameB = eng.name
-                    r1, c1, r2, c2 = parse_moves(firstMv)
-                    arena.apply_move(r1,c1,r2,c2, hasamiShogi.BLACK)
-                    break
-                except:
-                    print("Invalid move for Black")
-            
-        elif color == hasamiShogi.WHITE:
-            eng.send("White")
-            nameW = eng.name
-    
-    screen = init_display(nameB, nameW)
-
-    for move_num in range(1, max_moves+1):
-        print("")
-        print("")
-        print(arena.serialize())
-        draw_board(screen, arena.board)
-
-        for evt in pygame.event.get():
-            if evt.type == pygame.QUIT:
-                pygame.quit()
-                return
-        time.sleep(DELAY)
-
-        eng = engines[arena.turn]
-        eng.send(f"{arena.last_move[0]}{arena.last_move[1]}{arena.last_move[2]}{arena.last_move[3]}")
-        # eng.send(arena.serialize())
-        # eng.send("YOUR_MOVE")
-        line = eng.recv()
-        try:
-            r1, c1, r2, c2 = parse_moves(line)
-            # r1,c1,r2,c2 = map(int, line.split())
-            arena.apply_move(r1,c1,r2,c2, arena.turn)
-
-        # we should try the move and if it fails, go here
-        except:
-            print(f"{arena.turn} failed to move: '{line}'")
-            winner = hasamiShogi.WHITE if arena.turn==hasamiShogi.BLACK else hasamiShogi.BLACK
-            break
-
-        over = arena.is_game_over()
-        if over:
-            winner = over
-            break
-    else:
-        winner = None  # draw
-
-    # notify GAME_OVER
-    for color, eng in engines.items():
-        if winner is None:
-            result="DRAW"
-        else:
-            result="WIN" if color==winner else "LOSS"
-        eng.send(f"GAME_OVER {result}")
-        eng.close()
-
-    print("Result:", winner or "DRAW")
-    with open("history.pkl", "wb") as f:
-        pickle.dump(arena.history, f)
-    return winner
-
-if __name__=="__main__":
-    if len(sys.argv)!=3:
-        print("Usage: arena.py <black_cmd|manual> <white_cmd|manual>")
-        sys.exit(1)
-    run_arena(sys.argv[1], sys.argv[2])
+#!/usr/bin/env python3
+import subprocess, sys, os
+import ast
+import asyncio
+import csv
+import json
+import importlib.util
+import itertools
+import select
+import hasamiShogi
+import hasamiBitboard
+import pickle
+import time
+try:
+    import pygame
+except ImportError:     # only needed for the board window; --headless runs without it
+    pygame = None
+
+CELL_SIZE = 60
+MARGIN = 40
+DELAY = 0.3     # seconds
+STARTUP_TIMEOUT = 10.0  # seconds an async engine gets to start and answer OK?, apart from --move-time
+last_record = None  # timing statistics of the last game run_arena played (see game_record)
+
+def init_display(nameB, nameW):
+    pygame.init()
+    size = hasamiShogi.BOARD_SIZE * CELL_SIZE + 2 * MARGIN
+    screen = pygame.display.set_mode((size, size))
+    pygame.display.set_caption(f"{nameB} (B) vs {nameW} (W)")
+    return screen
+
+def draw_board(screen, board):
+    screen.fill((200,200,200))
+    
+    # Draw board cells
+    for r in range(len(board)):
+        for c in range(len(board)):
+            x, y = MARGIN + c*CELL_SIZE, MARGIN + r*CELL_SIZE
+            rect = pygame.Rect(x, y, CELL_SIZE, CELL_SIZE)
+            pygame.draw.rect(screen, (255,255,255), rect)
+            pygame.draw.rect(screen, (0,0,0), rect, 1)
+            p = board[r][c]
+            if p == hasamiShogi.BLACK:
+                pygame.draw.circle(screen, (0,0,0), rect.center, CELL_SIZE//2-5)
+            elif p == hasamiShogi.WHITE:
+                pygame.draw.circle(screen, (255,255,255), rect.center, CELL_SIZE//2-5)
+                pygame.draw.circle(screen, (0,0,0), rect.center, CELL_SIZE//2-5, 2)
+    
+    # Draw coordinate labels
+    font = pygame.font.Font(None, 24)
+    
+    # Column labels (0-8)
+    for c in range(len(board)):
+        x = MARGIN + c*CELL_SIZE + CELL_SIZE//2
+        # Top
+        text = font.render(str(c), True, (0,0,0))
+        text_rect = text.get_rect(center=(x, MARGIN//2))
+        screen.blit(text, text_rect)
+        # Bottom
+        text = font.render(str(c), True, (0,0,0))
+        text_rect = text.get_rect(center=(x, MARGIN + len(board)*CELL_SIZE + MARGIN//2))
+        screen.blit(text, text_rect)
+    
+    # Row labels (0-8)
+    for r in range(len(board)):
+        y = MARGIN + r*CELL_SIZE + CELL_SIZE//2
+        # Left
+        text = font.render(str(r), True, (0,0,0))
+        text_rect = text.get_rect(center=(MARGIN//2, y))
+        screen.blit(text, text_rect)
+        # Right
+        text = font.render(str(r), True, (0,0,0))
+        text_rect = text.get_rect(center=(MARGIN + len(board)*CELL_SIZE + MARGIN//2, y))
+        screen.blit(text, text_rect)
+    
+    pygame.display.flip()
+
+class Engine:
+    clock = False   # True if the engine asked for TIME lines in its OK? reply
+    ponder = False  # True if the engine can think on the opponent's time
+    def send(self, line): pass
+    def recv(self, timeout=None): return None
+    def close(self): pass
+    def new_game(self): return False
+
+class ProcessEngine(Engine):
+    def __init__(self, cmd):
+        self.p = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        # stdout is read through our own buffer: an engine may write several
+        # lines at once (info + move), and select() can't see what a file
+        # object has already buffered
+        self._fd = self.p.stdout.fileno()
+        self._buf = b""
+    def send(self, line):
+        self.p.stdin.write(line + "\n"); self.p.stdin.flush()
+    def recv(self, timeout=None):
+        deadline = None if timeout is None else time.perf_counter() + max(timeout, 0)
+        while b"\n" not in self._buf:
+            if deadline is not None:
+                ready, _, _ = select.select([self._fd], [], [], max(deadline - time.perf_counter(), 0))
+                if not ready:
+                    raise TimeoutError
+            chunk = os.read(self._fd, 4096)
+            if not chunk:   # EOF: the engine exited
+                line, self._buf = self._buf, b""
+                return line.decode().strip()
+            self._buf += chunk
+        line, self._buf = self._buf.split(b"\n", 1)
+        return line.decode().strip()
+    def close(self):
+        self.p.kill()
+    def new_game(self, timeout=1.0):
+        """Send NEW_GAME after GAME_OVER; True if the engine answered READY
+        and can play another game in this process."""
+        if self.p.poll() is not None:
+            return False
+        try:
+            self.send("NEW_GAME")
+            return self.recv(timeout) == "READY"
+        except (OSError, ValueError, TimeoutError):   # dead pipe, no select() on pipes (Windows), or no answer
+            return False
+
+class ManualEngine(Engine):
+    def __init__(self, color):
+        self.color = color
+    def send(self, line):
+        if line == "OK?":
+            name = input("Enter name: ").strip()
+            self._last = name
+        elif line == "BOARD":
+            print("\n  " + " ".join(map(str, range(hasamiShogi.BOARD_SIZE))))
+            for i,row in enumerate(arena.board):
+                print(f"{i} " + " ".join(row))
+        elif line == "Black":
+            print("Black")
+            while True:
+                mv = input(f"[Manual {self.color}] enter move r1c1r2c2: ").strip()
+                try:
+                    parse_moves(mv)
+                    self._last = mv
+                    break
+                except:
+                    print("Failed")                
+        elif line == "White":
+            print("White")
+        elif "GAME_OVER" in line:
+            print(line)
+        else:
+            # prompt user for move
+            mv = input(f"[Manual {self.color}] enter move r1c1r2c2: ").strip()
+            try:
+                parse_moves(mv)
+            except:
+                print("Failed")
+            self._last = mv
+                
+        # ignore COLOR and GAME_OVER
+    def recv(self, timeout=None):
+        return getattr(self, "_last", "")
+    def close(self):
+        pass
+
+_module_ids = itertools.count()
+
+def load_player(path):
+    """Import a player script as a fresh module, so every engine instance
+    gets its own copy of the player's global state."""
+    name = f"_player_{os.path.splitext(os.path.basename(path))[0]}_{next(_module_ids)}"
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def player_adapter(module):
+    """Return (choose(game, color) -> move or None, reset()) for a player module."""
+    if hasattr(module, "choose_best_move"):     # Itoh, Tanimoto
+        def choose(game, color):
+            # the bookkeeping their main loops do around each move
+            module.turn_count = len(game.history)
+            move = module.choose_best_move(game, color)
+            if move is not None:
+                module.last_moves.append(tuple(move))
+                del module.last_moves[:-4]
+            table = getattr(module, "transposition_table", None)
+            if table is not None and len(table) > 50000:
+                table.clear()
+            return move
+        def reset():
+            module.turn_count = 0
+            module.last_moves[:] = []
+        return choose, reset
+    if hasattr(module, "AlphaBetaAI"):          # Yamada
+        ai = module.AlphaBetaAI()
+        return (lambda game, color: ai.choose_move(game)), (lambda: None)
+    if hasattr(module, "find_best_move"):       # Shimizu
+        def choose(game, color):
+            opp = hasamiShogi.WHITE if color == hasamiShogi.BLACK else hasamiShogi.BLACK
+            return module.find_best_move(game, color, opp)
+        return choose, (lambda: None)
+    if hasattr(module, "choose_move"):          # randomPlayer
+        return module.choose_move, (lambda: None)
+    raise ValueError(f"{module.__file__} has no move function the arena knows how to call")
+
+class InProcessEngine(Engine):
+    """Runs a Python player inside the arena process.
+
+    The protocol lines are answered by calling the player's move function
+    on a private game, so no process, pipe or stdin loop is involved.
+    Spec: "inproc:<path> [NAME=value ...]", where each NAME=value
+    overrides a module global, e.g. "inproc:players/Itoh.py MAX_TIME=1".
+    The private game is a game_cls, the same backend as the referee's.
+    """
+    def __init__(self, path, overrides=(), game_cls=hasamiShogi.HasamiShogi):
+        self.module = load_player(path)
+        self.game_cls = game_cls
+        for item in overrides:
+            attr, value = item.split("=", 1)
+            setattr(self.module, attr, ast.literal_eval(value))
+        self.choose, self.reset = player_adapter(self.module)
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        # players that budget their own time take clock updates through allot_time
+        self.clock = hasattr(self.module, "allot_time")
+        self._lines = []
+        self._opening = []
+    def send(self, line):
+        if line == "OK?":
+            # the arena owns the game here, so any player can start from an opening
+            self._lines = [f"{self.name} clock opening" if self.clock else f"{self.name} opening"]
+        elif line.startswith("TIME "):
+            self.module.MAX_TIME = self.module.allot_time(*map(int, line.split()[1:]))
+        elif line.startswith("OPENING"):
+            self._opening = line.split()[1:]
+        elif line in ("Black", "White"):
+            self.color = hasamiShogi.BLACK if line == "Black" else hasamiShogi.WHITE
+            self.game = self.game_cls()
+            for move in self._opening:
+                self.game.apply_move(*parse_moves(move), self.game.turn)
+            self._opening = []
+            self.reset()
+            if self.color == hasamiShogi.BLACK:
+                self._move()
+        elif line == "NEW_GAME":
+            self._lines = ["READY"]
+        elif not line.startswith("GAME_OVER"):
+            opp = hasamiShogi.WHITE if self.color == hasamiShogi.BLACK else hasamiShogi.BLACK
+            self.game.apply_move(*parse_moves(line), opp)
+            self._move()
+    def _move(self):
+        # a player that crashes or has no move answers nothing, like a dead process
+        try:
+            move = self.choose(self.game, self.color)
+            self.game.apply_move(*move, self.color)
+            self._lines = ["".join(map(str, move))]
+        except Exception:
+            self._lines = []
+            return
+        # the search statistics the player would have printed as an info line
+        if hasattr(self.module, "search_nodes"):
+            self._lines.insert(0, f"info depth {self.module.search_depth} nodes {self.module.search_nodes}")
+    def recv(self, timeout=None):
+        return self._lines.pop(0) if self._lines else ""
+    def new_game(self):
+        return True
+
+def make_engine(arg, color, game_cls=hasamiShogi.HasamiShogi):
+    if arg.lower()=="manual":
+        return ManualEngine(color)
+    elif arg.startswith("inproc:"):
+        path, *overrides = arg[len("inproc:"):].split()
+        return InProcessEngine(path, overrides, game_cls)
+    else:
+        return ProcessEngine(arg.split())
+
+class EnginePool:
+    """Keeps engine processes alive between games.
+
+    Engines are parked after GAME_OVER. When the same command is needed
+    again, a parked engine is sent NEW_GAME and reused if it answers
+    READY; otherwise it is closed and a fresh process is started. Parked
+    engines that are never reused simply see EOF after GAME_OVER.
+    """
+    def __init__(self):
+        self.idle = {}
+    def acquire(self, arg, color, game_cls=hasamiShogi.HasamiShogi):
+        idle = self.idle.get(arg, [])
+        while idle:
+            eng = idle.pop()
+            if eng.new_game():
+                if isinstance(eng, InProcessEngine):
+                    eng.game_cls = game_cls
+                return eng
+            eng.close()
+        return make_engine(arg, color, game_cls)
+    def release(self, arg, eng):
+        self.idle.setdefault(arg, []).append(eng)
+    def close(self):
+        for engines in self.idle.values():
+            for eng in engines:
+                eng.close()
+        self.idle.clear()
+
+def in_bounds(r1, c1, r2, c2):
+    return all(0 <= v < hasamiShogi.BOARD_SIZE for v in (r1, c1, r2, c2))
+
+def parse_moves(s):
+    s = s.strip()
+    if len(s) != 4 or not s.isdigit():
+        raise ValueError("Move must be 4 digits, e.g. '1234'")
+    r1, c1, r2, c2 = map(int, s)
+    if not in_bounds(r1, c1, r2, c2):
+        raise ValueError("Move out of range")
+    return r1, c1, r2, c2
+
+class Clock:
+    """Fischer time control: each side starts with `base` seconds and gets
+    `increment` seconds back after every move it completes in time."""
+    def __init__(self, base, increment=0.0):
+        self.remaining = {hasamiShogi.BLACK: float(base), hasamiShogi.WHITE: float(base)}
+        self.increment = increment
+    def punch(self, color, elapsed):
+        """Charge `elapsed` seconds to color; False if its flag fell."""
+        self.remaining[color] -= elapsed
+        if self.remaining[color] < 0:
+            return False
+        self.remaining[color] += self.increment
+        return True
+    def line(self, color):
+        """The TIME line sent to color before it is asked to move:
+        TIME <own ms> <opponent ms> <increment ms>."""
+        opp = hasamiShogi.WHITE if color == hasamiShogi.BLACK else hasamiShogi.BLACK
+        ms = lambda seconds: int(max(seconds, 0) * 1000)
+        return f"TIME {ms(self.remaining[color])} {ms(self.remaining[opp])} {ms(self.increment)}"
+
+def parse_time_control(spec):
+    """'60+0.5' -> (60.0, 0.5): base seconds plus increment per move."""
+    base, _, increment = spec.partition("+")
+    return float(base), float(increment or 0)
+
+FEATURES = ("clock", "ponder", "opening")
+
+def parse_hello(line):
+    """Split an OK? reply into (name, features). An engine advertises
+    protocol extensions by appending their words to its name: 'clock'
+    asks for TIME lines, 'ponder' accepts a PONDER line, 'opening'
+    accepts an OPENING line."""
+    words = line.split(" ")
+    features = set()
+    while len(words) > 1 and words[-1] in FEATURES:
+        features.add(words.pop())
+    return " ".join(words), features
+
+def hello(eng, line):
+    """Record the name and protocol extensions from an engine's OK? reply."""
+    eng.name, features = parse_hello(line)
+    eng.clock = "clock" in features
+    eng.ponder = "ponder" in features
+    eng.opening = "opening" in features
+
+def parse_info(line):
+    """'info depth 6 nodes 120000' -> {'depth': 6, 'nodes': 120000}. Engines may
+    send any number of info lines before a move; unknown or malformed pairs
+    are ignored."""
+    words = line.split()[1:]
+    info = {}
+    for key, value in zip(words[::2], words[1::2]):
+        if value.isdigit():
+            info[key] = int(value)
+    return info
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))]
+
+def move_stats(moves):
+    """Per-engine totals and latency percentiles (ms) for a list of move records."""
+    times = sorted(m["ms"] for m in moves)
+    stats = {"moves": len(times), "total_s": round(sum(times) / 1000, 3)}
+    if times:
+        stats.update(mean_ms=round(sum(times) / len(times), 1), p50_ms=percentile(times, 50),
+                     p90_ms=percentile(times, 90), p99_ms=percentile(times, 99), max_ms=times[-1])
+    nodes = [m["nodes"] for m in moves if "nodes" in m]
+    if nodes:
+        stats.update(nodes=sum(nodes), nps=int(sum(nodes) / max(stats["total_s"], 1e-9)))
+    depths = [m["depth"] for m in moves if "depth" in m]
+    if depths:
+        stats.update(mean_depth=round(sum(depths) / len(depths), 2), max_depth=max(depths))
+    return stats
+
+def game_record(names, winner, moves):
+    """The per-game statistics record written by write_stats."""
+    return {
+        "black": names[hasamiShogi.BLACK], "white": names[hasamiShogi.WHITE],
+        "winner": winner, "plies": len(moves),
+        "stats": {color: move_stats([m for m in moves if m["color"] == color])
+                  for color in (hasamiShogi.BLACK, hasamiShogi.WHITE)},
+        "moves": moves,
+    }
+
+CSV_FIELDS = ["black", "white", "winner", "plies", "color", "engine", "moves", "total_s", "mean_ms",
+              "p50_ms", "p90_ms", "p99_ms", "max_ms", "nodes", "nps", "mean_depth", "max_depth"]
+
+def write_stats(path, record):
+    """Append a game record to path: one JSON object per line, or for a .csv
+    path one summary row per engine (the per-move list is JSON only)."""
+    if not path.endswith(".csv"):
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        return
+    new = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, "a", newline="") as f:
+        writer = csv.DictWriter(f, CSV_FIELDS)
+        if new:
+            writer.writeheader()
+        for color, stats in record["stats"].items():
+            row = {k: record[k] for k in ("black", "white", "winner", "plies")}
+            row.update(stats, color=color, engine=record["black" if color == hasamiShogi.BLACK else "white"])
+            writer.writerow(row)
+
+def run_arena(black_arg, white_arg, max_moves=500, game_cls=hasamiShogi.HasamiShogi, max_repetitions=None,
+              headless=False, pool=None, time_control=None, ponder=False, stats_file=None, opening=None):
+    """Play one game and return the winner, or None for a draw.
+
+    With headless=True there is no window, no DELAY between plies and no
+    board printout: the game ends with a single summary line, and
+    history.pkl is not written. With an EnginePool, engines are taken
+    from and returned to the pool instead of being started and killed.
+    time_control=(base, increment) plays on a Clock: engines that asked
+    for it get a TIME line before each move, and a side whose time runs
+    out loses. With ponder=True, engines that support it are sent PONDER
+    and may think while the opponent is on move. Every move's wall time
+    (and any info depth/nodes the engine sent) goes into last_record,
+    which is also appended to stats_file if given. opening is an even
+    number of moves ("0636", ...) played from the start position before
+    Black is asked to move; both engines must support OPENING. With
+    max_repetitions=N the game is drawn once a position occurs N times;
+    by default there is no repetition rule and only max_moves ends it.
+    """
+    global arena, last_record
+    arena = game_cls()
+    if opening and len(opening) % 2:
+        raise ValueError("an opening must have an even number of plies, so Black is on move after it")
+    for move in opening or ():
+        arena.apply_move(*parse_moves(move), arena.turn)
+    moves = []
+    clock = Clock(*time_control) if time_control else None
+
+    args = {hasamiShogi.BLACK: black_arg, hasamiShogi.WHITE: white_arg}
+    engines = {}
+
+    def request_move(eng, color, line):
+        """Send line to the side to move and return its reply, or None if it
+        ran out of time. Info lines before the move are collected into moves."""
+        start = time.perf_counter()
+        if clock and eng.clock:
+            eng.send(clock.line(color))
+        eng.send(line)
+        info = {}
+        try:
+            while True:
+                reply = eng.recv(clock.remaining[color] - (time.perf_counter() - start) if clock else None)
+                if not reply.startswith("info "):
+                    break
+                info.update(parse_info(reply))
+        except TimeoutError:
+            return None
+        elapsed = time.perf_counter() - start
+        moves.append({"ply": len(moves) + 1, "color": color, "move": reply, "ms": round(elapsed * 1000, 1), **info})
+        if clock and not clock.punch(color, elapsed):
+            return None
+        return reply
+
+    # engines are only handed back to the pool after a clean GAME_OVER; on
+    # any exception (or the window closing) they are killed, never leaked
+    finished = False
+    try:
+        for color, arg in args.items():
+            engines[color] = pool.acquire(arg, color, game_cls) if pool else make_engine(arg, color, game_cls)
+
+        flagged = None
+    
+        for eng in engines.values():
+            eng.send(f"OK?")
+            line = eng.recv()
+            hello(eng, line)
+        # refuse an opening before either side has been asked to move
+        if opening:
+            unsupported = [eng.name for eng in engines.values() if not eng.opening]
+            if unsupported:
+                raise ValueError(f"{', '.join(unsupported)} does not support OPENING")
+
+        # send COLOR to both
+        for color, eng in engines.items():
+            if ponder and eng.ponder:
+                eng.send("PONDER")
+            if opening:
+                eng.send("OPENING " + " ".join(opening))
+            if color == hasamiShogi.BLACK:
+                nameB = eng.name
+                while True:
+                    firstMv = request_move(eng, hasamiShogi.BLACK, "Black")
+                    if firstMv is None:
+                        flagged = hasamiShogi.BLACK
+                        break
+                    try:
+                        r1, c1, r2, c2 = parse_moves(firstMv)
+                        arena.apply_move(r1,c1,r2,c2, hasamiShogi.BLACK)
+                        break
+                    except:
+                        if headless:    # nobody to retry with; let the caller score it
+                            raise
+                        print("Invalid move for Black")
+            
+            elif color == hasamiShogi.WHITE:
+                eng.send("White")
+                nameW = eng.name
+    
+        if not headless:
+            screen = init_display(nameB, nameW)
+
+        winner = None   # a draw unless someone wins, fails to move or runs out of time
+        if flagged:
+            if not headless:
+                print(f"{flagged} lost on time")
+            winner = hasamiShogi.WHITE
+
+        for move_num in range(1, max_moves+1 if not flagged else 0):
+            if not headless:
+                print("")
+                print("")
+                print(arena.serialize())
+                draw_board(screen, arena.board)
+
+                for evt in pygame.event.get():
+                    if evt.type == pygame.QUIT:
+                        pygame.quit()
+                        return
+                time.sleep(DELAY)
+
+            eng = engines[arena.turn]
+            line = request_move(eng, arena.turn,
+                                f"{arena.last_move[0]}{arena.last_move[1]}{arena.last_move[2]}{arena.last_move[3]}")
+            # eng.send(arena.serialize())
+            # eng.send("YOUR_MOVE")
+            if line is None:
+                flagged = arena.turn
+                if not headless:
+                    print(f"{arena.turn} lost on time")
+                winner = hasamiShogi.WHITE if arena.turn==hasamiShogi.BLACK else hasamiShogi.BLACK
+                break
+            try:
+                r1, c1, r2, c2 = parse_moves(line)
+                # r1,c1,r2,c2 = map(int, line.split())
+                arena.apply_move(r1,c1,r2,c2, arena.turn)
+
+            # we should try the move and if it fails, go here
+            except:
+                if not headless:
+                    print(f"{arena.turn} failed to move: '{line}'")
+                winner = hasamiShogi.WHITE if arena.turn==hasamiShogi.BLACK else hasamiShogi.BLACK
+                break
+
+            over = arena.is_game_over()
+            if over:
+                winner = over
+                break
+
+            # the engine counts position occurrences, so this check is O(1)
+            if max_repetitions and arena.repetition_count() >= max_repetitions:
+                if not headless:
+                    print(f"Position repeated {max_repetitions} times: draw")
+                winner = None
+                break
+
+        # notify GAME_OVER
+        for color, eng in engines.items():
+            if winner is None:
+                result="DRAW"
+            else:
+                result="WIN" if color==winner else "LOSS"
+            eng.send(f"GAME_OVER {result}")
+        finished = True
+    finally:
+        for color, eng in engines.items():
+            if finished and pool:
+                pool.release(args[color], eng)
+            else:
+                eng.close()
+
+    last_record = game_record({hasamiShogi.BLACK: nameB, hasamiShogi.WHITE: nameW}, winner, moves)
+    if stats_file:
+        write_stats(stats_file, last_record)
+
+    if headless:
+        print(f"{nameB} (B) vs {nameW} (W): {winner or 'DRAW'} in {len(arena.history)} plies"
+              + (" (time)" if flagged else ""))
+        return winner
+
+    print("Result:", winner or "DRAW")
+    for color, stats in last_record["stats"].items():
+        if stats["moves"]:
+            print(f"  {color}: {stats['moves']} moves, {stats['total_s']}s, "
+                  f"p50 {stats['p50_ms']}ms, p90 {stats['p90_ms']}ms, max {stats['max_ms']}ms")
+    with open("history.pkl", "wb") as f:
+        pickle.dump(arena.history, f)
+    return winner
+
+def run_games(black_arg, white_arg, games, max_moves=500, game_cls=hasamiShogi.HasamiShogi, time_control=None,
+              ponder=False, stats_file=None, max_repetitions=None):
+    """Play games headless back to back and print the score and games/second.
+    Engines that support NEW_GAME stay running between games."""
+    results = {hasamiShogi.BLACK: 0, hasamiShogi.WHITE: 0, None: 0}
+    pool = EnginePool()
+    start = time.perf_counter()
+    try:
+        for _ in range(games):
+            results[run_arena(black_arg, white_arg, max_moves, game_cls, max_repetitions, headless=True, pool=pool,
+                              time_control=time_control, ponder=ponder, stats_file=stats_file)] += 1
+    finally:
+        pool.close()
+    elapsed = time.perf_counter() - start
+    print_summary(results, elapsed)
+    return results
+
+def print_summary(results, elapsed):
+    games = sum(results.values())
+    aborted = results.get("error", 0)
+    print(f"{games} games in {elapsed:.1f}s ({games / elapsed:.2f} games/s): "
+          f"B {results[hasamiShogi.BLACK]}, W {results[hasamiShogi.WHITE]}, draws {results[None]}"
+          + (f", {aborted} aborted" if aborted else ""))
+
+class AsyncProcessEngine:
+    """An engine subprocess driven through asyncio streams, so many games can
+    share one event loop and a slow engine can be timed out."""
+    def __init__(self, cmd):
+        self.cmd = cmd
+        self.name = "?"
+        self.clock = False
+        self.ponder = False
+    async def start(self):
+        self.p = await asyncio.create_subprocess_exec(*self.cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    async def send(self, line):
+        self.p.stdin.write((line + "\n").encode())
+        await self.p.stdin.drain()
+    async def recv(self, timeout=None):
+        line = await asyncio.wait_for(self.p.stdout.readline(), timeout)
+        if not line:    # EOF: the engine exited, which is not the same as a bad move ''
+            raise EOFError
+        return line.decode().strip()
+    async def close(self):
+        if self.p.returncode is None:
+            self.p.kill()
+        await self.p.wait()
+
+async def _play_async(game, engines, move_time, max_moves, max_repetitions, clock=None, ponder=False, moves=None):
+    """Start the engines and referee one game; return (winner, reason).
+    The side that times out, runs out of clock time, crashes or sends an
+    illegal move loses. An engine that cannot be started or does not
+    answer OK? within STARTUP_TIMEOUT aborts the game instead: the winner
+    is then "error", as in tournament.py. Move timings are appended to
+    moves."""
+    moves = [] if moves is None else moves
+    for eng in engines.values():
+        try:
+            await eng.start()
+            await eng.send("OK?")
+            hello(eng, await eng.recv(STARTUP_TIMEOUT))
+            if ponder and eng.ponder:
+                await eng.send("PONDER")
+        except asyncio.TimeoutError:
+            return "error", f"{' '.join(eng.cmd)}: no answer to OK?"
+        except EOFError:
+            return "error", f"{' '.join(eng.cmd)}: exited before answering OK?"
+        except OSError as e:
+            return "error", f"{' '.join(eng.cmd)}: {e}"
+    await engines[hasamiShogi.WHITE].send("White")
+
+    line = "Black"
+    for _ in range(max_moves + 1):
+        color = game.turn
+        opp = hasamiShogi.WHITE if color == hasamiShogi.BLACK else hasamiShogi.BLACK
+        eng = engines[color]
+        limit = move_time
+        if clock:
+            limit = clock.remaining[color] if limit is None else min(limit, clock.remaining[color])
+        start = time.perf_counter()
+        try:
+            if clock and eng.clock:
+                await eng.send(clock.line(color))
+            await eng.send(line)
+            info = {}
+            while True:
+                move = await eng.recv(None if limit is None else limit - (time.perf_counter() - start))
+                if not move.startswith("info "):
+                    break
+                info.update(parse_info(move))
+        except asyncio.TimeoutError:
+            return opp, "timeout"
+        except EOFError:
+            return opp, "EOF: engine exited"
+        except OSError:
+            return opp, "engine died"
+        elapsed = time.perf_counter() - start
+        moves.append({"ply": len(moves) + 1, "color": color, "move": move, "ms": round(elapsed * 1000, 1), **info})
+        if clock and not clock.punch(color, elapsed):
+            return opp, "timeout"
+        try:
+            game.apply_move(*parse_moves(move), color)
+        except Exception:
+            return opp, f"bad move {move!r}"
+
+        over = game.is_game_over()
+        if over:
+            return over, "game over"
+        if max_repetitions and game.repetition_count() >= max_repetitions:
+            return None, "repetition"
+        line = "".join(map(str, game.last_move))
+    return None, "move limit"
+
+async def play_game_async(black_arg, white_arg, move_time=None, max_moves=500,
+                          game_cls=hasamiShogi.HasamiShogi, max_repetitions=None, time_control=None, ponder=False,
+                          stats_file=None):
+    """Async counterpart of run_arena(headless=True) with a per-move time
+    limit of move_time seconds (None for no limit) and an optional
+    (base, increment) clock. Returns the winner, or "error" if the game
+    was aborted because an engine did not start."""
+    moves = []
+    game = game_cls()
+    engines = {
+        hasamiShogi.BLACK: AsyncProcessEngine(black_arg.split()),
+        hasamiShogi.WHITE: AsyncProcessEngine(white_arg.split()),
+    }
+    try:
+        clock = Clock(*time_control) if time_control else None
+        winner, reason = await _play_async(game, engines, move_time, max_moves, max_repetitions, clock, ponder,
+                                           moves)
+        if winner != "error":   # an aborted game has no result; its engines are just killed
+            for color, eng in engines.items():
+                result = "DRAW" if winner is None else ("WIN" if color == winner else "LOSS")
+                try:
+                    await eng.send(f"GAME_OVER {result}")
+                except OSError:
+                    pass
+    finally:
+        for eng in engines.values():
+            if hasattr(eng, "p"):
+                await eng.close()
+    names = engines[hasamiShogi.BLACK].name, engines[hasamiShogi.WHITE].name
+    if winner == "error":
+        print(f"{names[0]} (B) vs {names[1]} (W): aborted ({reason})")
+        return winner
+    if stats_file:
+        write_stats(stats_file, game_record(dict(zip((hasamiShogi.BLACK, hasamiShogi.WHITE), names)),
+                                            winner, moves))
+    print(f"{names[0]} (B) vs {names[1]} (W): {winner or 'DRAW'} in {len(game.history)} plies ({reason})")
+    return winner
+
+async def run_games_async(black_arg, white_arg, games, concurrency=8, move_time=None, max_moves=500,
+                          game_cls=hasamiShogi.HasamiShogi, time_control=None, ponder=False, stats_file=None,
+                          max_repetitions=None):
+    """Play games with up to `concurrency` running at once in this event loop.
+    Aborted games are counted under "error"."""
+    slots = asyncio.Semaphore(concurrency)
+    async def one_game():
+        async with slots:
+            return await play_game_async(black_arg, white_arg, move_time, max_moves, game_cls, max_repetitions,
+                                         time_control=time_control, ponder=ponder, stats_file=stats_file)
+
+    start = time.perf_counter()
+    winners = await asyncio.gather(*(one_game() for _ in range(games)))
+    elapsed = time.perf_counter() - start
+    results = {hasamiShogi.BLACK: 0, hasamiShogi.WHITE: 0, None: 0, "error": 0}
+    for winner in winners:
+        results[winner] += 1
+    print_summary(results, elapsed)
+    return results
+
+if __name__=="__main__":
+    args = sys.argv[1:]
+    game_cls = hasamiShogi.HasamiShogi
+    if "--bitboard" in args:
+        args.remove("--bitboard")
+        game_cls = hasamiBitboard.BitboardHasamiShogi
+    headless = "--headless" in args
+    if headless:
+        args.remove("--headless")
+    ponder = "--ponder" in args
+    if ponder:
+        args.remove("--ponder")
+    options = {"--games": 1, "--move-time": None, "--concurrency": None}
+    for opt in options:
+        if opt in args:
+            i = args.index(opt)
+            options[opt] = float(args[i+1]) if opt == "--move-time" else int(args[i+1])
+            del args[i:i+2]
+            headless = True
+    games = options["--games"]
+    time_control = None
+    if "--time" in args:
+        i = args.index("--time")
+        time_control = parse_time_control(args[i+1])
+        del args[i:i+2]
+    stats_file = None
+    if "--stats" in args:
+        i = args.index("--stats")
+        stats_file = args[i+1]
+        del args[i:i+2]
+    max_repetitions = None
+    if "--max-repetitions" in args:
+        i = args.index("--max-repetitions")
+        max_repetitions = int(args[i+1])
+        del args[i:i+2]
+    if len(args)!=2:
+        print("Usage: arena.py [--bitboard] [--headless] [--games N] [--move-time SEC] [--concurrency N] "
+              "[--time BASE+INC] [--ponder] [--stats FILE.json|FILE.csv] [--max-repetitions N] <black_cmd|inproc:player.py|manual> <white_cmd|inproc:player.py|manual>")
+        sys.exit(1)
+    if options["--move-time"] is not None or options["--concurrency"] is not None:
+        if any(arg.lower() == "manual" or arg.startswith("inproc:") for arg in args):
+            print("--move-time and --concurrency need engine commands, not manual or inproc:")
+            sys.exit(1)
+        asyncio.run(run_games_async(args[0], args[1], games, options["--concurrency"] or 8,
+                                    options["--move-time"], game_cls=game_cls, time_control=time_control,
+                                    ponder=ponder, stats_file=stats_file, max_repetitions=max_repetitions))
+    elif headless:
+        run_games(args[0], args[1], games, game_cls=game_cls, time_control=time_control, ponder=ponder,
+                  stats_file=stats_file, max_repetitions=max_repetitions)
+    elif pygame is None:
+        print("pygame is not installed; use --headless to play without the board window")
+        sys.exit(1)
+    else:
+        run_arena(args[0], args[1], game_cls=game_cls, max_repetitions=max_repetitions, time_control=time_control,
+                  ponder=ponder, stats_file=stats_file)
@@ -0,0 +1,654 @@
+"""
+Bitboard backend for the Hasami Shogi engine.
+
+Each color is stored as an 81-bit Python int (bit r*9+c is square (r,c)).
+Sliding moves, sandwich captures and liberty flood fills work on whole
+bitboards with shifts and masks instead of indexing into a list of lists.
+BitboardHasamiShogi has the same public API and the same rules as
+hasamiShogi.HasamiShogi, so arena.py and the players can use either one.
+It is also an independent implementation to cross-check the list engine
+against. Move generation walks precomputed rays (SLIDES), and the board
+view and piece sets are patched per move rather than rebuilt, so perft and
+Itoh's search run faster than on the list engine; players that scan the
+whole board every node (Yamada) run somewhat slower.
+"""
+from array import array
+from hasamiShogi import (BOARD_SIZE, EMPTY, BLACK, WHITE, DIRECTIONS, NUM_SQUARES, RAYS, ZOBRIST_PIECE,
+                         ZOBRIST_TURN, ZOBRIST_CAPTURES, ZOBRIST_PENDING, CELL_CODES, GameState, encode_move)
+
+FULL = (1 << (BOARD_SIZE * BOARD_SIZE)) - 1
+COL_FIRST = sum(1 << (r * BOARD_SIZE) for r in range(BOARD_SIZE))
+COL_LAST = COL_FIRST << (BOARD_SIZE - 1)
+NOT_FIRST = FULL ^ COL_FIRST
+NOT_LAST = FULL ^ COL_LAST
+
+def shift_down(x):
+    return (x << BOARD_SIZE) & FULL
+
+def shift_up(x):
+    return x >> BOARD_SIZE
+
+def shift_right(x):
+    return (x & NOT_LAST) << 1
+
+def shift_left(x):
+    return (x & NOT_FIRST) >> 1
+
+# same order as DIRECTIONS, and the shift that undoes each one
+SHIFTS = (shift_down, shift_up, shift_right, shift_left)
+BACK_SHIFTS = (shift_up, shift_down, shift_left, shift_right)
+
+def neighbours(x):
+    """All squares orthogonally adjacent to a square in x."""
+    return (((x << BOARD_SIZE) & FULL) | (x >> BOARD_SIZE) |
+            ((x & NOT_LAST) << 1) | ((x & NOT_FIRST) >> 1))
+
+def flood(seed, mask):
+    """Grow seed through orthogonally connected squares of mask."""
+    while True:
+        grown = seed | (neighbours(seed) & mask)
+        if grown == seed:
+            return seed
+        seed = grown
+
+def bit(r, c):
+    return 1 << (r * BOARD_SIZE + c)
+
+def piece_keys(x, color):
+    """XOR of the Zobrist keys of a 'color' piece on every square in x."""
+    key = 0
+    for r, c in squares(x):
+        key ^= ZOBRIST_PIECE[r][c][color]
+    return key
+
+# SLIDES[s]: for a piece on square s, the squares each DIRECTIONS slide
+# passes, nearest first, as (bit, move tuple, move code), so move generation
+# only tests masks and never converts bit positions back to squares
+SLIDES = tuple(tuple(tuple((bit(r2, c2), (r, c, r2, c2), encode_move(r, c, r2, c2)) for r2, c2 in ray)
+                     for ray in RAYS[r][c])
+               for r in range(BOARD_SIZE) for c in range(BOARD_SIZE))
+
+# BETWEEN[s][t]: the squares strictly between s and t when they share a
+# row or column (0 when they are neighbours or not in line)
+BETWEEN = [[0] * NUM_SQUARES for _ in range(NUM_SQUARES)]
+for _s, _slides in enumerate(SLIDES):
+    for _ray in _slides:
+        _mask = 0
+        for _b, _move, _code in _ray:
+            BETWEEN[_s][_code % NUM_SQUARES] = _mask
+            _mask |= _b
+del _s, _slides, _ray, _mask, _b, _move, _code
+
+# SQUARES[s]: the (r, c) of square s
+SQUARES = tuple(divmod(s, BOARD_SIZE) for s in range(NUM_SQUARES))
+
+# ROW_SQUARES[r][m]: the squares of row r whose bits are set in the 9-bit row mask m
+ROW_MASK = (1 << BOARD_SIZE) - 1
+ROW_SQUARES = tuple(tuple(tuple((r, c) for c in range(BOARD_SIZE) if m >> c & 1) for m in range(ROW_MASK + 1))
+                    for r in range(BOARD_SIZE))
+
+def squares(x):
+    """List the (r, c) of every set bit, in row-major order."""
+    result = []
+    r = 0
+    while x:
+        result += ROW_SQUARES[r][x & ROW_MASK]
+        x >>= BOARD_SIZE
+        r += 1
+    return result
+
+# row contents for the board view, keyed by black row mask | white row mask << 9
+_ROW_CELLS = {}
+
+def row_cells(black, white):
+    key = black | white << BOARD_SIZE
+    cells = _ROW_CELLS.get(key)
+    if cells is None:
+        cells = _ROW_CELLS[key] = tuple(BLACK if black >> c & 1 else WHITE if white >> c & 1 else EMPTY
+                                        for c in range(BOARD_SIZE))
+    return cells
+
+class BitboardHasamiShogi:
+    # when True, every local dead-group search is checked against a full scan
+    verify_dead_groups = False
+
+    def __init__(self):
+        first_row = (1 << BOARD_SIZE) - 1
+        self.bits = {BLACK: first_row,
+                     WHITE: first_row << (BOARD_SIZE * (BOARD_SIZE - 1))}
+        # track captures: how many pieces each color has captured
+        self.captures = {BLACK: 0, WHITE: 0}
+        # pending victory condition state
+        self.pending_leader = None
+        self.turn = BLACK
+        self.last_move = None
+        self.history = []
+        # undo records for push_move/pop_move
+        self._undo = []
+        # position key counts for repetition_count
+        self._key_counts = {}
+        # squares whose group may have been left without liberties by its
+        # own mover (see HasamiShogi._suspects)
+        self._suspects = 0
+        self._view = None
+        self._pieces = None
+        # 64-bit position key, the same as HasamiShogi.zobrist
+        self.zobrist = self.compute_zobrist()
+
+    @property
+    def board(self):
+        """Read-only list-of-lists view, built on first use and then patched
+        by every move (see _update_views)."""
+        if self._view is None:
+            black, white = self.bits[BLACK], self.bits[WHITE]
+            view = []
+            for _ in range(BOARD_SIZE):
+                view.append(list(row_cells(black & ROW_MASK, white & ROW_MASK)))
+                black >>= BOARD_SIZE
+                white >>= BOARD_SIZE
+            self._view = view
+        return self._view
+
+    @property
+    def pieces(self):
+        """Squares held by each color, like HasamiShogi.pieces (built on
+        first use and then patched by every move)."""
+        bits = self.bits[BLACK], self.bits[WHITE]
+        if self._pieces is None or self._pieces[0] != bits:
+            self._pieces = bits, {BLACK: set(squares(bits[0])), WHITE: set(squares(bits[1]))}
+        return self._pieces[1]
+
+    def _update_views(self, black, white):
+        """
+        The bitboards were black and white before a change: patch the board
+        view and the piece sets, where built, on just the changed squares.
+        """
+        view, pieces = self._view, self._pieces
+        now_black, now_white = self.bits[BLACK], self.bits[WHITE]
+        if pieces is not None:
+            if pieces[0] == (black, white):
+                self._pieces = (now_black, now_white), pieces[1]
+                pieces = pieces[1]
+            else:
+                pieces = self._pieces = None
+        if view is None and pieces is None:
+            return
+        changed = (black ^ now_black) | (white ^ now_white)
+        while changed:
+            b = changed & -changed
+            changed ^= b
+            square = SQUARES[b.bit_length() - 1]
+            cell = BLACK if now_black & b else WHITE if now_white & b else EMPTY
+            if view is not None:
+                view[square[0]][square[1]] = cell
+            if pieces is not None:
+                if black & b:
+                    pieces[BLACK].discard(square)
+                elif white & b:
+                    pieces[WHITE].discard(square)
+                if cell != EMPTY:
+                    pieces[cell].add(square)
+
+    def set_board(self, board_list):
+        """
+        Set the board state directly for testing.
+        Expects a list of BOARD_SIZE lists/strings, each of length BOARD_SIZE,
+        containing only '.', 'B', or 'W'.
+        """
+        if len(board_list) != BOARD_SIZE:
+            raise ValueError(f"Board must have {BOARD_SIZE} rows")
+        bits = {BLACK: 0, WHITE: 0}
+        for r, row in enumerate(board_list):
+            if len(row) != BOARD_SIZE:
+                raise ValueError(f"Row {r} must have {BOARD_SIZE} columns")
+            for c, cell in enumerate(row):
+                if cell not in (EMPTY, BLACK, WHITE):
+                    raise ValueError(f"Invalid piece '{cell}' at ({r},{c})")
+                if cell != EMPTY:
+                    bits[cell] |= bit(r, c)
+        self.bits = bits
+        self._view = None
+        # track captures: how many pieces each color has captured
+        self.captures = {BLACK: 0, WHITE: 0}
+        # pending victory condition state
+        self.pending_leader = None
+        self.turn = BLACK
+        self._undo = []
+        self._key_counts = {}
+        self._suspects = self._dead_groups(BLACK) | self._dead_groups(WHITE)
+        self.zobrist = self.compute_zobrist()
+
+    def compute_zobrist(self):
+        """Compute the Zobrist key from scratch, see HasamiShogi.compute_zobrist."""
+        key = ZOBRIST_TURN[self.turn] ^ ZOBRIST_PENDING[self.pending_leader]
+        for color in (BLACK, WHITE):
+            key ^= ZOBRIST_CAPTURES[color][self.captures[color]]
+            key ^= piece_keys(self.bits[color], color)
+        return key
+
+    def snapshot(self):
+        """Return the current position as a hasamiShogi.GameState."""
+        state = GameState.__new__(GameState)
+        cells = bytearray(NUM_SQUARES)
+        for color in (BLACK, WHITE):
+            x = self.bits[color]
+            while x:
+                low = x & -x
+                cells[low.bit_length() - 1] = CELL_CODES[color]
+                x ^= low
+        state.cells = cells
+        state.black_captures = self.captures[BLACK]
+        state.white_captures = self.captures[WHITE]
+        state.pending_leader = self.pending_leader
+        state.turn = self.turn
+        state.zobrist = self.zobrist
+        state.suspects = tuple(squares(self._suspects))
+        return state
+
+    def restore(self, state):
+        """Load a GameState, see HasamiShogi.restore."""
+        bits = {BLACK: 0, WHITE: 0}
+        for i, code in enumerate(state.cells):
+            if code:
+                bits[BLACK if code == CELL_CODES[BLACK] else WHITE] |= 1 << i
+        self.bits = bits
+        self._view = None
+        self.captures = {BLACK: state.black_captures, WHITE: state.white_captures}
+        self.pending_leader = state.pending_leader
+        self.turn = state.turn
+        self.zobrist = self.compute_zobrist()
+        if state.suspects is None:
+            self._suspects = self._dead_groups(BLACK) | self._dead_groups(WHITE)
+        else:
+            self._suspects = sum(bit(r, c) for r, c in state.suspects)
+        self._undo = []
+        self._key_counts = {}
+
+    def serialize(self):
+        """Same labelled text board as HasamiShogi.serialize."""
+        lines = []
+        header = '   ' + ' '.join(str(c) for c in range(BOARD_SIZE))
+        lines.append(header)
+        for r, row in enumerate(self.board):
+            lines.append(f"{r}  {' '.join(row)}  {r}")
+        lines.append(header)
+        return '\n'.join(lines)
+
+    def in_bounds(self, r, c):
+        return 0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE
+
+    def _empty(self):
+        return FULL & ~(self.bits[BLACK] | self.bits[WHITE])
+
+    def _between(self, r1, c1, r2, c2):
+        """Mask of the squares strictly between two squares on one line."""
+        return BETWEEN[r1 * BOARD_SIZE + c1][r2 * BOARD_SIZE + c2]
+
+    def is_clear_path(self, r1, c1, r2, c2):
+        """Return True if all squares strictly between (r1,c1) and (r2,c2) are EMPTY."""
+        if r1 != r2 and c1 != c2:
+            return False
+        return not self._between(r1, c1, r2, c2) & (self.bits[BLACK] | self.bits[WHITE])
+
+    def _line_capture_targets(self, me, opp):
+        """Empty squares from which a piece of 'me' would close a line of opp."""
+        mine, theirs = self.bits[me], self.bits[opp]
+        targets = 0
+        for back in BACK_SHIFTS:
+            # opp pieces with an unbroken opp run up to a piece of 'me'
+            run = back(mine) & theirs
+            while True:
+                grown = run | (back(run) & theirs)
+                if grown == run:
+                    break
+                run = grown
+            targets |= back(run)
+        return targets & self._empty()
+
+    def _capture_targets(self, me):
+        """Empty squares where a move of 'me' may capture, see
+        HasamiShogi._capture_targets; every square while a dead group waits."""
+        if self._suspects:
+            return FULL
+        opp = BLACK if me == WHITE else WHITE
+        empty = self._empty()
+        # opp pieces with one empty neighbour, which a move there surrounds
+        one = two = 0
+        for back in BACK_SHIFTS:
+            near = back(empty) & self.bits[opp]
+            two |= one & near
+            one |= near
+        return (neighbours(one & ~two) & empty) | self._line_capture_targets(me, opp)
+
+    def _flanked(self, opp):
+        """Empty squares with opp pieces on both sides along a row or column."""
+        theirs = self.bits[opp]
+        return self._empty() & ((shift_up(theirs) & shift_down(theirs)) |
+                                (shift_left(theirs) & shift_right(theirs)))
+
+    def _suicide_squares(self, me, opp):
+        """Empty squares 'me' may not move to under the no-suicide rule."""
+        flanked = self._flanked(opp)
+        if not flanked or self._has_dead_group(opp):
+            return 0
+        return flanked & ~self._line_capture_targets(me, opp)
+
+    def _has_dead_group(self, color):
+        seeds = self._suspects & self.bits[color]
+        empty = self._empty()
+        while seeds:
+            group = flood(seeds & -seeds, self.bits[color])
+            if not neighbours(group) & empty:
+                return True
+            seeds &= ~group
+        return False
+
+    def has_liberty(self, r, c):
+        """Return True if the group containing (r,c) touches an empty square."""
+        b = bit(r, c)
+        color = BLACK if self.bits[BLACK] & b else WHITE
+        return bool(neighbours(flood(b, self.bits[color])) & self._empty())
+
+    def is_legal_move(self, r1, c1, r2, c2, me):
+        if not (0 <= r1 < BOARD_SIZE and 0 <= c1 < BOARD_SIZE and
+                0 <= r2 < BOARD_SIZE and 0 <= c2 < BOARD_SIZE):
+            return False
+        # one of row and column must change, not both
+        if (r1 == r2) == (c1 == c2):
+            return False
+        opp = BLACK if me == WHITE else WHITE
+        theirs = self.bits[opp]
+        occupied = self.bits[me] | theirs
+        origin, target = r1 * BOARD_SIZE + c1, r2 * BOARD_SIZE + c2
+        dest = 1 << target
+        if not self.bits[me] >> origin & 1 or occupied & dest or BETWEEN[origin][target] & occupied:
+            return False
+        # no suicide, except when capturing
+        if ((theirs & shift_up(dest) and theirs & shift_down(dest)) or
+                (theirs & shift_left(dest) and theirs & shift_right(dest))):
+            return self._would_capture(dest, me, opp)
+        return True
+
+    def _would_capture(self, dest, me, opp):
+        """Read-only capture probe, see HasamiShogi._would_capture."""
+        mine, theirs = self.bits[me], self.bits[opp]
+        for step in SHIFTS:
+            x = step(dest)
+            if x & theirs:
+                while x & theirs:
+                    x = step(x)
+                if x & mine:
+                    return True
+        return self._has_dead_group(opp)
+
+    def capture_from(self, r0, c0, dr, dc, me, opp, removed=None):
+        step = SHIFTS[DIRECTIONS.index((dr, dc))]
+        theirs = self.bits[opp]
+        run = 0
+        x = step(bit(r0, c0))
+        while x & theirs:
+            run |= x
+            x = step(x)
+        if run and x & self.bits[me]:
+            black, white = self.bits[BLACK], self.bits[WHITE]
+            self.bits[opp] = theirs & ~run
+            self.zobrist ^= piece_keys(run, opp)
+            self._update_views(black, white)
+            if removed is not None:
+                removed.extend(squares(run))
+            return bin(run).count('1')
+        return 0
+
+    def remove_dead_groups(self, color, removed=None, near=None):
+        """Go-like capture, see HasamiShogi.remove_dead_groups."""
+        if near is None:
+            dead = self._dead_groups(color)
+        else:
+            dead = self._local_dead_groups(color, bit(*near))
+            if self.verify_dead_groups and dead != self._dead_groups(color):
+                raise AssertionError(f"Local dead-group search near {near} missed groups")
+        if dead:
+            black, white = self.bits[BLACK], self.bits[WHITE]
+            self.bits[color] &= ~dead
+            self.zobrist ^= piece_keys(dead, color)
+            self._update_views(black, white)
+            if removed is not None:
+                removed.extend(squares(dead))
+        # every dead group of this color is gone now
+        other = BLACK if color == WHITE else WHITE
+        self._suspects &= self.bits[other]
+        return bin(dead).count('1')
+
+    def _dead_groups(self, color):
+        """Mask of every square of 'color' whose group has no liberties."""
+        return self._dead_groups_from(color, self.bits[color])
+
+    def _local_dead_groups(self, color, near):
+        seeds = (neighbours(near) | self._suspects) & self.bits[color]
+        return self._dead_groups_from(color, seeds)
+
+    def _dead_groups_from(self, color, seeds):
+        pieces = self.bits[color]
+        empty = self._empty()
+        dead = 0
+        while seeds:
+            group = flood(seeds & -seeds, pieces)
+            if not neighbours(group) & empty:
+                dead |= group
+            seeds &= ~group
+        return dead
+
+    def generate_legal_moves(self, me):
+        """
+        Generate all legal sliding moves for player 'me', in the same order
+        as HasamiShogi.generate_legal_moves.
+        Returns a list of tuples (r1, c1, r2, c2).
+        """
+        return list(self.iter_legal_moves(me))
+
+    def iter_legal_moves(self, me, captures_first=False):
+        """Lazy move generator, see HasamiShogi.iter_legal_moves."""
+        if captures_first:
+            targets = self._capture_targets(me)
+            captures = set()
+            for move in self.iter_legal_moves(me):
+                if bit(move[2], move[3]) & targets and self._capture_mask(*move, me):
+                    captures.add(move)
+                    yield move
+            for move in self.iter_legal_moves(me):
+                if move not in captures:
+                    yield move
+            return
+        opp = BLACK if me == WHITE else WHITE
+        empty = self._empty()
+        allowed = empty & ~self._suicide_squares(me, opp)
+        pieces = self.bits[me]
+        while pieces:
+            low = pieces & -pieces
+            pieces ^= low
+            for ray in SLIDES[low.bit_length() - 1]:
+                for b, move, _ in ray:
+                    if not b & empty:
+                        break
+                    if b & allowed:
+                        yield move
+
+    def generate_legal_move_codes(self, me):
+        """Packed move list, see HasamiShogi.generate_legal_move_codes."""
+        opp = BLACK if me == WHITE else WHITE
+        empty = self._empty()
+        allowed = empty & ~self._suicide_squares(me, opp)
+        codes = []
+        append = codes.append
+        pieces = self.bits[me]
+        while pieces:
+            low = pieces & -pieces
+            pieces ^= low
+            for ray in SLIDES[low.bit_length() - 1]:
+                for b, _, code in ray:
+                    if not b & empty:
+                        break
+                    if b & allowed:
+                        append(code)
+        return array('H', codes)
+
+    def mobility(self, color):
+        """
+        Number of legal moves of 'color', see HasamiShogi.mobility. Slides
+        every piece one step at a time as a single mask; no square can be
+        reached twice from the same direction, so the popcounts add up.
+        """
+        opp = BLACK if color == WHITE else WHITE
+        empty = self._empty()
+        allowed = empty & ~self._suicide_squares(color, opp)
+        pieces = self.bits[color]
+        total = 0
+        for step in SHIFTS:
+            x = step(pieces) & empty
+            while x:
+                total += bin(x & allowed).count('1')
+                x = step(x) & empty
+        return total
+
+    def capture_threats(self, color):
+        """
+        Capture threat map, see HasamiShogi.capture_threats. Only moves onto
+        _capture_targets are tried, which makes a fresh computation cheap
+        enough that this backend does not cache it.
+        """
+        threats = {}
+        targets = self._capture_targets(color)
+        for r1, c1, r2, c2 in self.iter_legal_moves(color):
+            if bit(r2, c2) & targets and self._capture_mask(r1, c1, r2, c2, color):
+                threats.setdefault((r2, c2), []).append((r1, c1))
+        return {square: sorted(origins) for square, origins in threats.items()}
+
+    def captures_for(self, move, color, return_squares=False):
+        """Capture preview without applying the move, see HasamiShogi.captures_for."""
+        if not self.is_legal_move(*move, color):
+            raise ValueError(f"Illegal move: from ({move[0]},{move[1]}) to ({move[2]},{move[3]})")
+        mask = self._capture_mask(*move, color)
+        count = bin(mask).count('1')
+        if return_squares:
+            return count, list(squares(mask))
+        return count
+
+    def _capture_mask(self, r1, c1, r2, c2, me):
+        """Mask of the squares a legal move would capture, without applying it."""
+        opp = BLACK if me == WHITE else WHITE
+        dest = bit(r2, c2)
+        mine = self.bits[me] ^ bit(r1, c1) ^ dest
+        theirs = self.bits[opp]
+        lines = 0
+        for ray in SLIDES[r2 * BOARD_SIZE + c2]:
+            run = 0
+            for b, _, _ in ray:
+                if not b & theirs:
+                    if run and b & mine:
+                        lines |= run
+                    break
+                run |= b
+        theirs &= ~lines
+        empty = FULL & ~(mine | theirs)
+        seeds = (neighbours(dest) | self._suspects) & theirs
+        dead = 0
+        while seeds:
+            group = flood(seeds & -seeds, theirs)
+            if not neighbours(group) & empty:
+                dead |= group
+            seeds &= ~group
+        return lines | dead
+
+    def apply_move(self, r1, c1, r2, c2, me):
+        self._make_move(r1, c1, r2, c2, me)
+
+    def push_move(self, r1, c1, r2, c2, me):
+        """Apply a move and remember how to take it back with pop_move."""
+        self._undo.append(self._make_move(r1, c1, r2, c2, me))
+
+    def pop_move(self):
+        """Undo the most recent push_move, restoring the exact previous state."""
+        (me, black, white, captured, pending_leader,
+         turn, last_move, suspects, zobrist) = self._undo.pop()
+        changed = self.bits[BLACK], self.bits[WHITE]
+        self.bits[BLACK], self.bits[WHITE] = black, white
+        self._update_views(*changed)
+        self.captures[me] = captured
+        self.pending_leader = pending_leader
+        self.turn = turn
+        self.last_move = last_move
+        self._suspects = suspects
+        self.zobrist = zobrist
+        seen = self._key_counts[zobrist] - 1
+        if seen:
+            self._key_counts[zobrist] = seen
+        else:
+            del self._key_counts[zobrist]
+        self.history.pop()
+
+    def _make_move(self, r1, c1, r2, c2, me):
+        """Apply a move and return the record pop_move needs to undo it."""
+        opp = BLACK if me == WHITE else WHITE
+        if not self.is_legal_move(r1, c1, r2, c2, me):
+            raise ValueError(f"Illegal move: from ({r1},{c1}) to ({r2},{c2})")
+        undo = (me, self.bits[BLACK], self.bits[WHITE], self.captures[me],
+                self.pending_leader, self.turn, self.last_move, self._suspects,
+                self.zobrist)
+        self._key_counts[self.zobrist] = self._key_counts.get(self.zobrist, 0) + 1
+        # perform slide
+        dest = bit(r2, c2)
+        self.bits[me] ^= bit(r1, c1) | dest
+        self.zobrist ^= ZOBRIST_PIECE[r1][c1][me] ^ ZOBRIST_PIECE[r2][c2][me]
+        # track captures: sandwiched lines, then surrounded groups
+        mine, theirs = self.bits[me], self.bits[opp]
+        if neighbours(dest) & theirs:
+            for ray in SLIDES[r2 * BOARD_SIZE + c2]:
+                run = 0
+                for b, _, _ in ray:
+                    if not b & theirs:
+                        if run and b & mine:
+                            theirs &= ~run
+                        break
+                    run |= b
+        lines = self.bits[opp] ^ theirs
+        self.bits[opp] = theirs
+        self.zobrist ^= piece_keys(lines, opp)
+        self._update_views(undo[1], undo[2])
+        total = bin(lines).count('1') + self.remove_dead_groups(opp, near=(r2, c2))
+        self.zobrist ^= ZOBRIST_CAPTURES[me][self.captures[me]]
+        self.captures[me] += total
+        self.zobrist ^= ZOBRIST_CAPTURES[me][self.captures[me]]
+        # the mover's own group may now be without liberties
+        empty = self._empty()
+        if not neighbours(dest) & empty and not neighbours(flood(dest, self.bits[me])) & empty:
+            self._suspects |= dest
+
+        # update pending_leader in case of leading 3 captures
+        self.zobrist ^= ZOBRIST_PENDING[self.pending_leader]
+        lead = self.captures[me] - self.captures[opp]
+        if lead >= 3 and self.pending_leader is None:
+            self.pending_leader = me
+        elif lead >= -2 and self.pending_leader == opp:
+            self.pending_leader = None
+        self.zobrist ^= ZOBRIST_PENDING[self.pending_leader]
+
+        self.last_move = (r1, c1, r2, c2)
+        self.zobrist ^= ZOBRIST_TURN[self.turn] ^ ZOBRIST_TURN[opp]
+        self.turn = opp
+        self.history.append(self.last_move)
+        return undo
+
+    def repetition_count(self):
+        """See HasamiShogi.repetition_count."""
+        return self._key_counts.get(self.zobrist, 0) + 1
+
+    def is_game_over(self):
+        # player to play next
+        opp = self.turn
+        # player who just moved
+        me = BLACK if opp == WHITE else WHITE
+        if self.captures[me] >= 5:
+            return me
+        elif self.pending_leader is opp:
+            return self.pending_leader
+        return None
@@ -1,214 +1,983 @@
-import copy
-
-BOARD_SIZE = 9
-EMPTY, BLACK, WHITE = '.', 'B', 'W'
-DIRECTIONS = [(1,0),(-1,0),(0,1),(0,-1)]
-
-class HasamiShogi:
-    def __init__(self):
-        self.board = [[EMPTY]*BOARD_SIZE for _ in range(BOARD_SIZE)]
-        for c in range(BOARD_SIZE):
-            self.board[0][c] = BLACK
-            self.board[-1][c] = WHITE
-        # track captures: how many pieces each color has captured
-        self.captures = {BLACK: 0, WHITE: 0}
-        # pending victory condition state
-        self.pending_leader = None
-        self.turn = BLACK
-        self.history = []
-
-    def set_board(self, board_list):
-        """
-        Set the board state directly for testing.
-        Expects a list of BOARD_SIZE lists/strings, each of length BOARD_SIZE,
-        containing only '.', 'B', or 'W'.
-        """
-        if len(board_list) != BOARD_SIZE:
-            raise ValueError(f"Board must have {BOARD_SIZE} rows")
-        new_board = []
-        for r, row in enumerate(board_list):
-            if len(row) != BOARD_SIZE:
-                raise ValueError(f"Row {r} must have {BOARD_SIZE} columns")
-            row_list = list(row)
-            for c, cell in enumerate(row_list):
-                if cell not in (EMPTY, BLACK, WHITE):
-                    raise ValueError(f"Invalid piece '{cell}' at ({r},{c})")
-            new_board.append(row_list)
-        self.board = new_board
-        # track captures: how many pieces each color has captured
-        self.captures = {BLACK: 0, WHITE: 0}
-        # pending victory condition state
-        self.pending_leader = None
-        self.turn = BLACK
-
-    def serialize(self):
-        """
-        Return a string representation of the board with coordinate labels:
-        - Columns labeled 0..8 at top and bottom
-        - Rows labeled 0..8 on both left and right of each row
-        """
-        lines = []
-        # Top column labels
-        header = '   ' + ' '.join(str(c) for c in range(BOARD_SIZE))
-        lines.append(header)
-        # Board rows with side labels
-        for r in range(BOARD_SIZE):
-            row_str = ' '.join(self.board[r])
-            lines.append(f"{r}  {row_str}  {r}")
-        # Bottom column labels
-        lines.append(header)
-        return '\n'.join(lines)
-
-    def in_bounds(self, r, c):
-        return 0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE
-
-    def is_clear_path(self, r1, c1, r2, c2):
-        """Return True if all squares strictly between (r1,c1) and (r2,c2) are EMPTY."""
-        # must be straight-line
-        if r1 == r2:
-            step = 1 if c2 > c1 else -1
-            for c in range(c1 + step, c2, step):
-                if self.board[r1][c] != EMPTY:
-                    return False
-            return True
-        elif c1 == c2:
-            step = 1 if r2 > r1 else -1
-            for r in range(r1 + step, r2, step):
-                if self.board[r][c1] != EMPTY:
-                    return False
-            return True
-        else:
-            return False
-
-    def is_legal_move(self, r1, c1, r2, c2, me):
-        opp = BLACK if me == WHITE else WHITE
-        # 1. In‑bounds
-        if not (self.in_bounds(r1, c1) and self.in_bounds(r2, c2)):
-            return False
-        # 2. Must be moving your own piece to an empty square
-        if self.board[r1][c1] != me or self.board[r2][c2] != EMPTY:
-            return False
-        # 3. Must move along row or column, and actually move
-        if not ((r1 == r2 and c1 != c2) or (c1 == c2 and r1 != r2)):
-            return False
-        # 4. Path must be clear
-        if not self.is_clear_path(r1, c1, r2, c2):
-            return False
-        # 5. No suicide, except when capturing
-        for dr, dc in DIRECTIONS:
-            r_pos, c_pos = r2 + dr, c2 + dc
-            r_neg, c_neg = r2 - dr, c2 - dc
-            if (self.in_bounds(r_pos, c_pos) and self.in_bounds(r_neg, c_neg) and
-                self.board[r_pos][c_pos] == opp and self.board[r_neg][c_neg] == opp):
-                
-                boardCopy = copy.deepcopy(self.board)
-                total = 0
-                for dr1, dc1 in DIRECTIONS:
-                    total += self.capture_from(r2, c2, dr1, dc1, me, opp)
-                total += self.remove_dead_groups(opp)
-                self.board = copy.deepcopy(boardCopy)
-                if total == 0:
-                    return False
-        return True
-    
-    def capture_from(self, r0, c0, dr, dc, me, opp):
-        r, c = r0 + dr, c0 + dc
-        captured = []
-        while self.in_bounds(r, c) and self.board[r][c] == opp:
-            captured.append((r, c))
-            r += dr; c += dc
-        if self.in_bounds(r, c) and self.board[r][c] == me and captured:
-            for rr, cc in captured:
-                self.board[rr][cc] = EMPTY
-            return len(captured)
-        return 0
-
-    def remove_dead_groups(self, color):
-        # Go-like capture: any connected group of 'color' with no liberties
-        visited = set()
-        dead = []
-        for r in range(BOARD_SIZE):
-            for c in range(BOARD_SIZE):
-                if (r, c) not in visited and self.board[r][c] == color:
-                    # BFS to find the group
-                    queue = [(r, c)]
-                    group = [(r, c)]
-                    visited.add((r, c))
-                    has_liberty = False
-                    while queue:
-                        cr, cc = queue.pop()
-                        for dr, dc in DIRECTIONS:
-                            nr, nc = cr + dr, cc + dc
-                            if self.in_bounds(nr, nc):
-                                if self.board[nr][nc] == EMPTY:
-                                    has_liberty = True
-                                elif self.board[nr][nc] == color and (nr, nc) not in visited:
-                                    visited.add((nr, nc))
-                                    queue.append((nr, nc))
-                                    group.append((nr, nc))
-                    if not has_liberty:
-                        dead.extend(group)
-        # remove dead and return count
-        for (dr, dc) in dead:
-            self.board[dr][dc] = EMPTY
-        return len(dead)
-    
-    def generate_legal_moves(self, me):
-        """
-        Generate all legal sliding moves for player 'me'.
-        Returns a list of tuples (r1, c1, r2, c2).
-        """
-        moves = []
-        for r in range(BOARD_SIZE):
-            for c in range(BOARD_SIZE):
-                if self.board[r][c] == me:
-                    for dr, dc in DIRECTIONS:
-                        nr, nc = r + dr, c + dc
-                        while self.in_bounds(nr, nc) and self.board[nr][nc] == EMPTY:
-                            if self.is_legal_move(r, c, nr, nc, me):
-                                moves.append((r, c, nr, nc))
-                            nr += dr; nc += dc
-        return moves
-
-    def apply_move(self, r1, c1, r2, c2, me):
-        opp = BLACK if me == WHITE else WHITE
-        if not self.is_legal_move(r1, c1, r2, c2, me):
-            raise ValueError(f"Illegal move: from ({r1},{c1}) to ({r2},{c2})")
-        # perform slide
-        self.board[r1][c1] = EMPTY
-        self.board[r2][c2] = me
-        # track captures
-        total = 0
-        for dr, dc in DIRECTIONS:
-            total += self.capture_from(r2, c2, dr, dc, me, opp)
-            #print(self.serialize())
-        total += self.remove_dead_groups(opp)
-        #print(self.serialize())
-        self.captures[me] += total
-        
-        # update pending_leader in case of leading 3 captures
-        cm, co = self.captures[me], self.captures[opp]
-        lead = cm - co
-        if lead >= 3 and self.pending_leader == None:
-            self.pending_leader = me
-        elif lead >= -2 and self.pending_leader == opp:
-            self.pending_leader = None
-
-        # record last mover
-        self.last_move = (r1,c1,r2,c2)
-        self.turn = opp
-
-        self.history.append(self.last_move)
-
-    def is_game_over(self):
-        # player to play next
-        opp = self.turn
-        # player who just moved
-        me = BLACK if opp == WHITE else WHITE
-        cm = self.captures[me]
-        # 1. First to 5 captures
-        if cm >= 5:
-            return me
-        elif self.pending_leader is opp:
-            return self.pending_leader
+import random
+from array import array
+from itertools import product
+
+BOARD_SIZE = 9
+EMPTY, BLACK, WHITE = '.', 'B', 'W'
+DIRECTIONS = [(1,0),(-1,0),(0,1),(0,-1)]
+DIRECTION_INDEX = {d: i for i, d in enumerate(DIRECTIONS)}
+
+def _ray(r, c, dr, dc):
+    squares = []
+    r, c = r + dr, c + dc
+    while 0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE:
+        squares.append((r, c))
+        r += dr; c += dc
+    return tuple(squares)
+
+# Square-indexed lookup tables, built once so the engine's inner loops
+# never need bounds checks:
+#   RAYS[r][c][i]     squares from (r,c) in DIRECTIONS[i], nearest first
+#   NEIGHBOURS[r][c]  orthogonal neighbours of (r,c)
+#   FLANKS[r][c]      per axis, the two squares on opposite sides of (r,c)
+RAYS = [[tuple(_ray(r, c, dr, dc) for dr, dc in DIRECTIONS)
+         for c in range(BOARD_SIZE)] for r in range(BOARD_SIZE)]
+NEIGHBOURS = [[tuple(ray[0] for ray in RAYS[r][c] if ray)
+               for c in range(BOARD_SIZE)] for r in range(BOARD_SIZE)]
+FLANKS = [[tuple((RAYS[r][c][i][0], RAYS[r][c][i + 1][0]) for i in (0, 2)
+                 if RAYS[r][c][i] and RAYS[r][c][i + 1])
+           for c in range(BOARD_SIZE)] for r in range(BOARD_SIZE)]
+
+# Packed moves: from-square * 81 + to-square, where square = r * 9 + c.
+# Every code fits in 16 bits, so move lists can be kept in array('H') and
+# used as plain int dict keys. MOVE_TUPLES[code] is the (r1, c1, r2, c2) form.
+NUM_SQUARES = BOARD_SIZE * BOARD_SIZE
+MOVE_TUPLES = tuple((f // BOARD_SIZE, f % BOARD_SIZE, t // BOARD_SIZE, t % BOARD_SIZE)
+                    for f in range(NUM_SQUARES) for t in range(NUM_SQUARES))
+
+def encode_move(r1, c1, r2, c2):
+    return (r1 * BOARD_SIZE + c1) * NUM_SQUARES + r2 * BOARD_SIZE + c2
+
+def decode_move(code):
+    return MOVE_TUPLES[code]
+
+# Zobrist keys for HasamiShogi.zobrist, with a fixed seed so that every
+# process (and every engine backend) gets the same key for a position
+_zobrist_rng = random.Random(0x4A5A)
+ZOBRIST_PIECE = [[{BLACK: _zobrist_rng.getrandbits(64), WHITE: _zobrist_rng.getrandbits(64)}
+                  for c in range(BOARD_SIZE)] for r in range(BOARD_SIZE)]
+ZOBRIST_TURN = {BLACK: 0, WHITE: _zobrist_rng.getrandbits(64)}
+ZOBRIST_CAPTURES = {color: [0] + [_zobrist_rng.getrandbits(64) for _ in range(BOARD_SIZE * BOARD_SIZE)]
+                    for color in (BLACK, WHITE)}
+ZOBRIST_PENDING = {None: 0, BLACK: _zobrist_rng.getrandbits(64), WHITE: _zobrist_rng.getrandbits(64)}
+
+# one byte per square in GameState.cells
+CELL_CODES = {EMPTY: 0, BLACK: 1, WHITE: 2}
+_TO_CELLS = bytes.maketrans(''.join(CELL_CODES).encode(), bytes(CELL_CODES.values()))
+_FROM_CELLS = bytes.maketrans(bytes(CELL_CODES.values()), ''.join(CELL_CODES).encode())
+_PIECE_CHARS = frozenset(CELL_CODES)
+
+# Packed positions (GameState.pack): 2 bits per square (CELL_CODES, square
+# i in bits 2i..2i+1), the side to move in bit 162 and pending_leader in
+# bits 163-164, as 21 little-endian bytes; then one byte each for the black
+# and white capture counts.
+PACKED_SIZE = 23
+_PACK4 = {bytes(q): q[0] | q[1] << 2 | q[2] << 4 | q[3] << 6 for q in product(range(3), repeat=4)}
+_UNPACK4 = [bytes((b >> shift) & 3 for shift in (0, 2, 4, 6)) for b in range(256)]
+_TURN_CODES = {BLACK: 0, WHITE: 1}
+_PENDING_CODES = {None: 0, BLACK: 1, WHITE: 2}
+_PENDING_FROM_CODE = (None, BLACK, WHITE)
+_CELL_ZOBRIST = [(0, ZOBRIST_PIECE[i // BOARD_SIZE][i % BOARD_SIZE][BLACK],
+                  ZOBRIST_PIECE[i // BOARD_SIZE][i % BOARD_SIZE][WHITE]) for i in range(NUM_SQUARES)]
+
+class GameState:
+    """
+    Compact, cheap-to-copy snapshot of a HasamiShogi position, e.g. for
+    transposition tables. The board is a flat 81-byte bytearray (square
+    r*9+c, see CELL_CODES) and the capture counts are plain ints.
+    Made by HasamiShogi.snapshot() and loaded back with HasamiShogi.restore().
+
+    For storage and exchange, pack()/unpack() convert to and from a
+    PACKED_SIZE-byte string, and to_text()/from_text() to and from one line
+    of text. States hash by their Zobrist key and compare equal when they
+    describe the same position, so both are constant time; edit cells only
+    on a copy() you no longer hash. restore() recomputes the key, so an
+    edited copy still loads correctly.
+    """
+    __slots__ = ('cells', 'black_captures', 'white_captures',
+                 'pending_leader', 'turn', 'zobrist', 'suspects')
+
+    def copy(self):
+        state = GameState.__new__(GameState)
+        state.cells = self.cells[:]
+        state.black_captures = self.black_captures
+        state.white_captures = self.white_captures
+        state.pending_leader = self.pending_leader
+        state.turn = self.turn
+        state.zobrist = self.zobrist
+        # the copy may be edited, so let restore() look for dead groups again
+        state.suspects = None
+        return state
+
+    @property
+    def board(self):
+        """List-of-lists view of the board, like HasamiShogi.board (for draw_board)."""
+        text = self.cells.translate(_FROM_CELLS).decode()
+        return [list(text[r * BOARD_SIZE:(r + 1) * BOARD_SIZE]) for r in range(BOARD_SIZE)]
+
+    @property
+    def captures(self):
+        return {BLACK: self.black_captures, WHITE: self.white_captures}
+
+    def __eq__(self, other):
+        if not isinstance(other, GameState):
+            return NotImplemented
+        return (self.zobrist == other.zobrist and self.cells == other.cells
+                and self.turn == other.turn and self.pending_leader == other.pending_leader
+                and self.black_captures == other.black_captures
+                and self.white_captures == other.white_captures)
+
+    def __hash__(self):
+        return self.zobrist
+
+    def pack(self):
+        """Return the position as PACKED_SIZE bytes."""
+        cells = bytes(self.cells) + bytes(3)
+        packed = bytearray(_PACK4[cells[i:i + 4]] for i in range(0, NUM_SQUARES + 3, 4))
+        packed[-1] |= (_TURN_CODES[self.turn] | _PENDING_CODES[self.pending_leader] << 1) << 2
+        packed.append(self.black_captures)
+        packed.append(self.white_captures)
+        return bytes(packed)
+
+    @classmethod
+    def unpack(cls, data, offset=0):
+        """Read a position written by pack() from data[offset:offset + PACKED_SIZE]."""
+        block = data[offset:offset + PACKED_SIZE]
+        if len(block) != PACKED_SIZE:
+            raise ValueError(f"Packed position must be {PACKED_SIZE} bytes")
+        cells = bytearray(b''.join([_UNPACK4[b] for b in block[:-2]])[:NUM_SQUARES])
+        flags = block[-3] >> 2
+        if 3 in cells or flags >> 1 > 2 or max(block[-2], block[-1]) > NUM_SQUARES:
+            raise ValueError("Corrupt packed position")
+        return cls._build(cells, block[-2], block[-1], _PENDING_FROM_CODE[flags >> 1],
+                          WHITE if flags & 1 else BLACK)
+
+    def to_text(self):
+        """
+        One-line text form: the 81 squares row by row, side to move, black
+        and white capture counts, and pending_leader ('-' for none), e.g.
+        'BBBBBBBBB.........(...)WWWWWWWWW B 0 0 -'.
+        """
+        return (f"{self.cells.translate(_FROM_CELLS).decode()} {self.turn} "
+                f"{self.black_captures} {self.white_captures} {self.pending_leader or '-'}")
+
+    @classmethod
+    def from_text(cls, text):
+        """Parse a position written by to_text()."""
+        fields = text.split()
+        if len(fields) != 5:
+            raise ValueError("Position text must have 5 fields")
+        board, turn, black_captures, white_captures, pending_leader = fields
+        if len(board) != NUM_SQUARES or not _PIECE_CHARS.issuperset(board):
+            raise ValueError(f"Board must be {NUM_SQUARES} characters of '.', 'B' or 'W'")
+        if turn not in _TURN_CODES or pending_leader not in ('-', BLACK, WHITE):
+            raise ValueError(f"Invalid side to move or pending leader in {text!r}")
+        black_captures, white_captures = int(black_captures), int(white_captures)
+        if not (0 <= black_captures <= NUM_SQUARES and 0 <= white_captures <= NUM_SQUARES):
+            raise ValueError(f"Capture counts must be between 0 and {NUM_SQUARES}")
+        return cls._build(bytearray(board.encode().translate(_TO_CELLS)), black_captures,
+                          white_captures, None if pending_leader == '-' else pending_leader, turn)
+
+    @classmethod
+    def _build(cls, cells, black_captures, white_captures, pending_leader, turn):
+        state = cls.__new__(cls)
+        state.cells = cells
+        state.black_captures = black_captures
+        state.white_captures = white_captures
+        state.pending_leader = pending_leader
+        state.turn = turn
+        key = (ZOBRIST_TURN[turn] ^ ZOBRIST_PENDING[pending_leader]
+               ^ ZOBRIST_CAPTURES[BLACK][black_captures] ^ ZOBRIST_CAPTURES[WHITE][white_captures])
+        for i, code in enumerate(cells):
+            if code:
+                key ^= _CELL_ZOBRIST[i][code]
+        state.zobrist = key
+        # worked out by HasamiShogi.restore, which has the flood fill
+        state.suspects = None
+        return state
+
+def pack_positions(states):
+    """Concatenate the packed form of many GameStates into one bytes buffer."""
+    return b''.join([state.pack() for state in states])
+
+def unpack_positions(buffer):
+    """Decode every position in a buffer written by pack_positions."""
+    if len(buffer) % PACKED_SIZE:
+        raise ValueError(f"Buffer length must be a multiple of {PACKED_SIZE}")
+    unpack = GameState.unpack
+    return [unpack(buffer, offset) for offset in range(0, len(buffer), PACKED_SIZE)]
+
+class HasamiShogi:
+    # when True, every local dead-group search is checked against a full scan
+    verify_dead_groups = False
+    # when True, every incremental threat map / mobility update is checked
+    # against a full scan
+    verify_threats = False
+
+    def __init__(self):
+        self.board = [[EMPTY]*BOARD_SIZE for _ in range(BOARD_SIZE)]
+        for c in range(BOARD_SIZE):
+            self.board[0][c] = BLACK
+            self.board[-1][c] = WHITE
+        # track captures: how many pieces each color has captured
+        self.captures = {BLACK: 0, WHITE: 0}
+        # pending victory condition state
+        self.pending_leader = None
+        self.turn = BLACK
+        self.last_move = None
+        self.history = []
+        # undo records for push_move/pop_move
+        self._undo = []
+        # how often each position key occurred before the current one in
+        # this game (and the current search line); pop_move unwinds it
+        self._key_counts = {}
+        # squares whose group may have been left without liberties by its
+        # own mover; only these can hold a dead group before a capture step
+        self._suspects = ()
+        # squares held by each color, kept in step with the board by every
+        # move, capture and undo (rebuilt by set_board/restore)
+        self.pieces = self._index_pieces()
+        # capture_threats cache: None, or (threats, squares changed since
+        # they were computed, whether _suspects was set at that time)
+        self._threat_state = None
+        # mobility cache, the same way: None, or ({color: {square: number of
+        # pieces that can legally move there}}, {color: total}, changed squares,
+        # whether _suspects was set)
+        self._mobility_state = None
+        # 64-bit position key, kept up to date by every move
+        self.zobrist = self.compute_zobrist()
+
+    def set_board(self, board_list):
+        """
+        Set the board state directly for testing.
+        Expects a list of BOARD_SIZE lists/strings, each of length BOARD_SIZE,
+        containing only '.', 'B', or 'W'.
+        """
+        if len(board_list) != BOARD_SIZE:
+            raise ValueError(f"Board must have {BOARD_SIZE} rows")
+        new_board = []
+        for r, row in enumerate(board_list):
+            if len(row) != BOARD_SIZE:
+                raise ValueError(f"Row {r} must have {BOARD_SIZE} columns")
+            row_list = list(row)
+            if not _PIECE_CHARS.issuperset(row_list):
+                for c, cell in enumerate(row_list):
+                    if cell not in _PIECE_CHARS:
+                        raise ValueError(f"Invalid piece '{cell}' at ({r},{c})")
+            new_board.append(row_list)
+        self.board = new_board
+        # track captures: how many pieces each color has captured
+        self.captures = {BLACK: 0, WHITE: 0}
+        # pending victory condition state
+        self.pending_leader = None
+        self.turn = BLACK
+        self._undo = []
+        self._key_counts = {}
+        self.pieces = self._index_pieces()
+        self._suspects = tuple(self._dead_groups(BLACK) + self._dead_groups(WHITE))
+        self._threat_state = None
+        self._mobility_state = None
+        self.zobrist = self.compute_zobrist()
+
+    def _index_pieces(self):
+        pieces = {BLACK: set(), WHITE: set()}
+        for r in range(BOARD_SIZE):
+            for c in range(BOARD_SIZE):
+                if self.board[r][c] != EMPTY:
+                    pieces[self.board[r][c]].add((r, c))
+        return pieces
+
+    def compute_zobrist(self):
+        """
+        Compute the Zobrist key of the position from scratch: pieces, side to
+        move, capture counts and pending_leader. Moves keep self.zobrist up to
+        date incrementally; call this after editing board or captures by hand.
+        """
+        key = ZOBRIST_TURN[self.turn] ^ ZOBRIST_PENDING[self.pending_leader]
+        for color in (BLACK, WHITE):
+            key ^= ZOBRIST_CAPTURES[color][self.captures[color]]
+        for r in range(BOARD_SIZE):
+            for c in range(BOARD_SIZE):
+                if self.board[r][c] != EMPTY:
+                    key ^= ZOBRIST_PIECE[r][c][self.board[r][c]]
+        return key
+
+    def snapshot(self):
+        """Return the current position as a compact GameState."""
+        state = GameState.__new__(GameState)
+        state.cells = bytearray(''.join(map(''.join, self.board)).encode().translate(_TO_CELLS))
+        state.black_captures = self.captures[BLACK]
+        state.white_captures = self.captures[WHITE]
+        state.pending_leader = self.pending_leader
+        state.turn = self.turn
+        state.zobrist = self.zobrist
+        state.suspects = self._suspects
+        return state
+
+    def restore(self, state):
+        """
+        Load a position saved with snapshot(). Like set_board, this resets
+        the undo stack but leaves history alone. The Zobrist key is computed
+        from the cells rather than taken from state, which may be an edited
+        copy().
+        """
+        self.board = state.board
+        self.pieces = self._index_pieces()
+        self.captures = {BLACK: state.black_captures, WHITE: state.white_captures}
+        self.pending_leader = state.pending_leader
+        self.turn = state.turn
+        self.zobrist = self.compute_zobrist()
+        if state.suspects is None:
+            self._suspects = tuple(self._dead_groups(BLACK) + self._dead_groups(WHITE))
+        else:
+            self._suspects = state.suspects
+        self._threat_state = None
+        self._mobility_state = None
+        self._undo = []
+        self._key_counts = {}
+
+    def serialize(self):
+        """
+        Return a string representation of the board with coordinate labels:
+        - Columns labeled 0..8 at top and bottom
+        - Rows labeled 0..8 on both left and right of each row
+        """
+        lines = []
+        # Top column labels
+        header = '   ' + ' '.join(str(c) for c in range(BOARD_SIZE))
+        lines.append(header)
+        # Board rows with side labels
+        for r in range(BOARD_SIZE):
+            row_str = ' '.join(self.board[r])
+            lines.append(f"{r}  {row_str}  {r}")
+        # Bottom column labels
+        lines.append(header)
+        return '\n'.join(lines)
+
+    def in_bounds(self, r, c):
+        return 0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE
+
+    def is_clear_path(self, r1, c1, r2, c2):
+        """Return True if all squares strictly between (r1,c1) and (r2,c2) are EMPTY."""
+        # must be straight-line
+        if r1 == r2:
+            step = 1 if c2 > c1 else -1
+            for c in range(c1 + step, c2, step):
+                if self.board[r1][c] != EMPTY:
+                    return False
+            return True
+        elif c1 == c2:
+            step = 1 if r2 > r1 else -1
+            for r in range(r1 + step, r2, step):
+                if self.board[r][c1] != EMPTY:
+                    return False
+            return True
+        else:
+            return False
+
+    def is_legal_move(self, r1, c1, r2, c2, me):
+        opp = BLACK if me == WHITE else WHITE
+        # 1. In‑bounds
+        if not (self.in_bounds(r1, c1) and self.in_bounds(r2, c2)):
+            return False
+        # 2. Must be moving your own piece to an empty square
+        if self.board[r1][c1] != me or self.board[r2][c2] != EMPTY:
+            return False
+        # 3. Must move along row or column, and actually move
+        if not ((r1 == r2 and c1 != c2) or (c1 == c2 and r1 != r2)):
+            return False
+        # 4. Path must be clear
+        if not self.is_clear_path(r1, c1, r2, c2):
+            return False
+        # 5. No suicide, except when capturing
+        return not self._is_suicide(r2, c2, me, opp)
+
+    def _is_suicide(self, r2, c2, me, opp):
+        """True if moving onto (r2,c2) is flanked by opp and captures nothing."""
+        board = self.board
+        for (ra, ca), (rb, cb) in FLANKS[r2][c2]:
+            if board[ra][ca] == opp and board[rb][cb] == opp:
+                return not self._would_capture(r2, c2, me, opp)
+        return False
+
+    def _would_capture(self, r2, c2, me, opp):
+        """
+        Read-only capture probe for the suicide rule.
+        Matches running capture_from in every direction and then
+        remove_dead_groups(opp) before the piece is placed: the move captures
+        if it closes a line of opp pieces, or if opp already has a group with
+        no liberties.
+        """
+        board = self.board
+        for ray in RAYS[r2][c2]:
+            n = 0
+            for r, c in ray:
+                if board[r][c] != opp:
+                    if n and board[r][c] == me:
+                        return True
+                    break
+                n += 1
+        for r, c in self._suspects:
+            if self.board[r][c] == opp and not self.has_liberty(r, c):
+                return True
+        return False
+
+    def has_liberty(self, r, c):
+        """Return True if the group containing (r,c) touches an empty square."""
+        board = self.board
+        color = board[r][c]
+        queue = [(r, c)]
+        visited = {(r, c)}
+        while queue:
+            cr, cc = queue.pop()
+            for nr, nc in NEIGHBOURS[cr][cc]:
+                if board[nr][nc] == EMPTY:
+                    return True
+                if board[nr][nc] == color and (nr, nc) not in visited:
+                    visited.add((nr, nc))
+                    queue.append((nr, nc))
+        return False
+
+    def capture_from(self, r0, c0, dr, dc, me, opp, removed=None):
+        return self._capture_ray(RAYS[r0][c0][DIRECTION_INDEX[(dr, dc)]], me, opp, removed)
+
+    def _capture_ray(self, ray, me, opp, removed=None):
+        """Remove the opp pieces at the start of ray if a piece of 'me' closes them."""
+        board = self.board
+        captured = []
+        for r, c in ray:
+            if board[r][c] != opp:
+                if captured and board[r][c] == me:
+                    for rr, cc in captured:
+                        board[rr][cc] = EMPTY
+                        self.zobrist ^= ZOBRIST_PIECE[rr][cc][opp]
+                    self.pieces[opp].difference_update(captured)
+                    if removed is not None:
+                        removed.extend(captured)
+                    return len(captured)
+                break
+            captured.append((r, c))
+        return 0
+
+    def remove_dead_groups(self, color, removed=None, near=None):
+        """
+        Go-like capture: remove any connected group of 'color' with no liberties.
+        With near=(r,c), only groups touching that square (plus groups their
+        own mover left without liberties) are searched; a move can only take
+        the last liberty of groups next to its destination. Without it, the
+        whole board is scanned.
+        """
+        if near is None:
+            dead = self._dead_groups(color)
+        else:
+            dead = self._local_dead_groups(color, *near)
+            if self.verify_dead_groups and sorted(dead) != sorted(self._dead_groups(color)):
+                raise AssertionError(f"Local dead-group search near {near} missed groups")
+        # remove dead and return count
+        for (dr, dc) in dead:
+            self.board[dr][dc] = EMPTY
+            self.zobrist ^= ZOBRIST_PIECE[dr][dc][color]
+        self.pieces[color].difference_update(dead)
+        if removed is not None:
+            removed.extend(dead)
+        # every dead group of this color is gone now
+        self._suspects = tuple((r, c) for r, c in self._suspects
+                               if self.board[r][c] not in (EMPTY, color))
+        return len(dead)
+
+    def _dead_groups(self, color):
+        """Return every square of 'color' whose group has no liberties."""
+        visited = set()
+        dead = []
+        for r, c in sorted(self.pieces[color]):
+            if (r, c) not in visited:
+                group, has_liberty = self._flood_group(r, c, visited)
+                if not has_liberty:
+                    dead.extend(group)
+        return dead
+
+    def _local_dead_groups(self, color, r0, c0):
+        """Like _dead_groups, but only for groups next to (r0,c0) or in _suspects."""
+        seeds = NEIGHBOURS[r0][c0] + self._suspects
+        visited = set()
+        dead = []
+        for r, c in seeds:
+            if (r, c) not in visited and self.board[r][c] == color:
+                group, has_liberty = self._flood_group(r, c, visited)
+                if not has_liberty:
+                    dead.extend(group)
+        return dead
+
+    def _flood_group(self, r, c, visited):
+        """BFS the group containing (r,c); return (squares, has_liberty)."""
+        board = self.board
+        color = board[r][c]
+        queue = [(r, c)]
+        group = [(r, c)]
+        visited.add((r, c))
+        has_liberty = False
+        while queue:
+            cr, cc = queue.pop()
+            for nr, nc in NEIGHBOURS[cr][cc]:
+                if board[nr][nc] == EMPTY:
+                    has_liberty = True
+                elif board[nr][nc] == color and (nr, nc) not in visited:
+                    visited.add((nr, nc))
+                    queue.append((nr, nc))
+                    group.append((nr, nc))
+        return group, has_liberty
+
+    def generate_legal_moves(self, me):
+        """
+        Generate all legal sliding moves for player 'me'.
+        Returns a list of tuples (r1, c1, r2, c2).
+        """
+        return list(self.iter_legal_moves(me))
+
+    def iter_legal_moves(self, me, captures_first=False):
+        """
+        Yield the legal moves of 'me' one at a time, in the same order as
+        generate_legal_moves, so a search that cuts off early never pays for
+        the rest. With captures_first=True, the capturing moves come first
+        and then the quiet ones, each group in the usual order. Both are
+        generated lazily: only squares _capture_targets picks out are tried
+        for a capture, and the quiet moves are generated again afterwards
+        rather than buffered.
+        The board may be changed between moves as long as it is restored
+        (e.g. push_move/pop_move) before the next one is requested.
+        """
+        if captures_first:
+            captures = set()
+            opp = BLACK if me == WHITE else WHITE
+            board = self.board
+            targets = self._capture_targets(me)
+            for r, c in sorted(self.pieces[me]):
+                for ray in RAYS[r][c]:
+                    for nr, nc in ray:
+                        if board[nr][nc] != EMPTY:
+                            break
+                        if ((targets is None or (nr, nc) in targets) and self._capture_squares(r, c, nr, nc, me)
+                                and not self._is_suicide(nr, nc, me, opp)):
+                            captures.add((r, c, nr, nc))
+                            yield (r, c, nr, nc)
+            for move in self.iter_legal_moves(me):
+                if move not in captures:
+                    yield move
+            return
+        opp = BLACK if me == WHITE else WHITE
+        board = self.board
+        # sorted() keeps the row-major order of a full board scan
+        for r, c in sorted(self.pieces[me]):
+            # every square reached this way is a clear straight slide
+            # onto an empty square; only the suicide rule is left
+            for ray in RAYS[r][c]:
+                for nr, nc in ray:
+                    if board[nr][nc] != EMPTY:
+                        break
+                    if not self._is_suicide(nr, nc, me, opp):
+                        yield (r, c, nr, nc)
+
+    def generate_legal_move_codes(self, me):
+        """
+        Same moves as generate_legal_moves, in the same order, but packed
+        with encode_move into an array('H').
+        """
+        opp = BLACK if me == WHITE else WHITE
+        board = self.board
+        is_suicide = self._is_suicide
+        codes = []
+        append = codes.append
+        for r, c in sorted(self.pieces[me]):
+            base = (r * BOARD_SIZE + c) * NUM_SQUARES
+            for ray in RAYS[r][c]:
+                for nr, nc in ray:
+                    if board[nr][nc] != EMPTY:
+                        break
+                    if not is_suicide(nr, nc, me, opp):
+                        append(base + nr * BOARD_SIZE + nc)
+        return array('H', codes)
+
+    def capture_threats(self, color):
+        """
+        Return {(r, c): [(r1, c1), ...]}: every empty square where 'color'
+        would capture something on arrival, with the pieces that can legally
+        move there and capture. Callers must not modify the result.
+        The map is computed once and then kept up to date incrementally:
+        after moves (and pop_move) only the squares whose answer can have
+        changed are looked at again, so threat questions in a search are a
+        lookup instead of trying every move.
+        """
+        state = self._threat_state
+        if state is None:
+            threats = {BLACK: self._scan_threats(BLACK), WHITE: self._scan_threats(WHITE)}
+            self._threat_state = (threats, frozenset(), bool(self._suspects))
+        else:
+            threats, changed, had_suspects = state
+            if changed or had_suspects != bool(self._suspects):
+                threats = self._update_threats(threats, changed, had_suspects)
+                self._threat_state = (threats, frozenset(), bool(self._suspects))
+        return threats[color]
+
+    def _scan_threats(self, color):
+        threats = {}
+        for r in range(BOARD_SIZE):
+            for c in range(BOARD_SIZE):
+                if self.board[r][c] == EMPTY:
+                    origins = self._threat_origins(r, c, color)
+                    if origins:
+                        threats[(r, c)] = origins
+        return threats
+
+    def _update_threats(self, threats, changed, had_suspects):
+        # a dead group in _suspects makes every move a capture, so then the
+        # whole map depends on it; fall back to a full scan
+        if had_suspects or self._suspects:
+            updated = {BLACK: self._scan_threats(BLACK), WHITE: self._scan_threats(WHITE)}
+        else:
+            dirty = self._threat_dirty_squares(changed)
+            updated = {}
+            for color in (BLACK, WHITE):
+                new = {sq: origins for sq, origins in threats[color].items() if sq not in dirty}
+                for r, c in dirty:
+                    if self.board[r][c] == EMPTY:
+                        origins = self._threat_origins(r, c, color)
+                        if origins:
+                            new[(r, c)] = origins
+                updated[color] = new
+        if self.verify_threats:
+            for color in (BLACK, WHITE):
+                if updated[color] != self._scan_threats(color):
+                    raise AssertionError(f"Incremental threat map for {color} is out of date")
+        return updated
+
+    def _threat_dirty_squares(self, changed):
+        """
+        Squares whose capture_threats entry may differ after 'changed' squares
+        changed contents: squares that see a changed square along a line of
+        empty squares (reach) or of one color (sandwich), and squares next to
+        any group touching a changed square (surround).
+        """
+        board = self.board
+        dirty = self._line_dirty_squares(changed)
+        visited = set()
+        for r, c in changed:
+            for sq in ((r, c),) + NEIGHBOURS[r][c]:
+                if board[sq[0]][sq[1]] != EMPTY and sq not in visited:
+                    group, _ = self._flood_group(sq[0], sq[1], visited)
+                    for gr, gc in group:
+                        dirty.update(NEIGHBOURS[gr][gc])
+        return dirty
+
+    def _line_dirty_squares(self, changed):
+        """
+        'changed' plus every square that sees one of them along a line of
+        empty squares (which pieces can reach it) or just past a run of one
+        color (sandwiches and the suicide rule).
+        """
+        board = self.board
+        dirty = set(changed)
+        for r, c in changed:
+            for ray in RAYS[r][c]:
+                if not ray:
+                    continue
+                first = board[ray[0][0]][ray[0][1]]
+                for nr, nc in ray:
+                    cell = board[nr][nc]
+                    if cell == EMPTY:
+                        dirty.add((nr, nc))
+                        if first != EMPTY:
+                            # the square just past a run of one color
+                            break
+                    elif cell != first:
+                        break
+        return dirty
+
+    def mobility(self, color):
+        """
+        Return len(generate_legal_moves(color)) without generating the moves.
+        Per-square counts of the pieces that can legally move to each square
+        are computed once and then updated only along the rows and columns a
+        move (and its captures) touched.
+        """
+        state = self._mobility_state
+        if state is None:
+            counts, totals = self._scan_mobility()
+            self._mobility_state = (counts, totals, frozenset(), bool(self._suspects))
+        else:
+            counts, totals, changed, had_suspects = state
+            if changed or had_suspects != bool(self._suspects):
+                counts, totals = self._update_mobility(counts, totals, changed, had_suspects)
+                self._mobility_state = (counts, totals, frozenset(), bool(self._suspects))
+        return totals[color]
+
+    def _scan_mobility(self):
+        counts = {BLACK: {}, WHITE: {}}
+        for r in range(BOARD_SIZE):
+            for c in range(BOARD_SIZE):
+                if self.board[r][c] == EMPTY:
+                    for color, n in zip((BLACK, WHITE), self._reach_counts(r, c)):
+                        if n:
+                            counts[color][(r, c)] = n
+        return counts, {color: sum(counts[color].values()) for color in (BLACK, WHITE)}
+
+    def _update_mobility(self, counts, totals, changed, had_suspects):
+        # a dead group in _suspects can make any flanked square legal
+        if had_suspects or self._suspects:
+            updated = self._scan_mobility()
+        else:
+            black, white = dict(counts[BLACK]), dict(counts[WHITE])
+            nb, nw = totals[BLACK], totals[WHITE]
+            for r, c in self._line_dirty_squares(changed):
+                if self.board[r][c] == EMPTY:
+                    b, w = self._reach_counts(r, c)
+                else:
+                    b = w = 0
+                nb += b - black.pop((r, c), 0)
+                nw += w - white.pop((r, c), 0)
+                if b:
+                    black[(r, c)] = b
+                if w:
+                    white[(r, c)] = w
+            updated = {BLACK: black, WHITE: white}, {BLACK: nb, WHITE: nw}
+        if self.verify_threats and updated != self._scan_mobility():
+            raise AssertionError("Incremental mobility counts are out of date")
+        return updated
+
+    def _reach_counts(self, r, c):
+        """(black, white): how many pieces of each color can legally move to empty (r,c)."""
+        board = self.board
+        black = white = 0
+        for ray in RAYS[r][c]:
+            for nr, nc in ray:
+                cell = board[nr][nc]
+                if cell != EMPTY:
+                    if cell == BLACK:
+                        black += 1
+                    else:
+                        white += 1
+                    break
+        if black and self._is_suicide(r, c, BLACK, WHITE):
+            black = 0
+        if white and self._is_suicide(r, c, WHITE, BLACK):
+            white = 0
+        return black, white
+
+    def _threat_origins(self, r, c, color):
+        """Pieces of 'color' that can legally move to empty (r,c) and capture there."""
+        board = self.board
+        opp = BLACK if color == WHITE else WHITE
+        # every capture needs an opp piece next to (r,c), unless an already
+        # dead group is waiting to be removed
+        if not self._suspects and all(board[nr][nc] != opp for nr, nc in NEIGHBOURS[r][c]):
+            return []
+        origins = []
+        for ray in RAYS[r][c]:
+            for nr, nc in ray:
+                if board[nr][nc] != EMPTY:
+                    if board[nr][nc] == color and self._capture_squares(nr, nc, r, c, color):
+                        origins.append((nr, nc))
+                    break
+        if origins and self._is_suicide(r, c, color, opp):
+            return []
+        return sorted(origins)
+
+    def captures_for(self, move, color, return_squares=False):
+        """
+        Return how many pieces 'color' would capture by playing move
+        (r1, c1, r2, c2), without applying it. Counts both sandwiched lines
+        and surrounded groups. With return_squares=True, return
+        (count, captured squares) instead.
+        Raises ValueError for an illegal move, like apply_move.
+        """
+        if not self.is_legal_move(*move, color):
+            raise ValueError(f"Illegal move: from ({move[0]},{move[1]}) to ({move[2]},{move[3]})")
+        captured = self._capture_squares(*move, color)
+        if return_squares:
+            return len(captured), captured
+        return len(captured)
+
+    def _capture_targets(self, me):
+        """
+        Empty squares where a move of 'me' may capture, found without trying
+        any move: the last empty neighbour of an opp piece (surround), or
+        the square before a run of opp pieces that 'me' closes (sandwich).
+        A superset of the real ones, or None when a dead group in _suspects
+        makes every square a candidate.
+        """
+        if self._suspects:
+            return None
+        opp = BLACK if me == WHITE else WHITE
+        board = self.board
+        targets = set()
+        flanking = set()
+        for r, c in self.pieces[opp]:
+            empty = [(nr, nc) for nr, nc in NEIGHBOURS[r][c] if board[nr][nc] == EMPTY]
+            if len(empty) == 1:
+                targets.add(empty[0])
+            flanking.update(empty)
+        for r, c in flanking - targets:
+            for ray in RAYS[r][c]:
+                run = False
+                for nr, nc in ray:
+                    if board[nr][nc] != opp:
+                        if run and board[nr][nc] == me:
+                            targets.add((r, c))
+                        break
+                    run = True
+        return targets
+
+    def _capture_squares(self, r1, c1, r2, c2, me):
+        """
+        Return the squares a legal move would capture, without applying it.
+        Covers both sandwiched lines and surrounded groups, like _make_move.
+        """
+        opp = BLACK if me == WHITE else WHITE
+        board = self.board
+        # look at the board as it would be after the slide
+        board[r1][c1] = EMPTY
+        board[r2][c2] = me
+        try:
+            lines = set()
+            for ray in RAYS[r2][c2]:
+                run = []
+                for r, c in ray:
+                    if board[r][c] != opp:
+                        if run and board[r][c] == me:
+                            lines.update(run)
+                        break
+                    run.append((r, c))
+            visited = set(lines)
+            captured = list(lines)
+            for sr, sc in NEIGHBOURS[r2][c2] + self._suspects:
+                if (sr, sc) in visited or board[sr][sc] != opp:
+                    continue
+                # flood the group, counting line-captured squares as liberties
+                queue = [(sr, sc)]
+                group = [(sr, sc)]
+                visited.add((sr, sc))
+                has_liberty = False
+                while queue:
+                    cr, cc = queue.pop()
+                    for nr, nc in NEIGHBOURS[cr][cc]:
+                        if board[nr][nc] == EMPTY or (nr, nc) in lines:
+                            has_liberty = True
+                        elif board[nr][nc] == opp and (nr, nc) not in visited:
+                            visited.add((nr, nc))
+                            queue.append((nr, nc))
+                            group.append((nr, nc))
+                if not has_liberty:
+                    captured.extend(group)
+            return captured
+        finally:
+            board[r2][c2] = EMPTY
+            board[r1][c1] = me
+
+    def apply_move(self, r1, c1, r2, c2, me):
+        self._make_move(r1, c1, r2, c2, me)
+
+    def push_move(self, r1, c1, r2, c2, me):
+        """
+        Apply a move like apply_move, but remember how to take it back.
+        Searches can walk the game tree in place with push_move/pop_move
+        instead of copying the whole game for every child node.
+        """
+        self._undo.append(self._make_move(r1, c1, r2, c2, me))
+
+    def pop_move(self):
+        """Undo the most recent push_move, restoring the exact previous state."""
+        (r1, c1, r2, c2, me, removed, captured,
+         pending_leader, turn, last_move, suspects, zobrist,
+         threat_state, mobility_state) = self._undo.pop()
+        opp = BLACK if me == WHITE else WHITE
+        for rr, cc in removed:
+            self.board[rr][cc] = opp
+        self.pieces[opp].update(removed)
+        self.board[r2][c2] = EMPTY
+        self.board[r1][c1] = me
+        own = self.pieces[me]
+        own.discard((r2, c2))
+        own.add((r1, c1))
+        self.captures[me] = captured
+        self.pending_leader = pending_leader
+        self.turn = turn
+        self.last_move = last_move
+        self._suspects = suspects
+        self.zobrist = zobrist
+        seen = self._key_counts[zobrist] - 1
+        if seen:
+            self._key_counts[zobrist] = seen
+        else:
+            del self._key_counts[zobrist]
+        self._threat_state = threat_state
+        self._mobility_state = mobility_state
+        self.history.pop()
+
+    def _make_move(self, r1, c1, r2, c2, me):
+        """Apply a move and return the record pop_move needs to undo it."""
+        opp = BLACK if me == WHITE else WHITE
+        if not self.is_legal_move(r1, c1, r2, c2, me):
+            raise ValueError(f"Illegal move: from ({r1},{c1}) to ({r2},{c2})")
+        undo = (r1, c1, r2, c2, me)
+        prev = (self.captures[me], self.pending_leader, self.turn,
+                self.last_move, self._suspects, self.zobrist,
+                self._threat_state, self._mobility_state)
+        self._key_counts[self.zobrist] = self._key_counts.get(self.zobrist, 0) + 1
+        # perform slide
+        self.board[r1][c1] = EMPTY
+        self.board[r2][c2] = me
+        own = self.pieces[me]
+        own.discard((r1, c1))
+        own.add((r2, c2))
+        self.zobrist ^= ZOBRIST_PIECE[r1][c1][me] ^ ZOBRIST_PIECE[r2][c2][me]
+        # track captures
+        removed = []
+        total = 0
+        for ray in RAYS[r2][c2]:
+            total += self._capture_ray(ray, me, opp, removed)
+            #print(self.serialize())
+        total += self.remove_dead_groups(opp, removed, near=(r2, c2))
+        #print(self.serialize())
+        self.zobrist ^= ZOBRIST_CAPTURES[me][self.captures[me]]
+        self.captures[me] += total
+        self.zobrist ^= ZOBRIST_CAPTURES[me][self.captures[me]]
+        # a move may fill the last liberty of the mover's own group; that
+        # group stays on the board until the opponent's next capture step
+        if not self.has_liberty(r2, c2):
+            self._suspects += ((r2, c2),)
+        
+        # update pending_leader in case of leading 3 captures
+        self.zobrist ^= ZOBRIST_PENDING[self.pending_leader]
+        cm, co = self.captures[me], self.captures[opp]
+        lead = cm - co
+        if lead >= 3 and self.pending_leader == None:
+            self.pending_leader = me
+        elif lead >= -2 and self.pending_leader == opp:
+            self.pending_leader = None
+        self.zobrist ^= ZOBRIST_PENDING[self.pending_leader]
+
+        # record last mover
+        self.last_move = (r1,c1,r2,c2)
+        self.zobrist ^= ZOBRIST_TURN[self.turn] ^ ZOBRIST_TURN[opp]
+        self.turn = opp
+
+        self.history.append(self.last_move)
+        if self._threat_state is not None:
+            threats, changed, had_suspects = self._threat_state
+            self._threat_state = (threats, changed.union(((r1, c1), (r2, c2)), removed), had_suspects)
+        if self._mobility_state is not None:
+            counts, totals, changed, had_suspects = self._mobility_state
+            self._mobility_state = (counts, totals, changed.union(((r1, c1), (r2, c2)), removed),
+                                    had_suspects)
+        return undo + (removed,) + prev
+
+    def repetition_count(self):
+        """
+        How many times the current position (board, side to move, captures
+        and pending_leader) has occurred in this game, counting this time.
+        Positions reached with push_move count until they are popped.
+        set_board and restore start the count afresh.
+        """
+        return self._key_counts.get(self.zobrist, 0) + 1
+
+    def is_game_over(self):
+        # player to play next
+        opp = self.turn
+        # player who just moved
+        me = BLACK if opp == WHITE else WHITE
+        cm = self.captures[me]
+        # 1. First to 5 captures
+        if cm >= 5:
+            return me
+        elif self.pending_leader is opp:
+            return self.pending_leader
         return None
\ No newline at end of file
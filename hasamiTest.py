@@ -1,121 +1,778 @@
-import unittest
-import hasamiShogi
-
-game = hasamiShogi.HasamiShogi()
-
-class TestHasamiShogi(unittest.TestCase):
-    def test_victory(self):
-        board = [
-            ".BBB....B",
-            ".........",
-            ".........",
-            ".......B.",
-            "....BBBW.",
-            "B........",
-            ".........",
-            ".........",
-            "WWWWWWW.W"
-        ]
-        game.set_board(board)
-        game.apply_move(8,3,4,3, hasamiShogi.WHITE)
-        player = game.is_game_over()
-        self.assertEqual(player, None)
-
-        game.apply_move(0,8,4,8, hasamiShogi.BLACK)
-        player = game.is_game_over()
-        self.assertEqual(player, hasamiShogi.WHITE)
-
-        board = [
-            #012345678
-            ".BBB....B", # 0
-            ".........", # 1
-            ".........", # 2
-            ".......BW", # 3
-            "....BBBW.", # 4
-            "B........", # 5
-            ".........", # 6
-            ".........", # 7
-            "WWWWWWW.."
-        ]
-        game.set_board(board)
-        # W leads by 3
-        game.apply_move(8,3,4,3, hasamiShogi.WHITE)
-        player = game.is_game_over()
-        self.assertEqual(player, None)
-
-        # B captures 1 to undo the lead
-        game.apply_move(5,0,5,7, hasamiShogi.BLACK)
-        player = game.is_game_over()
-        self.assertEqual(player, None)
-
-        # W captures 1 again to get the lead again
-        game.apply_move(8,6,3,6, hasamiShogi.WHITE)
-        player = game.is_game_over()
-        self.assertEqual(player, None)
-
-        # B cannot capture back, W wins
-        game.apply_move(0,8,2,8, hasamiShogi.BLACK)
-        player = game.is_game_over()
-        self.assertEqual(player, hasamiShogi.WHITE)
-
-    def test_corner(self):
-        board = [
-            #012345678
-            "WWWB.WB.W",
-            ".BB...B.B",
-            ".........",
-            ".........",
-            "......B..",
-            ".........",
-            "B........",
-            ".........",
-            "........."
-        ]
-        game.set_board(board)
-        game.apply_move(1,6,1,7, hasamiShogi.BLACK)
-        self.assertEqual(game.board[0][7], hasamiShogi.EMPTY)
-        self.assertEqual(game.board[0][8], hasamiShogi.WHITE)
-        
-        # white captures after first move
-        game.apply_move(0,8,0,7, hasamiShogi.WHITE)
-        game.apply_move(1,8,0,8, hasamiShogi.BLACK)
-        self.assertEqual(game.board[0][7], hasamiShogi.WHITE)
-
-        # black captures back
-        game.apply_move(4,6,0,6, hasamiShogi.BLACK)
-        self.assertEqual(game.board[0][7], hasamiShogi.EMPTY)
-        
-        game.apply_move(0,5,1,5, hasamiShogi.WHITE)
-        game.apply_move(6,0,1,0, hasamiShogi.BLACK)
-        self.assertEqual(game.board[0][0], hasamiShogi.EMPTY)
-        self.assertEqual(game.board[0][1], hasamiShogi.EMPTY)
-        self.assertEqual(game.board[0][2], hasamiShogi.EMPTY)
-        player = game.is_game_over()
-
-        game.apply_move(1,5,2,5, hasamiShogi.WHITE)
-        # print(game.serialize())
-        player = game.is_game_over()
-        self.assertEqual(player, hasamiShogi.BLACK)
-
-    def test_real(self):
-        board = [
-        ".BB..BBB.",
-        "W...B....",
-        ".........",
-        ".........",
-        ".........",
-        "B........",
-        "W........",
-        "........W",
-        "..WWWWWW."]
-        game.set_board(board)
-        game.captures[hasamiShogi.WHITE] = 2
-        game.apply_move(1,0,4,0, hasamiShogi.WHITE)
-        player = game.is_game_over()
-        self.assertEqual(player, None)
-        game.apply_move(0,1,1,1, hasamiShogi.BLACK)
-        player = game.is_game_over()
-        self.assertEqual(player, hasamiShogi.WHITE)
-
-if __name__ == '__main__':
-    unittest.main()
+import asyncio
+import os
+import queue
+import random
+import sys
+import tempfile
+import threading
+import time
+import types
+import unittest
+import arena
+import hasamiShogi
+import hasamiBitboard
+import perft
+import sprt
+import tournament
+
+game = hasamiShogi.HasamiShogi()
+
+class TestHasamiShogi(unittest.TestCase):
+    def test_victory(self):
+        board = [
+            ".BBB....B",
+            ".........",
+            ".........",
+            ".......B.",
+            "....BBBW.",
+            "B........",
+            ".........",
+            ".........",
+            "WWWWWWW.W"
+        ]
+        game.set_board(board)
+        game.apply_move(8,3,4,3, hasamiShogi.WHITE)
+        player = game.is_game_over()
+        self.assertEqual(player, None)
+
+        game.apply_move(0,8,4,8, hasamiShogi.BLACK)
+        player = game.is_game_over()
+        self.assertEqual(player, hasamiShogi.WHITE)
+
+        board = [
+            #012345678
+            ".BBB....B", # 0
+            ".........", # 1
+            ".........", # 2
+            ".......BW", # 3
+            "....BBBW.", # 4
+            "B........", # 5
+            ".........", # 6
+            ".........", # 7
+            "WWWWWWW.."
+        ]
+        game.set_board(board)
+        # W leads by 3
+        game.apply_move(8,3,4,3, hasamiShogi.WHITE)
+        player = game.is_game_over()
+        self.assertEqual(player, None)
+
+        # B captures 1 to undo the lead
+        game.apply_move(5,0,5,7, hasamiShogi.BLACK)
+        player = game.is_game_over()
+        self.assertEqual(player, None)
+
+        # W captures 1 again to get the lead again
+        game.apply_move(8,6,3,6, hasamiShogi.WHITE)
+        player = game.is_game_over()
+        self.assertEqual(player, None)
+
+        # B cannot capture back, W wins
+        game.apply_move(0,8,2,8, hasamiShogi.BLACK)
+        player = game.is_game_over()
+        self.assertEqual(player, hasamiShogi.WHITE)
+
+    def test_corner(self):
+        board = [
+            #012345678
+            "WWWB.WB.W",
+            ".BB...B.B",
+            ".........",
+            ".........",
+            "......B..",
+            ".........",
+            "B........",
+            ".........",
+            "........."
+        ]
+        game.set_board(board)
+        game.apply_move(1,6,1,7, hasamiShogi.BLACK)
+        self.assertEqual(game.board[0][7], hasamiShogi.EMPTY)
+        self.assertEqual(game.board[0][8], hasamiShogi.WHITE)
+        
+        # white captures after first move
+        game.apply_move(0,8,0,7, hasamiShogi.WHITE)
+        game.apply_move(1,8,0,8, hasamiShogi.BLACK)
+        self.assertEqual(game.board[0][7], hasamiShogi.WHITE)
+
+        # black captures back
+        game.apply_move(4,6,0,6, hasamiShogi.BLACK)
+        self.assertEqual(game.board[0][7], hasamiShogi.EMPTY)
+        
+        game.apply_move(0,5,1,5, hasamiShogi.WHITE)
+        game.apply_move(6,0,1,0, hasamiShogi.BLACK)
+        self.assertEqual(game.board[0][0], hasamiShogi.EMPTY)
+        self.assertEqual(game.board[0][1], hasamiShogi.EMPTY)
+        self.assertEqual(game.board[0][2], hasamiShogi.EMPTY)
+        player = game.is_game_over()
+
+        game.apply_move(1,5,2,5, hasamiShogi.WHITE)
+        # print(game.serialize())
+        player = game.is_game_over()
+        self.assertEqual(player, hasamiShogi.BLACK)
+
+    def test_real(self):
+        board = [
+        ".BB..BBB.",
+        "W...B....",
+        ".........",
+        ".........",
+        ".........",
+        "B........",
+        "W........",
+        "........W",
+        "..WWWWWW."]
+        game.set_board(board)
+        game.captures[hasamiShogi.WHITE] = 2
+        game.apply_move(1,0,4,0, hasamiShogi.WHITE)
+        player = game.is_game_over()
+        self.assertEqual(player, None)
+        game.apply_move(0,1,1,1, hasamiShogi.BLACK)
+        player = game.is_game_over()
+        self.assertEqual(player, hasamiShogi.WHITE)
+
+    def test_push_pop(self):
+        g = hasamiShogi.HasamiShogi()
+        rng = random.Random(0)
+        snapshots = []
+        for _ in range(120):
+            moves = g.generate_legal_moves(g.turn)
+            if not moves or g.is_game_over():
+                break
+            snapshots.append(([row[:] for row in g.board], dict(g.captures),
+                              g.pending_leader, g.turn, g.last_move, list(g.history)))
+            g.push_move(*rng.choice(moves), g.turn)
+        while snapshots:
+            g.pop_move()
+            board, captures, pending_leader, turn, last_move, history = snapshots.pop()
+            self.assertEqual(g.board, board)
+            self.assertEqual(g.captures, captures)
+            self.assertEqual(g.pending_leader, pending_leader)
+            self.assertEqual(g.turn, turn)
+            self.assertEqual(g.last_move, last_move)
+            self.assertEqual(g.history, history)
+
+    def test_zobrist(self):
+        g = hasamiShogi.HasamiShogi()
+        rng = random.Random(3)
+        for _ in range(150):
+            moves = g.generate_legal_moves(g.turn)
+            if not moves or g.is_game_over():
+                break
+            g.push_move(*rng.choice(moves), g.turn)
+            self.assertEqual(g.zobrist, g.compute_zobrist())
+        while g.history:
+            g.pop_move()
+            self.assertEqual(g.zobrist, g.compute_zobrist())
+        # the same position reached by two move orders has the same key
+        a, b = hasamiShogi.HasamiShogi(), hasamiShogi.HasamiShogi()
+        for move in [(0,0,3,0), (8,0,5,0), (0,1,3,1), (8,1,5,1)]:
+            a.apply_move(*move, a.turn)
+        for move in [(0,1,3,1), (8,1,5,1), (0,0,3,0), (8,0,5,0)]:
+            b.apply_move(*move, b.turn)
+        self.assertEqual(a.zobrist, b.zobrist)
+        self.assertNotEqual(a.zobrist, hasamiShogi.HasamiShogi().zobrist)
+
+    def test_snapshot(self):
+        g = hasamiShogi.HasamiShogi()
+        rng = random.Random(5)
+        for _ in range(40):
+            g.apply_move(*rng.choice(g.generate_legal_moves(g.turn)), g.turn)
+        state = g.snapshot()
+        self.assertEqual(len(state.cells), hasamiShogi.BOARD_SIZE ** 2)
+        self.assertEqual(state.board, g.board)
+        self.assertEqual(state.captures, g.captures)
+        clone = state.copy()
+        clone.cells[0] = hasamiShogi.CELL_CODES[hasamiShogi.WHITE]
+        self.assertEqual(state.board, g.board)
+
+        h = hasamiShogi.HasamiShogi()
+        h.restore(state)
+        self.assertEqual(h.board, g.board)
+        self.assertEqual(h.captures, g.captures)
+        self.assertEqual(h.turn, g.turn)
+        self.assertEqual(h.zobrist, h.compute_zobrist())
+        self.assertEqual(h.generate_legal_moves(h.turn), g.generate_legal_moves(g.turn))
+
+        # an edited copy loads with its own key, not the original's
+        h.restore(clone)
+        self.assertEqual(h.board[0][0], hasamiShogi.WHITE)
+        self.assertEqual(h.zobrist, h.compute_zobrist())
+        self.assertNotEqual(h.zobrist, g.zobrist)
+
+    def test_suicide_probe(self):
+        g = hasamiShogi.HasamiShogi()
+        board = [
+            #012345678
+            "WB.......", # 0
+            "B........", # 1
+            ".........", # 2
+            "....B....", # 3
+            "...W.W...", # 4
+            ".........", # 5
+            ".........", # 6
+            ".........", # 7
+            "........."
+        ]
+        # (4,4) is flanked by white, but the dead white corner makes it a capture
+        g.set_board(board)
+        self.assertTrue(g.is_legal_move(3,4,4,4, hasamiShogi.BLACK))
+        self.assertEqual(g.board, [list(row) for row in board])
+        board[0] = ".B......."
+        g.set_board(board)
+        self.assertFalse(g.is_legal_move(3,4,4,4, hasamiShogi.BLACK))
+        board[4] = "..BW.W..."
+        g.set_board(board)
+        self.assertTrue(g.is_legal_move(3,4,4,4, hasamiShogi.BLACK))
+
+    def test_local_dead_groups(self):
+        # the local search must find exactly what a full-board scan finds
+        g = hasamiShogi.HasamiShogi()
+        g.verify_dead_groups = True
+        rng = random.Random(1)
+        for _ in range(300):
+            moves = g.generate_legal_moves(g.turn)
+            if not moves or g.is_game_over():
+                g = hasamiShogi.HasamiShogi()
+                g.verify_dead_groups = True
+                continue
+            g.apply_move(*rng.choice(moves), g.turn)
+
+    def test_iter_legal_moves(self):
+        g = hasamiShogi.HasamiShogi()
+        board = [
+            #012345678
+            ".BBB....B", # 0
+            ".........", # 1
+            ".........", # 2
+            ".......B.", # 3
+            "....BBBW.", # 4
+            "B........", # 5
+            ".........", # 6
+            ".........", # 7
+            "WWWWWWW.W"
+        ]
+        g.set_board(board)
+        moves = g.generate_legal_moves(hasamiShogi.WHITE)
+        self.assertEqual(list(g.iter_legal_moves(hasamiShogi.WHITE)), moves)
+        ordered = list(g.iter_legal_moves(hasamiShogi.WHITE, captures_first=True))
+        self.assertEqual(sorted(ordered), sorted(moves))
+        # (8,3)->(4,3) sandwiches three black pieces against (4,7)
+        self.assertEqual(ordered[0], (8,3,4,3))
+        self.assertEqual(g.board, [list(row) for row in board])
+        # the capture pass only tries _capture_targets, but finds every capture
+        rng = random.Random(11)
+        for _ in range(20):
+            g = hasamiShogi.HasamiShogi()
+            for _ in range(rng.randrange(10, 80)):
+                if g.is_game_over():
+                    break
+                g.apply_move(*rng.choice(g.generate_legal_moves(g.turn)), g.turn)
+            for me in (hasamiShogi.BLACK, hasamiShogi.WHITE):
+                moves = g.generate_legal_moves(me)
+                captures = [m for m in moves if g._capture_squares(*m, me)]
+                self.assertEqual(list(g.iter_legal_moves(me, captures_first=True)),
+                                 captures + [m for m in moves if m not in captures])
+
+    def test_captures_for(self):
+        g = hasamiShogi.HasamiShogi()
+        board = [
+            #012345678
+            ".BBB....B", # 0
+            ".........", # 1
+            ".........", # 2
+            ".......B.", # 3
+            "....BBBW.", # 4
+            "B........", # 5
+            ".........", # 6
+            ".........", # 7
+            "WWWWWWW.W"
+        ]
+        g.set_board(board)
+        # sandwiched line
+        count, squares = g.captures_for((8,3,4,3), hasamiShogi.WHITE, return_squares=True)
+        self.assertEqual(count, 3)
+        self.assertEqual(sorted(squares), [(4,4), (4,5), (4,6)])
+        self.assertEqual(g.captures_for((8,0,6,0), hasamiShogi.WHITE), 0)
+        with self.assertRaises(ValueError):
+            g.captures_for((8,3,3,4), hasamiShogi.WHITE)
+        # surrounded group in the corner
+        g.set_board([
+            "WWWB.WB..",
+            ".BB.B....",
+            "B........",
+            ".........",
+            ".........",
+            ".........",
+            ".........",
+            ".........",
+            "........."])
+        self.assertEqual(g.captures_for((1,4,0,4), hasamiShogi.BLACK, True), (1, [(0,5)]))
+        self.assertEqual(g.captures_for((2,0,1,0), hasamiShogi.BLACK), 3)
+        self.assertEqual(g.board[0][:3], [hasamiShogi.WHITE] * 3)
+
+    def test_bitboard_parity(self):
+        rng = random.Random(2)
+        for _ in range(20):
+            g = hasamiShogi.HasamiShogi()
+            bb = hasamiBitboard.BitboardHasamiShogi()
+            bb.verify_dead_groups = True
+            for _ in range(100):
+                color = g.turn
+                moves = g.generate_legal_moves(color)
+                self.assertEqual(bb.generate_legal_moves(color), moves)
+                self.assertEqual(list(bb.iter_legal_moves(color, captures_first=True)),
+                                 list(g.iter_legal_moves(color, captures_first=True)))
+                if not moves or g.is_game_over():
+                    break
+                move = rng.choice(moves)
+                g.apply_move(*move, color)
+                bb.apply_move(*move, color)
+                self.assertEqual(bb.board, g.board)
+                self.assertEqual(bb.captures, g.captures)
+                self.assertEqual(bb.pending_leader, g.pending_leader)
+                self.assertEqual(bb.is_game_over(), g.is_game_over())
+                self.assertEqual(bb.zobrist, g.zobrist)
+
+    def test_move_codes(self):
+        for move in [(0, 0, 0, 1), (8, 8, 0, 8), (4, 3, 4, 7)]:
+            self.assertEqual(hasamiShogi.decode_move(hasamiShogi.encode_move(*move)), move)
+        self.assertEqual(hasamiShogi.encode_move(8, 8, 8, 8), 6560)
+        rng = random.Random(11)
+        for game_cls in (hasamiShogi.HasamiShogi, hasamiBitboard.BitboardHasamiShogi):
+            g = game_cls()
+            for _ in range(100):
+                moves = g.generate_legal_moves(g.turn)
+                codes = g.generate_legal_move_codes(g.turn)
+                self.assertEqual(codes.typecode, 'H')
+                self.assertEqual([hasamiShogi.decode_move(code) for code in codes], moves)
+                if not moves or g.is_game_over():
+                    break
+                g.apply_move(*rng.choice(moves), g.turn)
+
+    def test_piece_sets(self):
+        rng = random.Random(12)
+        for game_cls in (hasamiShogi.HasamiShogi, hasamiBitboard.BitboardHasamiShogi):
+            g = game_cls()
+            for _ in range(150):
+                for color in (hasamiShogi.BLACK, hasamiShogi.WHITE):
+                    self.assertEqual(g.pieces[color], {(r, c) for r in range(9) for c in range(9)
+                                                       if g.board[r][c] == color})
+                moves = g.generate_legal_moves(g.turn)
+                if not moves or g.is_game_over():
+                    break
+                g.push_move(*rng.choice(moves), g.turn)
+            while g._undo:
+                g.pop_move()
+            self.assertEqual(g.pieces, game_cls().pieces)
+
+    def test_capture_threats(self):
+        board = [
+            #012345678
+            "BBBB.BBBB", # 0
+            ".........", # 1
+            ".........", # 2
+            "...W.....", # 3
+            "...B.....", # 4
+            ".........", # 5
+            "...B.....", # 6
+            ".........", # 7
+            "WWWW.WWWW"  # 8
+        ]
+        g = hasamiShogi.HasamiShogi()
+        g.set_board(board)
+        # B sandwiches (3,3) by arriving at (2,3) from above; (6,3) keeps W out of (5,3)
+        self.assertEqual(g.capture_threats(hasamiShogi.BLACK), {(2, 3): [(0, 3)]})
+        self.assertEqual(g.capture_threats(hasamiShogi.WHITE), {})
+        rng = random.Random(13)
+        for game_cls in (hasamiShogi.HasamiShogi, hasamiBitboard.BitboardHasamiShogi):
+            g = game_cls()
+            for _ in range(150):
+                for color in (hasamiShogi.BLACK, hasamiShogi.WHITE):
+                    expected = {}
+                    for move in g.generate_legal_moves(color):
+                        if g.captures_for(move, color):
+                            expected.setdefault(move[2:], []).append(move[:2])
+                    self.assertEqual(g.capture_threats(color), expected)
+                moves = g.generate_legal_moves(g.turn)
+                if not moves or g.is_game_over():
+                    break
+                if g._undo and rng.random() < 0.2:
+                    g.pop_move()
+                else:
+                    g.push_move(*rng.choice(moves), g.turn)
+
+    def test_mobility(self):
+        rng = random.Random(14)
+        for game_cls in (hasamiShogi.HasamiShogi, hasamiBitboard.BitboardHasamiShogi):
+            g = game_cls()
+            for _ in range(150):
+                for color in (hasamiShogi.BLACK, hasamiShogi.WHITE):
+                    self.assertEqual(g.mobility(color), len(g.generate_legal_moves(color)))
+                moves = g.generate_legal_moves(g.turn)
+                if not moves or g.is_game_over():
+                    break
+                if g._undo and rng.random() < 0.2:
+                    g.pop_move()
+                else:
+                    g.push_move(*rng.choice(moves), g.turn)
+
+    def test_position_codec(self):
+        start = hasamiShogi.HasamiShogi().snapshot()
+        self.assertEqual(start.to_text(), "BBBBBBBBB" + "." * 63 + "WWWWWWWWW B 0 0 -")
+        self.assertEqual(len(start.pack()), hasamiShogi.PACKED_SIZE)
+        rng = random.Random(15)
+        states = []
+        for game_cls in (hasamiShogi.HasamiShogi, hasamiBitboard.BitboardHasamiShogi):
+            g = game_cls()
+            for _ in range(80):
+                state = g.snapshot()
+                states.append(state)
+                for decoded in (hasamiShogi.GameState.unpack(state.pack()),
+                                hasamiShogi.GameState.from_text(state.to_text())):
+                    self.assertEqual(decoded, state)
+                    self.assertEqual(hash(decoded), hash(state))
+                    h = game_cls()
+                    h.restore(decoded)
+                    self.assertEqual(h.board, g.board)
+                    self.assertEqual(h.pending_leader, g.pending_leader)
+                    self.assertEqual(h.zobrist, g.zobrist)
+                    self.assertEqual(h.generate_legal_moves(h.turn), g.generate_legal_moves(g.turn))
+                moves = g.generate_legal_moves(g.turn)
+                if not moves or g.is_game_over():
+                    break
+                g.apply_move(*rng.choice(moves), g.turn)
+        self.assertEqual(hasamiShogi.unpack_positions(hasamiShogi.pack_positions(states)), states)
+        self.assertEqual(len(set(states)), len({state.to_text() for state in states}))
+        with self.assertRaises(ValueError):
+            hasamiShogi.GameState.unpack(b"\xff" * hasamiShogi.PACKED_SIZE)
+        with self.assertRaises(ValueError):
+            hasamiShogi.GameState.from_text("BBB B 0 0 -")
+
+    def test_repetition_count(self):
+        shuffle = [(0, 0, 1, 0), (8, 0, 7, 0), (1, 0, 0, 0), (7, 0, 8, 0)]
+        for game_cls in (hasamiShogi.HasamiShogi, hasamiBitboard.BitboardHasamiShogi):
+            g = game_cls()
+            self.assertEqual(g.repetition_count(), 1)
+            for move in shuffle * 2:
+                g.apply_move(*move, g.turn)
+            self.assertEqual(g.repetition_count(), 3)
+            g.push_move(*shuffle[0], g.turn)
+            self.assertEqual(g.repetition_count(), 3)
+            g.pop_move()
+            self.assertEqual(g.repetition_count(), 3)
+            for move in shuffle:
+                g.push_move(*move, g.turn)
+            self.assertEqual(g.repetition_count(), 4)
+            for _ in shuffle:
+                g.pop_move()
+            self.assertEqual(g.repetition_count(), 3)
+            g.set_board(["".join(row) for row in g.board])
+            self.assertEqual(g.repetition_count(), 1)
+
+    def test_in_process_engine(self):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "randomPlayer.py")
+        eng = arena.InProcessEngine(path)
+        eng.send("OK?")
+        self.assertEqual(arena.parse_hello(eng.recv()), ("randomPlayer", {"opening"}))
+        eng.send("Black")
+        move = arena.parse_moves(eng.recv())
+        g = hasamiShogi.HasamiShogi()
+        self.assertIn(move, g.generate_legal_moves(hasamiShogi.BLACK))
+        g.apply_move(*move, hasamiShogi.BLACK)
+        reply = g.generate_legal_moves(hasamiShogi.WHITE)[0]
+        eng.send("".join(map(str, reply)))
+        g.apply_move(*reply, hasamiShogi.WHITE)
+        self.assertIn(arena.parse_moves(eng.recv()), g.generate_legal_moves(hasamiShogi.BLACK))
+        eng.send("GAME_OVER DRAW")
+        self.assertTrue(eng.new_game())
+        eng.send("NEW_GAME")
+        self.assertEqual(eng.recv(), "READY")
+        # the player searches on the referee's backend
+        eng = arena.make_engine(f"inproc:{path}", hasamiShogi.WHITE, hasamiBitboard.BitboardHasamiShogi)
+        eng.send("White")
+        self.assertIsInstance(eng.game, hasamiBitboard.BitboardHasamiShogi)
+
+    def test_async_arena(self):
+        root = os.path.dirname(os.path.abspath(__file__))
+        random_player = f"{sys.executable} {os.path.join(root, 'randomPlayer.py')}"
+        scripts = {
+            # starts slower than the move time, then plays like randomPlayer
+            "slow": f"import runpy, sys, time\ntime.sleep(0.5)\nsys.path.insert(0, {root!r})\n"
+                    f"runpy.run_path({os.path.join(root, 'randomPlayer.py')!r}, run_name='__main__')\n",
+            "hang": "import sys, time\nsys.stdin.readline()\nprint('Hang', flush=True)\ntime.sleep(60)\n",
+            # exits on reading Black's first move, so the referee sees EOF rather than a broken pipe
+            "die": "import sys\nsys.stdin.readline()\nprint('Die', flush=True)\nsys.stdin.readline()\n"
+                   "sys.stdin.readline()\n",
+            "mute": "import time\ntime.sleep(60)\n",
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            engines = {}
+            for name, source in scripts.items():
+                path = os.path.join(tmp, name + ".py")
+                with open(path, "w") as f:
+                    f.write(source)
+                engines[name] = f"{sys.executable} {path}"
+
+            async def handshake():
+                eng = arena.AsyncProcessEngine(random_player.split())
+                await eng.start()
+                await eng.send("OK?")
+                arena.hello(eng, await eng.recv(arena.STARTUP_TIMEOUT))
+                await eng.send("Black")
+                move = arena.parse_moves(await eng.recv(5))
+                await eng.close()
+                return eng.name, move
+            name, move = asyncio.run(handshake())
+            self.assertEqual(name, "Random")
+            self.assertIn(move, hasamiShogi.HasamiShogi().generate_legal_moves(hasamiShogi.BLACK))
+
+            # startup is not charged to the move time
+            winner = asyncio.run(arena.play_game_async(engines["slow"], random_player, move_time=0.3, max_moves=4))
+            self.assertIsNone(winner)
+            # a side that never moves loses on time, one that exits loses by EOF
+            self.assertEqual(asyncio.run(arena.play_game_async(engines["hang"], random_player, move_time=0.3)),
+                             hasamiShogi.WHITE)
+            moves = []
+            game = hasamiShogi.HasamiShogi()
+            pair = {hasamiShogi.BLACK: arena.AsyncProcessEngine(random_player.split()),
+                    hasamiShogi.WHITE: arena.AsyncProcessEngine(engines["die"].split())}
+
+            async def referee():
+                try:
+                    return await arena._play_async(game, pair, 5, 10, None, moves=moves)
+                finally:
+                    for eng in pair.values():
+                        await eng.close()
+            self.assertEqual(asyncio.run(referee()), (hasamiShogi.BLACK, "EOF: engine exited"))
+            self.assertEqual(len(moves), 1)
+            # an engine that does not start aborts the game instead of losing it
+            startup_timeout, arena.STARTUP_TIMEOUT = arena.STARTUP_TIMEOUT, 0.3
+            try:
+                results = asyncio.run(arena.run_games_async(random_player, engines["mute"], 2, move_time=1))
+            finally:
+                arena.STARTUP_TIMEOUT = startup_timeout
+            self.assertEqual(results["error"], 2)
+            self.assertEqual(results[hasamiShogi.BLACK] + results[hasamiShogi.WHITE] + results[None], 0)
+            self.assertEqual(asyncio.run(arena.play_game_async(random_player, os.path.join(tmp, "missing"))),
+                             "error")
+            results = asyncio.run(arena.run_games_async(random_player, random_player, 2, move_time=5, max_moves=10))
+            self.assertEqual(sum(results.values()), 2)
+            self.assertEqual(results["error"], 0)
+
+    def test_itoh_ponder(self):
+        root = os.path.dirname(os.path.abspath(__file__))
+        itoh = arena.load_player(os.path.join(root, "players", "Itoh.py"))
+        # run its stdin/stdout loop on a pipe, so its globals can be looked at
+        read_fd, write_fd = os.pipe()
+        replies = queue.Queue()
+        itoh.sys = types.SimpleNamespace(stdin=os.fdopen(read_fd), stderr=sys.stderr)
+        itoh.print = lambda *args, **kwargs: replies.put(" ".join(map(str, args)))
+        engine = threading.Thread(target=itoh.main, daemon=True)
+        engine.start()
+        commands = os.fdopen(write_fd, "w")
+
+        def send(*lines):
+            commands.write("".join(line + "\n" for line in lines))
+            commands.flush()
+
+        def play(move):
+            """Send White's move (None for Black's first) and return Itoh's info line."""
+            start = time.perf_counter()
+            send("TIME 1500 1500 0", "Black" if move is None else "".join(map(str, move)))
+            if move is not None:
+                game.apply_move(*move, hasamiShogi.WHITE)
+            info = arena.parse_info(replies.get(timeout=10))
+            reply = arena.parse_moves(replies.get(timeout=10))
+            # the search gets 0.05s, so pondering stopped as soon as the move came in
+            self.assertLess(time.perf_counter() - start, 1.0)
+            self.assertIn(reply, game.generate_legal_moves(hasamiShogi.BLACK))
+            game.apply_move(*reply, hasamiShogi.BLACK)
+            return info
+
+        def white_move(predicted, depth=1):
+            """A legal White move that is (or is not) the one Itoh is pondering
+            on, once pondering has finished depth."""
+            children = {}
+            for move in game.generate_legal_moves(hasamiShogi.WHITE):
+                game.push_move(*move, hasamiShogi.WHITE)
+                children[game.zobrist] = move
+                game.pop_move()
+            deadline = time.perf_counter() + 10
+            while time.perf_counter() < deadline:
+                time.sleep(0.1)
+                pondered = itoh.pondered
+                # until the new search stores something, pondered is the last move's
+                if pondered is not None and pondered[0] in children and pondered[1] >= depth:
+                    if predicted:
+                        return children[pondered[0]], pondered[1]
+                    return next(move for key, move in children.items() if key != pondered[0]), pondered[1]
+            self.fail("Itoh did not ponder")
+
+        try:
+            send("OK?")
+            self.assertEqual(arena.parse_hello(replies.get(timeout=10)),
+                             ("ImprovedStrongAI", {"clock", "ponder", "opening"}))
+            send("PONDER")
+            game = hasamiShogi.HasamiShogi()
+            play(None)
+            # a hit resumes from the depth pondering reached; 0.05s of
+            # search on its own only gets to depth 2
+            move, depth = white_move(predicted=True, depth=3)
+            self.assertGreaterEqual(play(move)["depth"], depth)
+            # a miss throws the pondering away and searches afresh
+            play(white_move(predicted=False)[0])
+            send("GAME_OVER DRAW")
+            send("NEW_GAME")
+            self.assertEqual(replies.get(timeout=10), "READY")
+            # aborted searches never store their ABORTED value
+            self.assertTrue(itoh.transposition_table)
+            self.assertTrue(all(entry.value is not itoh.ABORTED for entry in itoh.transposition_table.values()))
+        finally:
+            commands.close()
+            engine.join(10)
+        self.assertFalse(engine.is_alive())
+
+    def test_engine_pool(self):
+        root = os.path.dirname(os.path.abspath(__file__))
+        random_player = f"{sys.executable} {os.path.join(root, 'randomPlayer.py')}"
+        opponent = f"inproc:{os.path.join(root, 'randomPlayer.py')}"
+        pool = arena.EnginePool()
+        try:
+            # a process that answers NEW_GAME with READY plays the next game too
+            arena.run_arena(random_player, opponent, max_moves=10, headless=True, pool=pool)
+            [engine] = pool.idle[random_player]
+            pid = engine.p.pid
+            arena.run_arena(random_player, opponent, max_moves=10, headless=True, pool=pool)
+            self.assertEqual([eng.p.pid for eng in pool.idle[random_player]], [pid])
+            self.assertIsNone(engine.p.poll())
+
+            # one that plays a game but never answers READY is killed and replaced
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "noReady.py")
+                with open(path, "w") as f:
+                    f.write(f"import sys, time\nsys.path.insert(0, {root!r})\nimport randomPlayer\n"
+                            "randomPlayer.play_game()\nsys.stdin.readline()\ntime.sleep(60)\n")
+                no_ready = f"{sys.executable} {path}"
+                arena.run_arena(no_ready, opponent, max_moves=10, headless=True, pool=pool)
+                [stale] = pool.idle[no_ready]
+                arena.run_arena(no_ready, opponent, max_moves=10, headless=True, pool=pool)
+                [fresh] = pool.idle[no_ready]
+                self.assertIsNot(fresh, stale)
+                self.assertIsNotNone(stale.p.wait(5))
+                self.assertIsNone(fresh.p.poll())
+        finally:
+            pool.close()
+
+    def test_clock(self):
+        self.assertEqual(arena.parse_time_control("60+0.5"), (60.0, 0.5))
+        self.assertEqual(arena.parse_time_control("30"), (30.0, 0.0))
+        self.assertEqual(arena.parse_hello("Itoh clock ponder"), ("Itoh", {"clock", "ponder"}))
+        self.assertEqual(arena.parse_hello("Random"), ("Random", set()))
+        self.assertEqual(arena.parse_hello("clock"), ("clock", set()))
+        clock = arena.Clock(1, 0.5)
+        self.assertTrue(clock.punch(hasamiShogi.BLACK, 0.25))
+        self.assertEqual(clock.line(hasamiShogi.BLACK), "TIME 1250 1000 500")
+        self.assertEqual(clock.line(hasamiShogi.WHITE), "TIME 1000 1250 500")
+        self.assertFalse(clock.punch(hasamiShogi.WHITE, 1.5))
+
+    def test_move_stats(self):
+        self.assertEqual(arena.parse_info("info depth 6 nodes 120000"), {"depth": 6, "nodes": 120000})
+        self.assertEqual(arena.parse_info("info string hello depth x"), {})
+        self.assertEqual(arena.percentile(list(range(1, 101)), 90), 90)
+        moves = [{"ply": i + 1, "color": hasamiShogi.BLACK if i % 2 == 0 else hasamiShogi.WHITE,
+                  "move": "0011", "ms": float(10 * (i + 1))} for i in range(10)]
+        moves[0].update(depth=3, nodes=500)
+        moves[2].update(depth=5, nodes=1500)
+        record = arena.game_record({hasamiShogi.BLACK: "A", hasamiShogi.WHITE: "B"}, None, moves)
+        black = record["stats"][hasamiShogi.BLACK]
+        self.assertEqual((black["moves"], black["total_s"], black["p50_ms"], black["max_ms"]), (5, 0.25, 50.0, 90.0))
+        self.assertEqual((black["nodes"], black["max_depth"], black["mean_depth"]), (2000, 5, 4.0))
+        self.assertNotIn("nodes", record["stats"][hasamiShogi.WHITE])
+        self.assertEqual(record["plies"], 10)
+
+    def test_sprt(self):
+        root = os.path.dirname(os.path.abspath(__file__))
+        self.assertEqual(sprt.expected_score(0), 0.5)
+        self.assertAlmostEqual(sprt.elo_from_score(sprt.expected_score(100)), 100)
+        rng = random.Random(7)
+        opening = sprt.random_opening(rng, 4)
+        self.assertEqual(opening, sprt.random_opening(random.Random(7), 4))
+        self.assertEqual(len(opening), 4)
+        # both sides start from the opening, and Black moves first after it
+        arena.run_arena("inproc:randomPlayer.py", "inproc:randomPlayer.py", max_moves=1, headless=True,
+                        opening=opening)
+        self.assertEqual(["".join(map(str, m)) for m in arena.arena.history[:4]], opening)
+        self.assertEqual(len(arena.arena.history), 6)   # Black's first move, then max_moves=1
+        # an engine without OPENING is refused, and killed rather than pooled mid-game
+        pool = arena.EnginePool()
+        with self.assertRaises(ValueError):
+            arena.run_arena("inproc:randomPlayer.py", f"{sys.executable} {os.path.join(root, 'randomPlayer.py')}",
+                            headless=True, pool=pool, opening=opening)
+        self.assertEqual(pool.idle, {})
+        test = sprt.SPRT(0, 20)
+        self.assertIsNone(test.verdict())
+        for _ in range(200):
+            test.add([1, 0.5])
+        self.assertEqual(test.verdict(), "H1")
+        self.assertGreater(test.elo()[0], 100)
+        test = sprt.SPRT(0, 20)
+        for _ in range(200):
+            test.add([0.5, 0.5] if rng.random() < 0.5 else [1, 0])
+        self.assertEqual(test.verdict(), "H0")
+        self.assertEqual(sum(test.games), 400)
+        self.assertEqual(test.games[0], test.games[2])
+
+    def test_tournament(self):
+        root = os.path.dirname(os.path.abspath(__file__))
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, "players", "Kumon", "build"))
+            for path, mode in (("randomPlayer.py", 0o644), (os.path.join("players", "Sato.py"), 0o644),
+                               (os.path.join("players", "Kumon", "run.sh"), 0o755),
+                               (os.path.join("players", "Kumon", "build", "kumon"), 0o755)):
+                with open(os.path.join(tmp, path), "w"):
+                    pass
+                os.chmod(os.path.join(tmp, path), mode)
+            engines = tournament.discover_engines(tmp)
+            self.assertEqual(engines, {
+                "randomPlayer": f"{sys.executable} {os.path.join(tmp, 'randomPlayer.py')}",
+                "Sato": f"{sys.executable} {os.path.join(tmp, 'players', 'Sato.py')}",
+                "Kumon": os.path.join(tmp, "players", "Kumon", "build", "kumon"),
+            })
+            self.assertEqual(tournament.discover_engines(tmp, in_process=True)["Sato"],
+                             f"inproc:{os.path.join(tmp, 'players', 'Sato.py')}")
+
+        games = tournament.schedule(["a", "b", "c"], rounds=2)
+        self.assertEqual(len(games), 12)
+        for a, b in (("a", "b"), ("b", "a"), ("a", "c"), ("c", "b")):
+            self.assertEqual(games.count((a, b)), 2)
+        results = [("a", "b", hasamiShogi.BLACK), ("b", "a", None), ("a", "c", hasamiShogi.WHITE),
+                   ("c", "b", "error")]
+        self.assertEqual(tournament.crosstable(["a", "b", "c"], results),
+                         {"a": {"b": 1.5, "c": 0.0}, "b": {"a": 0.5, "c": 0.0}, "c": {"a": 1.0, "b": 0.0}})
+
+        player = f"inproc:{os.path.join(root, 'randomPlayer.py')}"
+        black, white, winner, record = tournament.play_game(("A", player, "B", player, 10,
+                                                             hasamiShogi.HasamiShogi, None, False))
+        self.assertEqual((black, white, record["black"], record["white"]), ("A", "B", "A", "B"))
+        self.assertIn(winner, (hasamiShogi.BLACK, hasamiShogi.WHITE, None))
+        self.assertEqual(tournament.play_game(("A", player, "B", os.path.join(root, "missing"), 10,
+                                               hasamiShogi.HasamiShogi, None, False))[2], "error")
+        table = tournament.run_tournament({"A": player, "B": player, "C": player}, rounds=1, workers=2, max_moves=10)
+        # six games, one point each
+        self.assertEqual(sum(sum(row.values()) for row in table.values()), 6)
+
+    def test_perft(self):
+        for game_cls in perft.BACKENDS.values():
+            for name, (_, _, _, counts) in perft.POSITIONS.items():
+                g = perft.load_position(name, game_cls)
+                before = g.serialize()
+                for depth in (1, 2):
+                    self.assertEqual(perft.perft(g, depth), counts[depth], (game_cls.__name__, name, depth))
+                rows = perft.divide(g, 2)
+                self.assertEqual(sum(n for _, n in rows), counts[2])
+                self.assertEqual([m for m, _ in rows], g.generate_legal_moves(g.turn))
+                self.assertEqual(g.serialize(), before)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+"""Perft: count move paths from a position to check and benchmark an engine.
+
+Usage:
+    python perft.py [--bitboard] [--position NAME] [--depth N] [--divide]
+    python perft.py [--bitboard] --verify [--depth N]
+
+Perft walks every legal move sequence of the given length with
+generate_legal_moves/push_move/pop_move and counts the leaves. Positions
+where the game is already over are not expanded. The counts in POSITIONS
+were produced by the original list-of-lists engine, so any backend that
+agrees with them plays by the same rules.
+"""
+import argparse
+import sys
+import time
+import hasamiShogi
+import hasamiBitboard
+
+BACKENDS = {
+    "list": hasamiShogi.HasamiShogi,
+    "bitboard": hasamiBitboard.BitboardHasamiShogi,
+}
+
+# name -> (board rows, side to move, captures, {depth: expected nodes})
+POSITIONS = {
+    "start": (
+        ["BBBBBBBBB",
+         ".........",
+         ".........",
+         ".........",
+         ".........",
+         ".........",
+         ".........",
+         ".........",
+         "WWWWWWWWW"],
+        hasamiShogi.BLACK, {},
+        {1: 63, 2: 3717, 3: 254219, 4: 16565783},
+    ),
+    "middlegame": (
+        ["B.B......",
+         "W........",
+         "...B...W.",
+         "......B.B",
+         ".........",
+         ".......BW",
+         "..B......",
+         "..W.W...W",
+         "..W.BW..."],
+        hasamiShogi.BLACK, {hasamiShogi.BLACK: 1, hasamiShogi.WHITE: 1},
+        {1: 71, 2: 4135, 3: 299565, 4: 17861030},
+    ),
+    "corner": (
+        ["WWWB.WB.W",
+         ".BB...B.B",
+         ".........",
+         ".........",
+         "......B..",
+         ".........",
+         "B........",
+         ".........",
+         "........."],
+        hasamiShogi.BLACK, {},
+        {1: 71, 2: 1183, 3: 86060, 4: 2121994},
+    ),
+    "victory": (
+        [".BBB....B",
+         ".........",
+         ".........",
+         ".......B.",
+         "....BBBW.",
+         "B........",
+         ".........",
+         ".........",
+         "WWWWWWW.W"],
+        hasamiShogi.WHITE, {},
+        {1: 46, 2: 3859, 3: 201107, 4: 16683865},
+    ),
+    "endgame": (
+        [".BB..BBB.",
+         "W...B....",
+         ".........",
+         ".........",
+         ".........",
+         "B........",
+         "W........",
+         "........W",
+         "..WWWWWW."],
+        hasamiShogi.WHITE, {hasamiShogi.WHITE: 2},
+        {1: 78, 2: 5024, 3: 387241, 4: 25079595},
+    ),
+}
+
+
+def load_position(name, game_cls=hasamiShogi.HasamiShogi):
+    board, turn, captures, _ = POSITIONS[name]
+    game = game_cls()
+    game.set_board(board)
+    game.captures.update(captures)
+    game.turn = turn
+    game.zobrist = game.compute_zobrist()
+    return game
+
+
+def perft(game, depth):
+    if depth == 0:
+        return 1
+    if game.is_game_over() is not None:
+        return 0
+    me = game.turn
+    moves = game.generate_legal_moves(me)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        game.push_move(*move, me)
+        nodes += perft(game, depth - 1)
+        game.pop_move()
+    return nodes
+
+
+def divide(game, depth):
+    """Return [(move, nodes)] for every root move, in generation order."""
+    if depth < 1 or game.is_game_over() is not None:
+        return []
+    me = game.turn
+    result = []
+    for move in game.generate_legal_moves(me):
+        game.push_move(*move, me)
+        result.append((move, perft(game, depth - 1)))
+        game.pop_move()
+    return result
+
+
+def timed_perft(game, depth):
+    start = time.perf_counter()
+    nodes = perft(game, depth)
+    return nodes, time.perf_counter() - start
+
+
+def format_move(move):
+    return "".join(map(str, move))
+
+
+def report(name, depth, nodes, elapsed):
+    expected = POSITIONS[name][3].get(depth) if name in POSITIONS else None
+    status = "" if expected is None else ("  ok" if nodes == expected else f"  MISMATCH (expected {expected})")
+    nps = nodes / elapsed if elapsed > 0 else 0
+    print(f"{name:<12} depth {depth}  nodes {nodes:>10}  {elapsed:8.3f}s  {nps:>12,.0f} nodes/s{status}")
+    return expected is None or nodes == expected
+
+
+def verify(game_cls, max_depth=None):
+    ok = True
+    total_nodes, total_time = 0, 0.0
+    for name, (_, _, _, counts) in POSITIONS.items():
+        for depth in sorted(counts):
+            if max_depth is not None and depth > max_depth:
+                continue
+            nodes, elapsed = timed_perft(load_position(name, game_cls), depth)
+            ok = report(name, depth, nodes, elapsed) and ok
+            total_nodes += nodes
+            total_time += elapsed
+    print(f"total {total_nodes} nodes in {total_time:.3f}s, {total_nodes / total_time:,.0f} nodes/s")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft for the Hasami Shogi rules engine.")
+    parser.add_argument("--bitboard", action="store_true", help="use hasamiBitboard.BitboardHasamiShogi")
+    parser.add_argument("--position", default="start", choices=sorted(POSITIONS))
+    parser.add_argument("--depth", type=int, help="search depth (default 3; with --verify, the deepest count to check)")
+    parser.add_argument("--divide", action="store_true", help="print the node count under each root move")
+    parser.add_argument("--verify", action="store_true", help="check every stored node count")
+    args = parser.parse_args(argv)
+    game_cls = BACKENDS["bitboard" if args.bitboard else "list"]
+
+    if args.verify:
+        return 0 if verify(game_cls, args.depth) else 1
+
+    if args.depth is None:
+        args.depth = 3
+    game = load_position(args.position, game_cls)
+    start = time.perf_counter()
+    if args.divide:
+        rows = divide(game, args.depth)
+        for move, nodes in rows:
+            print(f"{format_move(move)}: {nodes}")
+        nodes = sum(n for _, n in rows) if args.depth > 0 else 1
+    else:
+        nodes = perft(game, args.depth)
+    elapsed = time.perf_counter() - start
+    return 0 if report(args.position, args.depth, nodes, elapsed) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,12 +2,14 @@
 import sys
 import time
 import math
-import copy
 import random
+import threading
 import hasamiShogi
 
 # 設定
 MAX_TIME = 28.0
+# 時計付きの対局（TIME 行を受け取る場合）は MAX_TIME を毎手 allot_time() で決め直す
+MAX_TIME_CAP = MAX_TIME
 INF = 999999
 BOARD_SIZE = 9
 CENTER = [(4,4),(4,3),(4,5),(3,4),(5,4)]
@@ -18,7 +20,16 @@ killer_moves = [[] for _ in range(15)]
 history_table = {}
 last_moves = []
 turn_count = 0
-seen_states_count = {}
+
+# 先読み（ポンダー）: arena から PONDER が来た対局では、相手の手番のあいだ予想手の後の局面を裏で読む
+pondering = False
+stop_search = False   # True にすると探索がすぐに打ち切られる（置換表にも書き込まない）
+ABORTED = None        # 打ち切られた探索が返す評価値。受け取った側も評価せずにそのまま返す
+pondered = None       # 先読みで読み切った (局面のハッシュ, 深さ, 最善手)。当たれば choose_best_move がその続きから読む
+
+# 直前の choose_best_move の統計（手の前に "info depth N nodes M" 行として arena に送る）
+search_depth = 0   # 最後に読み切った深さ
+search_nodes = 0   # 訪れた局面数
 
 class TranspositionEntry:
     def __init__(self, value, depth, flag, best_move=None):
@@ -28,53 +39,47 @@ class TranspositionEntry:
         self.best_move = best_move
 
 def zobrist_hash(game):
-    """簡易ゾブリストハッシュ"""
-    hash_val = 0
-    for r in range(BOARD_SIZE):
-        for c in range(BOARD_SIZE):
-            piece = game.board[r][c]
-            if piece != hasamiShogi.EMPTY:
-                hash_val ^= hash((r, c, piece, game.captures[hasamiShogi.BLACK], game.captures[hasamiShogi.WHITE]))
-    return hash_val
-
-def board_hash_with_turn(game, turn_color):
-    """盤面＋手番を含めたハッシュ"""
-    return (tuple(tuple(row) for row in game.board), turn_color)
+    """ゾブリストハッシュ（エンジンが差分更新しているキーをそのまま使う）"""
+    return game.zobrist
 
 def can_recover_within_depth(game, my_color, depth):
     """depth手以内に駒を取れるならTrue"""
     if depth <= 0:
         return False
-    opp = hasamiShogi.BLACK if my_color == hasamiShogi.WHITE else hasamiShogi.WHITE
-    my_moves = game.generate_legal_moves(my_color)
-    for (r1, c1, r2, c2) in my_moves:
-        g2 = copy.deepcopy(game)
+    # 今すぐ取れる手があるかは、エンジンの脅威マップを引くだけで分かる
+    if game.capture_threats(my_color):
+        return True
+    if depth == 1:
+        return False
+    for (r1, c1, r2, c2) in game.generate_legal_moves(my_color):
         try:
-            g2.apply_move(r1, c1, r2, c2, my_color)
-            gain = g2.captures[my_color] - game.captures[my_color]
-            loss = g2.captures[opp] - game.captures[opp]
-            net_gain = gain - loss
-            if net_gain > 0:
-                return True
-            if can_recover_within_depth(g2, my_color, depth - 1):
-                return True
+            game.push_move(r1, c1, r2, c2, my_color)
         except:
             continue
+        try:
+            if can_recover_within_depth(game, my_color, depth - 1):
+                return True
+        finally:
+            game.pop_move()
     return False
 
+def capture_moves(game, color):
+    """colorが駒を取れる手（脅威マップから組み立てる）"""
+    return [(r1, c1, r2, c2)
+            for (r2, c2), origins in game.capture_threats(color).items()
+            for r1, c1 in origins]
+
 def will_be_captured_and_not_recoverable(game, my_color, max_depth=2):
     """相手が取ったあと、max_depth手以内に取り返せないならTrue"""
     opp = hasamiShogi.BLACK if my_color == hasamiShogi.WHITE else hasamiShogi.WHITE
-    opp_moves = game.generate_legal_moves(opp)
-    for (r1, c1, r2, c2) in opp_moves:
-        g2 = copy.deepcopy(game)
+    # 相手の取る手だけを脅威マップから取り出して調べる
+    for move in capture_moves(game, opp):
+        game.push_move(*move, opp)
         try:
-            g2.apply_move(r1, c1, r2, c2, opp)
-            if g2.captures[opp] > game.captures[opp]:
-                if not can_recover_within_depth(g2, my_color, max_depth):
-                    return True
-        except:
-            continue
+            if not can_recover_within_depth(game, my_color, max_depth):
+                return True
+        finally:
+            game.pop_move()
     return False
 
 def evaluate_position(game, my_color, prev_caps=None, depth_from_root=0):
@@ -100,9 +105,9 @@ def evaluate_position(game, my_color, prev_caps=None, depth_from_root=0):
             base_score -= 3
 
     # モビリティ（合法手数差）
+    # 手数はエンジンが差分更新しているので、手を生成せずに数だけ引く
+    base_score += (game.mobility(my_color) - game.mobility(opp)) * 0.5
     my_moves = game.generate_legal_moves(my_color)
-    opp_moves = game.generate_legal_moves(opp)
-    base_score += (len(my_moves) - len(opp_moves)) * 0.5
 
     # 進展性ボーナス
     progress_bonus = 0
@@ -126,11 +131,9 @@ def evaluate_position(game, my_color, prev_caps=None, depth_from_root=0):
 
     # 捕獲可能性ボーナス
     cap_moves = 0
-    for (r1, c1, r2, c2) in my_moves:
-        g2 = copy.deepcopy(game)
+    for move in my_moves:
         try:
-            g2.apply_move(r1, c1, r2, c2, my_color)
-            if g2.captures[my_color] > game.captures[my_color]:
+            if game.captures_for(move, my_color) > 0:
                 cap_moves += 1
         except:
             continue
@@ -156,17 +159,15 @@ def evaluate_position(game, my_color, prev_caps=None, depth_from_root=0):
         if not can_recover_within_depth(game, my_color, 2):
             base_score -= 25
     else:
-        opp_moves = game.generate_legal_moves(opp)
-        for (r1, c1, r2, c2) in opp_moves:
-            g2 = copy.deepcopy(game)
+        for move in capture_moves(game, opp):
+            game.push_move(*move, opp)
             try:
-                g2.apply_move(r1, c1, r2, c2, opp)
-                if g2.captures[opp] > game.captures[opp]:
-                    if can_recover_within_depth(g2, my_color, 1):
-                        base_score -= 8
-                        break
-            except:
-                continue
+                recoverable = can_recover_within_depth(game, my_color, 1)
+            finally:
+                game.pop_move()
+            if recoverable:
+                base_score -= 8
+                break
 
     # 往復運動ペナルティ
     if len(last_moves) >= 4:
@@ -179,8 +180,7 @@ def evaluate_position(game, my_color, prev_caps=None, depth_from_root=0):
         base_score += capture_diff * 200
 
     # 千日手ペナルティ
-    state = board_hash_with_turn(game, my_color)
-    if seen_states_count.get(state, 0) >= 2:
+    if game.repetition_count() >= 3:
         base_score -= 50
 
     return base_score
@@ -194,7 +194,8 @@ def order_moves(game, moves, my_color, depth):
     
     for move in moves:
         score = 0
-        r1, c1, r2, c2 = move
+        # 手は整数（hasamiShogi.encode_move）で受け取り、必要な所だけタプルに戻す
+        r1, c1, r2, c2 = hasamiShogi.MOVE_TUPLES[move]
         
         # キラームーブ
         if depth < len(killer_moves) and move in killer_moves[depth]:
@@ -204,12 +205,9 @@ def order_moves(game, moves, my_color, depth):
         if move in history_table:
             score += history_table[move]
         
-        # 捕獲手
-        game_copy = copy.deepcopy(game)
-        old_captures = game_copy.captures[my_color]
+        # 捕獲手（盤面をコピーせずに捕獲数だけ調べる）
         try:
-            game_copy.apply_move(r1, c1, r2, c2, my_color)
-            captured = game_copy.captures[my_color] - old_captures
+            captured = game.captures_for((r1, c1, r2, c2), my_color)
             score += captured * 100000
         except:
             continue
@@ -235,9 +233,14 @@ def order_moves(game, moves, my_color, depth):
 
 def alpha_beta_search(game, depth, alpha, beta, maximizing_player, my_color, start_time, original_depth=0):
     """改良されたアルファベータ探索"""
-    global transposition_table
+    global transposition_table, search_nodes
+    search_nodes += 1
+    
+    # 先読みの中止: 評価もせずにすぐ戻る（相手の手が届いた後の時間は自分の持ち時間から引かれる）
+    if stop_search:
+        return ABORTED, None
     
-    # 時間切れチェック
+    # 時間切れチェック（ポンダー中は start_time が無限大なので stop_search だけで止まる）
     if time.time() - start_time > MAX_TIME * 0.95:
         return evaluate_position(game, my_color), None
     
@@ -266,7 +269,8 @@ def alpha_beta_search(game, depth, alpha, beta, maximizing_player, my_color, sta
     # 手の生成
     current_player = my_color if maximizing_player else (
         hasamiShogi.BLACK if my_color == hasamiShogi.WHITE else hasamiShogi.WHITE)
-    moves = game.generate_legal_moves(current_player)
+    # 探索中の手は整数で扱う（キラームーブ・履歴・置換表のキーも整数）
+    moves = game.generate_legal_move_codes(current_player)
     
     if not moves:
         return evaluate_position(game, my_color, None, original_depth), None
@@ -277,7 +281,7 @@ def alpha_beta_search(game, depth, alpha, beta, maximizing_player, my_color, sta
         tt_best_move = transposition_table[board_hash].best_move
     
     # 手順並び替え
-    if tt_best_move and tt_best_move in moves:
+    if tt_best_move is not None and tt_best_move in moves:
         moves.remove(tt_best_move)
         moves.insert(0, tt_best_move)
     else:
@@ -289,40 +293,42 @@ def alpha_beta_search(game, depth, alpha, beta, maximizing_player, my_color, sta
     for i, move in enumerate(moves):
         # Late Move Reduction
         reduction = 0
-        if depth >= 3 and i >= 4:
-            game_copy = copy.deepcopy(game)
-            try:
-                old_cap = game_copy.captures[current_player]
-                game_copy.apply_move(*move, current_player)
-                if game_copy.captures[current_player] == old_cap:  # 捕獲しない手
-                    reduction = 1
-            except:
-                continue
         
-        # 手を適用
-        game_copy = copy.deepcopy(game)
+        # 手を適用（コピーせずに同じ盤面で進めて、探索後に戻す）
         try:
             prev_caps = (game.captures[my_color], game.captures[hasamiShogi.BLACK if my_color == hasamiShogi.WHITE else hasamiShogi.WHITE])
-            game_copy.apply_move(*move, current_player)
+            old_cap = game.captures[current_player]
+            game.push_move(*hasamiShogi.MOVE_TUPLES[move], current_player)
         except:
             continue
         
-        # 再帰探索
-        search_depth = depth - 1 - reduction
-        value, _ = alpha_beta_search(
-            game_copy, search_depth, alpha, beta, not maximizing_player, 
-            my_color, start_time, original_depth
-        )
-        
-        # LMRで削減した場合の再探索
-        if reduction > 0 and (
-            (maximizing_player and value > alpha) or 
-            (not maximizing_player and value < beta)
-        ):
+        try:
+            if depth >= 3 and i >= 4:
+                if game.captures[current_player] == old_cap:  # 捕獲しない手
+                    reduction = 1
+            
+            # 再帰探索
+            search_depth = depth - 1 - reduction
             value, _ = alpha_beta_search(
-                game_copy, depth - 1, alpha, beta, not maximizing_player, 
+                game, search_depth, alpha, beta, not maximizing_player, 
                 my_color, start_time, original_depth
             )
+            
+            # LMRで削減した場合の再探索
+            if value is not ABORTED and reduction > 0 and (
+                (maximizing_player and value > alpha) or 
+                (not maximizing_player and value < beta)
+            ):
+                value, _ = alpha_beta_search(
+                    game, depth - 1, alpha, beta, not maximizing_player, 
+                    my_color, start_time, original_depth
+                )
+        finally:
+            game.pop_move()
+        
+        # 打ち切られたら残りの手は読まず、キラー・履歴・置換表も更新しない
+        if value is ABORTED:
+            return ABORTED, None
         
         # 最善手更新
         if maximizing_player:
@@ -369,7 +375,9 @@ def update_killer_and_history(move, depth, original_depth):
 
 def choose_best_move(game, my_color):
     """反復深化探索でベストムーブを選択"""
+    global search_depth, search_nodes
     start_time = time.time()
+    search_depth = search_nodes = 0
     best_move = None
     depth = 1
     
@@ -378,6 +386,14 @@ def choose_best_move(game, my_color):
     if legal_moves:
         best_move = legal_moves[0]
     
+    # 先読みが当たっていれば、読み切った深さの次から始める
+    if pondered is not None and pondered[0] == zobrist_hash(game):
+        _, done_depth, move = pondered
+        if move in game.generate_legal_move_codes(my_color):
+            best_move = hasamiShogi.decode_move(move)
+            search_depth = done_depth
+            depth = done_depth + 1
+    
     try:
         while depth <= 15 and time.time() - start_time < MAX_TIME * 0.85:
             value, move = alpha_beta_search(
@@ -385,7 +401,8 @@ def choose_best_move(game, my_color):
             )
             
             if move is not None:
-                best_move = move
+                best_move = hasamiShogi.decode_move(move)
+                search_depth = depth
             
             elapsed = time.time() - start_time
             if elapsed > MAX_TIME * 0.7:
@@ -398,23 +415,101 @@ def choose_best_move(game, my_color):
     
     return best_move
 
+def allot_time(my_ms, opp_ms, inc_ms):
+    """持ち時間から1手に使う秒数を決める（残りの1/30＋加算の8割、MAX_TIME_CAP が上限）"""
+    budget = my_ms / 1000 / 30 + inc_ms / 1000 * 0.8
+    return max(0.05, min(MAX_TIME_CAP, budget, my_ms / 1000 * 0.5))
+
+def read_command():
+    """次の行を読む。TIME 行（自分・相手の残り時間と加算、ミリ秒）は MAX_TIME の更新に、
+    PONDER 行は先読みの有効化に使って読み飛ばす"""
+    global MAX_TIME, pondering
+    while True:
+        line = sys.stdin.readline().strip()
+        if line == "PONDER":
+            pondering = True
+        elif line.startswith("TIME"):
+            MAX_TIME = allot_time(*map(int, line.split()[1:]))
+        else:
+            return line
+
+def predicted_reply(game, my_color, opp):
+    """相手の予想手（整数）。置換表に自分の探索で読んだ応手があればそれを、なければ浅く読んで決める"""
+    if game.is_game_over() is not None:
+        return None
+    moves = game.generate_legal_move_codes(opp)
+    entry = transposition_table.get(zobrist_hash(game))
+    if entry is not None and entry.best_move in moves:
+        return entry.best_move
+    _, move = alpha_beta_search(game, 2, -INF, INF, False, my_color, math.inf, 2)
+    return move if move in moves else None
+
+def ponder(game, my_color, opp):
+    """予想手を指した後の局面を、stop_search が立つまで反復深化で読む。
+    読み切った深さと最善手は pondered に残るので、予想が当たれば次の choose_best_move はその続きから始まる"""
+    global turn_count, pondered
+    pondered = None
+    move = predicted_reply(game, my_color, opp)
+    if move is None:
+        return
+    game.push_move(*hasamiShogi.MOVE_TUPLES[move], opp)
+    turn_count += 1
+    try:
+        depth = 1
+        while depth <= 15:
+            value, best = alpha_beta_search(game, depth, -INF, INF, True, my_color, math.inf, depth)
+            if value is ABORTED:
+                break
+            if best is not None:
+                pondered = (zobrist_hash(game), depth, best)
+            depth += 1
+    finally:
+        turn_count -= 1
+        game.pop_move()
+
+def read_command_pondering(game, my_color, opp):
+    """相手の手を待つあいだ裏で先読みする。戻り値は read_command() と同じ"""
+    global stop_search
+    # stdin を待つあいだは GIL が解放されるので、探索スレッドはそのまま走る
+    thread = threading.Thread(target=ponder, args=(game, my_color, opp), daemon=True)
+    thread.start()
+    try:
+        return read_command()
+    finally:
+        stop_search = True
+        thread.join()
+        stop_search = False
+
 def main():
-    global transposition_table, killer_moves, history_table, seen_states_count, turn_count, last_moves
+    global transposition_table, killer_moves, history_table
     
-    # 初期化
+    # 初期化（置換表・キラー手・ヒストリーは NEW_GAME をまたいで使い回す）
     transposition_table = {}
     killer_moves = [[] for _ in range(15)]
     history_table = {}
-    seen_states_count = {}
+    
+    while True:
+        play_game()
+        # GAME_OVER の後に NEW_GAME が来れば、同じプロセスのまま次の対局へ
+        if sys.stdin.readline().strip() != "NEW_GAME":
+            break
+        print("READY", flush=True)
+
+def play_game():
+    global turn_count, last_moves, pondering, pondered
+    
+    # 対局ごとの初期化
     turn_count = 0
     last_moves = []
+    pondering = False
+    pondered = None
     
     # エンジン初期化
     line = sys.stdin.readline().strip()
     if not line.startswith("OK"):
         print("Expected 'OK?'", file=sys.stderr)
         return
-    print("ImprovedStrongAI", flush=True)
+    print("ImprovedStrongAI clock ponder opening", flush=True)  # clock: TIME 行を受け取る、ponder: 先読みできる、opening: 指定局面から始められる
     
     # 色の決定
     my_color = None
@@ -422,7 +517,13 @@ def main():
     game = hasamiShogi.HasamiShogi()
     skip_input = True
     
-    line = sys.stdin.readline().strip()
+    line = read_command()
+    # 開始局面の指定（OPENING 手1 手2 ...、黒から交互に偶数手）があれば盤面を進めておく
+    if line.startswith("OPENING"):
+        for move in line.split()[1:]:
+            game.apply_move(*map(int, move), game.turn)
+            turn_count += 1
+        line = read_command()
     if line.startswith("Black"):
         my_color = hasamiShogi.BLACK
         opp = hasamiShogi.WHITE
@@ -435,7 +536,7 @@ def main():
     # メインループ
     while True:
         if not skip_input:
-            line = sys.stdin.readline().strip()
+            line = read_command_pondering(game, my_color, opp) if pondering else read_command()
             if line.startswith("GAME_OVER"):
                 break
             
@@ -443,10 +544,6 @@ def main():
                 r1, c1, r2, c2 = map(int, line)
                 game.apply_move(r1, c1, r2, c2, opp)
                 turn_count += 1
-                
-                # 相手手適用後に局面記録
-                state = board_hash_with_turn(game, my_color)
-                seen_states_count[state] = seen_states_count.get(state, 0) + 1
             except:
                 break
         
@@ -468,10 +565,7 @@ def main():
             if len(last_moves) > 4:
                 last_moves.pop(0)
             
-            # 自分手適用後に局面記録
-            state = board_hash_with_turn(game, my_color)
-            seen_states_count[state] = seen_states_count.get(state, 0) + 1
-            
+            print(f"info depth {search_depth} nodes {search_nodes}")
             print(f"{r1}{c1}{r2}{c2}", flush=True)
         except:
             print("0000", flush=True)
@@ -42,7 +42,13 @@ void run_ai() {
             init_game(&game, WHITE);
 
         } else if (strncmp(line, "GAME_OVER", 9) == 0) {
-            break;
+            // 終了せずに待つ: NEW_GAME が来れば次の対局、入力が閉じれば終了
+            continue;
+
+        } else if (strcmp(line, "NEW_GAME") == 0) {
+            // 盤面は次の Black / White で初期化される
+            printf("READY\n");
+            fflush(stdout);
 
         } else if (strlen(line) == 4 && strspn(line, "0123456789") == 4) {
             Move opp_move;
@@ -3,7 +3,6 @@
 import sys
 import random
 import hasamiShogi
-import copy
 
 # 定数
 BOARD_SIZE = 9
@@ -22,28 +21,25 @@ def evaluate_board(board_obj, my_color, opp_color):
 
     # 2. 駒の安全性の評価
     threatened_pieces = 0
-    for r in range(BOARD_SIZE):
-        for c in range(BOARD_SIZE):
-            if board[r][c] == my_color:
-                for dr, dc in DIRECTIONS:
-                    r1, c1 = r - dr, c - dc
-                    r2, c2 = r + dr, c + dc
-                    if 0 <= r1 < BOARD_SIZE and 0 <= c1 < BOARD_SIZE and \
-                       0 <= r2 < BOARD_SIZE and 0 <= c2 < BOARD_SIZE:
-                        if board[r1][c1] == opp_color and board[r2][c2] == opp_color:
-                            threatened_pieces += 1
+    # 盤面全体ではなく、エンジンが持っている自分の駒の位置だけを調べる
+    for r, c in board_obj.pieces[my_color]:
+        for dr, dc in DIRECTIONS:
+            r1, c1 = r - dr, c - dc
+            r2, c2 = r + dr, c + dc
+            if 0 <= r1 < BOARD_SIZE and 0 <= c1 < BOARD_SIZE and \
+               0 <= r2 < BOARD_SIZE and 0 <= c2 < BOARD_SIZE:
+                if board[r1][c1] == opp_color and board[r2][c2] == opp_color:
+                    threatened_pieces += 1
     score -= threatened_pieces * 100
 
     # 3. 中央支配の評価
     center_score = 0
-    for r in range(BOARD_SIZE):
-        for c in range(BOARD_SIZE):
-            if board[r][c] == my_color:
-                distance_to_center = abs(r - 4) + abs(c - 4)
-                center_score += (10 - distance_to_center)
-            elif board[r][c] == opp_color:
-                distance_to_center = abs(r - 4) + abs(c - 4)
-                center_score -= (10 - distance_to_center)
+    for r, c in board_obj.pieces[my_color]:
+        distance_to_center = abs(r - 4) + abs(c - 4)
+        center_score += (10 - distance_to_center)
+    for r, c in board_obj.pieces[opp_color]:
+        distance_to_center = abs(r - 4) + abs(c - 4)
+        center_score -= (10 - distance_to_center)
     score += center_score * 5
 
     return score
@@ -55,33 +51,34 @@ def minimax(board_obj, depth, is_maximizing, alpha, beta, my_color, opp_color):
 
     if is_maximizing:
         max_eval = -sys.maxsize
-        legal_moves = board_obj.generate_legal_moves(my_color)
-        if not legal_moves:
-            return -1000000 
-        
-        for move in legal_moves:
-            temp_board_obj = copy.deepcopy(board_obj)
-            temp_board_obj.apply_move(*move, my_color)
-            eval = minimax(temp_board_obj, depth - 1, False, alpha, beta, my_color, opp_color)
+        # 合法手は必要な分だけ生成する（捕獲手から先に読む）
+        has_move = False
+        for move in board_obj.iter_legal_moves(my_color, captures_first=True):
+            has_move = True
+            board_obj.push_move(*move, my_color)
+            eval = minimax(board_obj, depth - 1, False, alpha, beta, my_color, opp_color)
+            board_obj.pop_move()
             max_eval = max(max_eval, eval)
             alpha = max(alpha, eval)
             if beta <= alpha:
                 break
+        if not has_move:
+            return -1000000
         return max_eval
     else:
         min_eval = sys.maxsize
-        legal_moves = board_obj.generate_legal_moves(opp_color)
-        if not legal_moves:
-            return 1000000
-
-        for move in legal_moves:
-            temp_board_obj = copy.deepcopy(board_obj)
-            temp_board_obj.apply_move(*move, opp_color)
-            eval = minimax(temp_board_obj, depth - 1, True, alpha, beta, my_color, opp_color)
+        has_move = False
+        for move in board_obj.iter_legal_moves(opp_color, captures_first=True):
+            has_move = True
+            board_obj.push_move(*move, opp_color)
+            eval = minimax(board_obj, depth - 1, True, alpha, beta, my_color, opp_color)
+            board_obj.pop_move()
             min_eval = min(min_eval, eval)
             beta = min(beta, eval)
             if beta <= alpha:
                 break
+        if not has_move:
+            return 1000000
         return min_eval
 
 def find_best_move(board_obj, my_color, opp_color, depth=3):
@@ -95,10 +92,9 @@ def find_best_move(board_obj, my_color, opp_color, depth=3):
     random.shuffle(legal_moves)
     
     for move in legal_moves:
-        temp_board_obj = copy.deepcopy(board_obj)
-        temp_board_obj.apply_move(*move, my_color)
-        
-        eval = minimax(temp_board_obj, depth - 1, False, -sys.maxsize, sys.maxsize, my_color, opp_color)
+        board_obj.push_move(*move, my_color)
+        eval = minimax(board_obj, depth - 1, False, -sys.maxsize, sys.maxsize, my_color, opp_color)
+        board_obj.pop_move()
         
         if eval > best_eval:
             best_eval = eval
@@ -107,6 +103,15 @@ def find_best_move(board_obj, my_color, opp_color, depth=3):
     return best_move
 
 def main():
+    while True:
+        play_game()
+        # After GAME_OVER the arena may keep this process for another game
+        if sys.stdin.readline().strip() != "NEW_GAME":
+            break
+        sys.stderr.write("[StrongAI] Received NEW_GAME. Starting another game.\n")
+        print("READY", flush=True)
+
+def play_game():
     def log(message):
         sys.stderr.write(f"[StrongAI] {message}\n")
         sys.stderr.flush()
@@ -175,7 +180,7 @@ def main():
                 break
     
             if line.startswith("GAME_OVER"):
-                log("Received GAME_OVER. Exiting.")
+                log("Received GAME_OVER. Waiting for NEW_GAME or exit.")
                 break
 
             try:
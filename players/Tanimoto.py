@@ -4,56 +4,47 @@ import copy
 import hasamiShogi
 
 MAX_TIME = 1.0  # テスト用に短く（動作確認後に30.0に戻す）
+# 時計付きの対局（TIME 行を受け取る場合）は MAX_TIME を毎手 allot_time() で決め直す
+MAX_TIME_CAP = 30.0
 INF = 10**9
 CENTER = [(4,4),(4,3),(4,5),(3,4),(5,4)]
 last_moves = []  # 履歴保存（最大4手くらい）
 turn_count = 0   # 手数カウンター
 
-# 局面の出現回数を記録
-seen_states_count = {}
-
-def board_hash_with_turn(game, turn_color):
-    """盤面＋手番を含めたハッシュ（同じ盤面でも手番が違えば別扱い）"""
-    return (tuple(tuple(row) for row in game.board), turn_color)
-
-# --- 局面繰り返し検出用 ---
-seen_states = set()
-
-def board_hash(game):
-    """盤面をタプル化してハッシュ可能にする"""
-    return tuple(tuple(row) for row in game.board)
-
 def can_recover_within_depth(game, my_color, depth):
     """depth手以内に駒を取れるならTrue"""
     if depth <= 0:
         return False
-    opp = hasamiShogi.BLACK if my_color == hasamiShogi.WHITE else hasamiShogi.WHITE
-    my_moves = game.generate_legal_moves(my_color)
-    for (r1, c1, r2, c2) in my_moves:
-        g2 = copy.deepcopy(game)
-        g2.apply_move(r1, c1, r2, c2, my_color)
-        # 取れたら即OK
-        gain = g2.captures[my_color] - game.captures[my_color]
-        loss = g2.captures[opp] - game.captures[opp]
-        net_gain = gain - loss
-        if net_gain > 0:  # 有利交換のみOK
-            return True
-        # まだなら深さを減らして再帰
-        if can_recover_within_depth(g2, my_color, depth - 1):
+    # 今すぐ取れる手があるかは、エンジンの脅威マップを引くだけで分かる
+    if game.capture_threats(my_color):
+        return True
+    if depth == 1:
+        return False
+    # まだなら1手進めて、深さを減らして再帰
+    for mv in game.generate_legal_moves(my_color):
+        game.push_move(*mv, my_color)
+        found = can_recover_within_depth(game, my_color, depth - 1)
+        game.pop_move()
+        if found:
             return True
     return False
 
+def capture_moves(game, color):
+    """colorが駒を取れる手（脅威マップから組み立てる）"""
+    return [(r1, c1, r2, c2)
+            for (r2, c2), origins in game.capture_threats(color).items()
+            for r1, c1 in origins]
+
 def will_be_captured_and_not_recoverable(game, my_color, max_depth=2):
     """相手が取ったあと、max_depth手以内に取り返せないならTrue"""
     opp = hasamiShogi.BLACK if my_color == hasamiShogi.WHITE else hasamiShogi.WHITE
-    opp_moves = game.generate_legal_moves(opp)
-    for (r1, c1, r2, c2) in opp_moves:
-        g2 = copy.deepcopy(game)
-        g2.apply_move(r1, c1, r2, c2, opp)
-        if g2.captures[opp] > game.captures[opp]:
-            # 相手が取った後、自分が回収できるか
-            if not can_recover_within_depth(g2, my_color, max_depth):
-                return True
+    # 相手の取る手だけを脅威マップから取り出して調べる
+    for mv in capture_moves(game, opp):
+        game.push_move(*mv, opp)
+        recoverable = can_recover_within_depth(game, my_color, max_depth)
+        game.pop_move()
+        if not recoverable:
+            return True
     return False
 
 
@@ -79,9 +70,9 @@ def evaluate(game, my_color, prev_caps=None, depth_from_root=0):
             base_score -= 3
 
     # モビリティ（合法手数差）
+    # 手数はエンジンが差分更新しているので、手を生成せずに数だけ引く
+    base_score += (game.mobility(my_color) - game.mobility(opp)) * 0.5
     my_moves = game.generate_legal_moves(my_color)
-    opp_moves = game.generate_legal_moves(opp)
-    base_score += (len(my_moves) - len(opp_moves)) * 0.5
 
     # --- 進展性ボーナス ---
     progress_bonus = 0
@@ -108,10 +99,9 @@ def evaluate(game, my_color, prev_caps=None, depth_from_root=0):
 
     # --- 捕獲可能性ボーナス ---
     cap_moves = 0
-    for (r1, c1, r2, c2) in my_moves:
-        g2 = copy.deepcopy(game)  # ゲーム全体をコピー
-        g2.apply_move(r1, c1, r2, c2, my_color)
-        if g2.captures[my_color] > game.captures[my_color]:
+    for mv in my_moves:
+        # ゲームをコピーせず、捕獲数だけを調べる
+        if game.captures_for(mv, my_color) > 0:
             cap_moves += 1
 
     # --- 交換価値評価 ---
@@ -142,14 +132,13 @@ def evaluate(game, my_color, prev_caps=None, depth_from_root=0):
     else:
         # 取り返せる場合（交換）でも頻発は抑える
         opp = hasamiShogi.BLACK if my_color == hasamiShogi.WHITE else hasamiShogi.WHITE
-        opp_moves = game.generate_legal_moves(opp)
-        for (r1, c1, r2, c2) in opp_moves:
-            g2 = copy.deepcopy(game)
-            g2.apply_move(r1, c1, r2, c2, opp)
-            if g2.captures[opp] > game.captures[opp]:
-                if can_recover_within_depth(g2, my_color, 1):
-                    base_score -= 8  # 小さなマイナス
-                    break
+        for mv in capture_moves(game, opp):
+            game.push_move(*mv, opp)
+            recoverable = can_recover_within_depth(game, my_color, 1)
+            game.pop_move()
+            if recoverable:
+                base_score -= 8  # 小さなマイナス
+                break
 
 
     # 往復運動ペナルティ
@@ -164,8 +153,8 @@ def evaluate(game, my_color, prev_caps=None, depth_from_root=0):
         base_score += capture_diff * 200
 
     # --- 千日手（同一局面繰り返し）ペナルティ ---
-    state = board_hash_with_turn(game, my_color)
-    if seen_states_count.get(state, 0) >= 2:  # 3回目以降の出現
+    # 局面の出現回数はエンジンが数えている（探索中の手順も含む）
+    if game.repetition_count() >= 3:  # 3回目以降の出現
         base_score -= 50
 
     return base_score
@@ -173,16 +162,15 @@ def evaluate(game, my_color, prev_caps=None, depth_from_root=0):
 def order_moves(game, moves, my_color):
     scored = []
     for mv in moves:
-        g2 = copy.deepcopy(game)
-        g2.apply_move(*mv, my_color)
-
-        cap_gain = g2.captures[my_color] - game.captures[my_color]
+        cap_gain = game.captures_for(mv, my_color)
         center_bonus = -abs(4 - mv[2]) - abs(4 - mv[3])
 
         # 並び替え用の軽い危険度判定（探索深度で詳細に評価される）
         danger_penalty = 0
-        if will_be_captured_and_not_recoverable(g2, my_color, max_depth=1):
+        game.push_move(*mv, my_color)
+        if will_be_captured_and_not_recoverable(game, my_color, max_depth=1):
             danger_penalty = -10  # 並び替え用なので軽め
+        game.pop_move()
 
         scored.append((cap_gain*10 + center_bonus + danger_penalty, mv))
 
@@ -211,19 +199,17 @@ def minimax(game, depth, alpha, beta, maximizing, my_color, start_time, prev_cap
     if maximizing:
         value = -INF
         for mv in moves:
-            g2 = hasamiShogi.HasamiShogi()
-            g2.board = [row[:] for row in game.board]
-            g2.captures = game.captures.copy()
-            g2.turn = game.turn
-            g2.apply_move(*mv, player)
-
             opp_color = hasamiShogi.BLACK if player == hasamiShogi.WHITE else hasamiShogi.WHITE
+            prev_caps = (game.captures[my_color], game.captures[opp_color])
 
+            # 盤面をコピーせず、その場で指して探索後に戻す
+            game.push_move(*mv, player)
             eval_val, _ = minimax(
-                g2, depth-1, alpha, beta, False, my_color, start_time,
-                prev_caps=(game.captures[my_color], game.captures[opp_color]),
+                game, depth-1, alpha, beta, False, my_color, start_time,
+                prev_caps=prev_caps,
                 depth_from_root=depth_from_root + 1
             )
+            game.pop_move()
 
             if eval_val > value:
                 value = eval_val
@@ -235,19 +221,17 @@ def minimax(game, depth, alpha, beta, maximizing, my_color, start_time, prev_cap
     else:
         value = INF
         for mv in moves:
-            g2 = hasamiShogi.HasamiShogi()
-            g2.board = [row[:] for row in game.board]
-            g2.captures = game.captures.copy()
-            g2.turn = game.turn
-            g2.apply_move(*mv, player)
-
             opp_color = hasamiShogi.BLACK if player == hasamiShogi.WHITE else hasamiShogi.WHITE
+            prev_caps = (game.captures[my_color], game.captures[opp_color])
 
+            # 盤面をコピーせず、その場で指して探索後に戻す
+            game.push_move(*mv, player)
             eval_val, _ = minimax(
-                g2, depth-1, alpha, beta, True, my_color, start_time,
-                prev_caps=(game.captures[my_color], game.captures[opp_color]),
+                game, depth-1, alpha, beta, True, my_color, start_time,
+                prev_caps=prev_caps,
                 depth_from_root=depth_from_root + 1
             )
+            game.pop_move()
 
             if eval_val < value:
                 value = eval_val
@@ -286,14 +270,40 @@ def choose_best_move(game, my_color):
 
     return best_move
 
+def allot_time(my_ms, opp_ms, inc_ms):
+    """持ち時間から1手に使う秒数を決める（残りの1/30＋加算の8割、MAX_TIME_CAP が上限）"""
+    budget = my_ms / 1000 / 30 + inc_ms / 1000 * 0.8
+    return max(0.05, min(MAX_TIME_CAP, budget, my_ms / 1000 * 0.5))
+
+def read_command():
+    """次の行を読む。TIME 行（自分・相手の残り時間と加算、ミリ秒）は MAX_TIME の更新に使って読み飛ばす"""
+    global MAX_TIME
+    while True:
+        line = sys.stdin.readline().strip()
+        if not line.startswith("TIME"):
+            return line
+        MAX_TIME = allot_time(*map(int, line.split()[1:]))
+
 def main():
-    global seen_states_count, turn_count
+    while True:
+        play_game()
+        # GAME_OVER の後に NEW_GAME が来れば、同じプロセスのまま次の対局へ
+        if sys.stdin.readline().strip() != "NEW_GAME":
+            break
+        print("READY", flush=True)
+
+def play_game():
+    global turn_count
+    # 対局ごとに手数と履歴をリセット
+    turn_count = 0
+    last_moves.clear()
+
     # 最初のOK? 受信
     line = sys.stdin.readline().strip()
     if not line.startswith("OK"):
         print("Expected 'OK?'", file=sys.stderr)
         return
-    print("StrongestAI", flush=True)
+    print("StrongestAI clock opening", flush=True)  # "clock": 毎手 TIME 行を送ってもらう、"opening": 指定局面から始められる
 
     # 色の受信
     my_color = None
@@ -301,11 +311,13 @@ def main():
     game = hasamiShogi.HasamiShogi()
     skip_input = True
 
-    # --- 追加: 局面出現回数記録用 ---
-    global seen_states_count
-    seen_states_count = {}
-
-    line = sys.stdin.readline().strip()
+    line = read_command()
+    # 開始局面の指定（OPENING 手1 手2 ...、黒から交互に偶数手）があれば盤面を進めておく
+    if line.startswith("OPENING"):
+        for move in line.split()[1:]:
+            game.apply_move(*map(int, move), game.turn)
+            turn_count += 1
+        line = read_command()
     if line.startswith("Black"):
         my_color = hasamiShogi.BLACK
         opp = hasamiShogi.WHITE
@@ -318,7 +330,7 @@ def main():
     # 対局ループ
     while True:
         if not skip_input:
-            line = sys.stdin.readline().strip()
+            line = read_command()
             if line.startswith("GAME_OVER"):
                 break
             r1,c1,r2,c2 = map(int, line)
@@ -326,10 +338,6 @@ def main():
 
             turn_count += 1     # 手数カウンターを増やす
 
-            # 相手手適用後に局面記録
-            state = board_hash_with_turn(game, my_color)
-            seen_states_count[state] = seen_states_count.get(state, 0) + 1
-
         move = choose_best_move(game, my_color)
         if move is None:
             print("0000", flush=True)
@@ -344,10 +352,6 @@ def main():
             if len(last_moves) > 4:
                 last_moves.pop(0)
 
-            # 自分手適用後に局面記録
-            state = board_hash_with_turn(game, my_color)
-            seen_states_count[state] = seen_states_count.get(state, 0) + 1
-
             print(f"{r1}{c1}{r2}{c2}", flush=True)
 
         skip_input = False
@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
 import sys
-import copy
 import math
 import traceback
 import hasamiShogi
@@ -26,27 +25,6 @@ class AlphaBetaAI:
     # AIが何手先まで読むかを設定する。大きいほど強くなるが、思考時間が増加する。
     SEARCH_DEPTH = 2
 
-    # --- 初期化 ---
-    def __init__(self):
-        """
-        AIのインスタンスが作成されたときに一度だけ呼ばれる。
-        """
-        # 過去の盤面を記憶し、千日手（無意味な手の繰り返し）を防ぐための履歴セット
-        self.history = set()
-
-    # --- 内部メソッド ---
-    def _get_board_tuple(self, board):
-        """
-        盤面を表すリストを、ハッシュ可能（setに追加可能）なタプルに変換する。
-        """
-        return tuple(map(tuple, board))
-
-    def update_history(self, board):
-        """
-        現在の盤面を履歴に追加する。
-        """
-        self.history.add(self._get_board_tuple(board))
-
     # --- メインの思考メソッド ---
     def choose_move(self, game):
         """
@@ -55,10 +33,8 @@ class AlphaBetaAI:
         best_move, best_value = None, -math.inf
         my_color = game.turn
 
-        # ▼▼▼【重要】バグ対策：盤面を破壊する可能性のある generate_legal_moves を
-        # 「使い捨てのコピー」に対して実行し、オリジナルの 'game' オブジェクトを守る。
-        game_copy_for_move_gen = copy.deepcopy(game)
-        legal_moves = game_copy_for_move_gen.generate_legal_moves(my_color)
+        # generate_legal_moves は盤面を書き換えないので、コピーせずにそのまま呼ぶ
+        legal_moves = game.generate_legal_moves(my_color)
         
         # 指せる手がなければ None を返す
         if not legal_moves:
@@ -66,20 +42,19 @@ class AlphaBetaAI:
 
         # --- 全ての合法手ループで評価 ---
         for move in legal_moves:
-            # シミュレーションのために、現在の盤面のコピーを作成
-            next_state = copy.deepcopy(game)
-            # その手で盤面を進めてみる
-            next_state.apply_move(*move, my_color)
+            # その手で盤面を進めてみる（コピーせずに指し、評価後に戻す）
+            game.push_move(*move, my_color)
             
             # 千日手防止ロジック
             repetition_penalty = 0
-            board_tuple = self._get_board_tuple(next_state.board)
-            # もし移動後の盤面が過去に出現したものであれば、大きなペナルティを課す
-            if board_tuple in self.history:
+            # もし移動後の局面が過去に出現したものであれば、大きなペナルティを課す
+            # （出現回数はエンジンが数えているので、自前の履歴は持たない）
+            if game.repetition_count() > 1:
                 repetition_penalty = -200000 
 
             # その盤面の評価値をアルファベータ探索で計算
-            move_value = self.alpha_beta(next_state, self.SEARCH_DEPTH - 1, -math.inf, math.inf, False, my_color)
+            move_value = self.alpha_beta(game, self.SEARCH_DEPTH - 1, -math.inf, math.inf, False, my_color)
+            game.pop_move()
             # 千日手ペナルティを評価値に加算
             move_value += repetition_penalty
 
@@ -109,35 +84,40 @@ class AlphaBetaAI:
 
         current_player = node.turn
         
-        node_copy = copy.deepcopy(node)
-        moves = node_copy.generate_legal_moves(current_player)
-
-        if not moves:
-            return self.evaluate_board(node, my_color)
+        # 合法手は必要な分だけ生成する（捕獲手を先に試して、カットを早める）
+        moves = node.iter_legal_moves(current_player, captures_first=True)
+        has_move = False
 
         # AI自身の手番（評価値を最大化したい）
         if is_maximizing_player:
             max_eval = -math.inf
             for move in moves:
-                child_node = copy.deepcopy(node)
-                child_node.apply_move(*move, current_player)
-                eval_score = self.alpha_beta(child_node, depth - 1, alpha, beta, False, my_color)
+                has_move = True
+                node.push_move(*move, current_player)
+                eval_score = self.alpha_beta(node, depth - 1, alpha, beta, False, my_color)
+                node.pop_move()
                 max_eval = max(max_eval, eval_score)
                 alpha = max(alpha, eval_score)
                 # ベータカット：相手がこの枝を選ぶことはないと分かったので探索を打ち切る
                 if beta <= alpha: break
+            # 指せる手がなければ、その盤面の評価値を返す
+            if not has_move:
+                return self.evaluate_board(node, my_color)
             return max_eval
         # 相手の手番（評価値を最小化したい）
         else:
             min_eval = math.inf
             for move in moves:
-                child_node = copy.deepcopy(node)
-                child_node.apply_move(*move, current_player)
-                eval_score = self.alpha_beta(child_node, depth - 1, alpha, beta, True, my_color)
+                has_move = True
+                node.push_move(*move, current_player)
+                eval_score = self.alpha_beta(node, depth - 1, alpha, beta, True, my_color)
+                node.pop_move()
                 min_eval = min(min_eval, eval_score)
                 beta = min(beta, eval_score)
                 # アルファカット：自分がこの枝を選ぶことはないと分かったので探索を打ち切る
                 if beta <= alpha: break
+            if not has_move:
+                return self.evaluate_board(node, my_color)
             return min_eval
 
     # --- 盤面評価関数 ---
@@ -162,23 +142,22 @@ class AlphaBetaAI:
         my_connectivity_score = 0
         opp_connectivity_score = 0
         
-        for r in range(hasamiShogi.BOARD_SIZE):
-            for c in range(hasamiShogi.BOARD_SIZE):
-                piece = game.board[r][c]
-                if piece == my_color:
-                    # 3. 駒の前進度（相手陣地に近いほど高評価）
-                    my_positional_score += r if my_color == hasamiShogi.BLACK else (hasamiShogi.BOARD_SIZE - 1 - r)
-                    
-                    # 4. 駒の連結性（味方の駒が隣接しているほど高評価）
-                    for dr, dc in [(0, 1), (1, 0), (-1, 0), (0, -1)]:
-                        if game.in_bounds(r + dr, c + dc) and game.board[r + dr][c + dc] == my_color:
-                            my_connectivity_score += 1
-
-                elif piece == opp_color:
-                    opp_positional_score += r if opp_color == hasamiShogi.BLACK else (hasamiShogi.BOARD_SIZE - 1 - r)
-                    for dr, dc in [(0, 1), (1, 0), (-1, 0), (0, -1)]:
-                        if game.in_bounds(r + dr, c + dc) and game.board[r + dr][c + dc] == opp_color:
-                            opp_connectivity_score += 1
+        # 盤面全体を走査せず、エンジンが持っている各色の駒の位置だけを見る
+        board = game.board
+        for r, c in game.pieces[my_color]:
+            # 3. 駒の前進度（相手陣地に近いほど高評価）
+            my_positional_score += r if my_color == hasamiShogi.BLACK else (hasamiShogi.BOARD_SIZE - 1 - r)
+            
+            # 4. 駒の連結性（味方の駒が隣接しているほど高評価）
+            for nr, nc in hasamiShogi.NEIGHBOURS[r][c]:
+                if board[nr][nc] == my_color:
+                    my_connectivity_score += 1
+
+        for r, c in game.pieces[opp_color]:
+            opp_positional_score += r if opp_color == hasamiShogi.BLACK else (hasamiShogi.BOARD_SIZE - 1 - r)
+            for nr, nc in hasamiShogi.NEIGHBOURS[r][c]:
+                if board[nr][nc] == opp_color:
+                    opp_connectivity_score += 1
         
         # 各評価値を重み付けして最終スコアに合算
         score += (my_positional_score - opp_positional_score) * 10
@@ -199,11 +178,20 @@ def main():
     """
     プログラム実行時に最初に呼ばれるメイン関数。
     """
-    # ゲームとAIのインスタンスを生成
-    game = hasamiShogi.HasamiShogi()
+    # AIのインスタンスは対局をまたいで使い回す
     ai = AlphaBetaAI()
-    # 初期盤面を履歴に登録
-    ai.update_history(game.board)
+    while True:
+        play_game(ai)
+        # GAME_OVER の後に NEW_GAME が来れば、同じプロセスのまま次の対局へ
+        if sys.stdin.readline().strip() != "NEW_GAME":
+            break
+        print("READY", flush=True)
+
+def play_game(ai):
+    """
+    1局分の対局を行う。GAME_OVER を受け取るか、入力が尽きたら戻る。
+    """
+    game = hasamiShogi.HasamiShogi()
 
     # --- アリーナとのハンドシェイク ---
     sys.stdin.readline() # アリーナからの "OK?" を待つ
@@ -219,7 +207,6 @@ def main():
         my_move = ai.choose_move(game)
         if my_move:
             game.apply_move(*my_move, my_color)
-            ai.update_history(game.board)
             print(f"{my_move[0]}{my_move[1]}{my_move[2]}{my_move[3]}", flush=True)
 
     # --- メインの対局ループ ---
@@ -228,17 +215,15 @@ def main():
         opp_move_str = sys.stdin.readline().strip()
         if not opp_move_str or opp_move_str.upper().startswith("GAME_OVER"): break
         try:
-            # 相手の手を盤面に適用し、履歴を更新
+            # 相手の手を盤面に適用する
             opp_move = parse_move(opp_move_str)
             game.apply_move(*opp_move, get_opponent(my_color))
-            ai.update_history(game.board)
         except Exception: break
 
-        # 自分の手を考え、適用し、出力する。履歴も更新。
+        # 自分の手を考え、適用し、出力する。
         my_move = ai.choose_move(game)
         if my_move:
             game.apply_move(*my_move, my_color)
-            ai.update_history(game.board)
             print(f"{my_move[0]}{my_move[1]}{my_move[2]}{my_move[3]}", flush=True)
         else: break
 
@@ -0,0 +1,234 @@
+"""Sequential probability ratio test (SPRT) between a baseline and a candidate engine.
+
+Usage:
+    python sprt.py [--elo0 0] [--elo1 5] [--alpha 0.05] [--beta 0.05] [--max-pairs N] [--workers N]
+                   [--opening-plies N] [--seed N] [--time BASE+INC] [--max-moves N] [--bitboard]
+                   BASELINE CANDIDATE
+
+BASELINE and CANDIDATE are arena engine specs, e.g. "python players/Itoh.py"
+or "inproc:players/Itoh.py MAX_TIME=0.5". Games are played in pairs from the
+same random opening with colors swapped, so an opening that favours one side
+cancels out. Both engines must support OPENING (see the README; every
+inproc: player does). After each pair the test compares
+
+    H0: candidate - baseline = elo0    against    H1: candidate - baseline = elo1
+
+and stops as soon as the log-likelihood ratio leaves [log(beta/(1-alpha)),
+log((1-beta)/alpha)]. The exit status is 0 if H1 is accepted (the candidate
+is better), 1 if H0 is accepted, and 2 if --max-pairs ran out first.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from multiprocessing import Pool
+import arena
+import hasamiShogi
+import hasamiBitboard
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# engines kept alive between the games a worker process plays (see arena.EnginePool)
+_engine_pool = None
+
+
+def random_opening(rng, plies=4, game_cls=hasamiShogi.HasamiShogi):
+    """An even number of random legal plies from the start position, as
+    move strings. Openings that capture or end the game are redrawn."""
+    while True:
+        game = game_cls()
+        moves = []
+        for _ in range(plies):
+            move = rng.choice(game.generate_legal_moves(game.turn))
+            game.apply_move(*move, game.turn)
+            moves.append("".join(map(str, move)))
+        if game.is_game_over() is None and not any(game.captures.values()):
+            return moves
+
+
+def supports_opening(spec):
+    """Start the engine just long enough to read its OK? reply."""
+    eng = arena.make_engine(spec, hasamiShogi.BLACK)
+    try:
+        eng.send("OK?")
+        arena.hello(eng, eng.recv())
+        return eng.opening
+    finally:
+        eng.close()
+
+
+def expected_score(elo):
+    """Expected score per game of a side that is elo points stronger."""
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def elo_from_score(score):
+    """Inverse of expected_score, clamped away from +-infinity."""
+    score = min(max(score, 1e-3), 1 - 1e-3)
+    return -400 * math.log10(1 / score - 1)
+
+
+class SPRT:
+    """Running state of the test.
+
+    Every pair is recorded as the candidate's points over its two games
+    (0, 0.5, ..., 2), i.e. the pentanomial model, so the correlation
+    between the two games of a pair is accounted for. The LLR uses the
+    usual normal approximation of the generalized SPRT:
+
+        LLR = N (s1 - s0) (2 s - s0 - s1) / (2 var)
+
+    where s is the mean score per game over N pairs and var the variance
+    of the per-pair score (as a fraction of the two games' points).
+    """
+    def __init__(self, elo0=0.0, elo1=5.0, alpha=0.05, beta=0.05):
+        self.elo0, self.elo1 = elo0, elo1
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self.pairs = [0] * 5    # how many pairs scored 0, 0.5, 1, 1.5, 2
+        self.games = [0, 0, 0]  # candidate losses, draws, wins
+
+    def add(self, results):
+        """Record a pair from the candidate's two game scores (0, 0.5 or 1 each)."""
+        self.pairs[int(sum(results) * 2)] += 1
+        for r in results:
+            self.games[int(r * 2)] += 1
+
+    def _mean_var(self):
+        n = sum(self.pairs)
+        mean = sum(k / 4 * c for k, c in enumerate(self.pairs)) / n
+        # half a pair at each extreme as a prior: an early run of identical
+        # pairs would otherwise have no variance and end the test at once
+        var = (sum((k / 4 - mean) ** 2 * c for k, c in enumerate(self.pairs))
+               + 0.5 * mean ** 2 + 0.5 * (1 - mean) ** 2) / (n + 1)
+        return n, mean, var
+
+    def llr(self):
+        if not sum(self.pairs):
+            return 0.0
+        n, mean, var = self._mean_var()
+        s0, s1 = expected_score(self.elo0), expected_score(self.elo1)
+        return n * (s1 - s0) * (2 * mean - s0 - s1) / (2 * var)
+
+    def elo(self):
+        """(estimate, half-width of the 95% interval) in Elo."""
+        if not sum(self.pairs):
+            return 0.0, math.inf
+        n, mean, var = self._mean_var()
+        margin = 1.96 * math.sqrt(var / n)
+        return elo_from_score(mean), (elo_from_score(mean + margin) - elo_from_score(mean - margin)) / 2
+
+    def verdict(self):
+        """'H1' (candidate is elo1 stronger), 'H0' (elo0), or None to keep playing."""
+        llr = self.llr()
+        if llr >= self.upper:
+            return "H1"
+        if llr <= self.lower:
+            return "H0"
+        return None
+
+    def status(self):
+        losses, draws, wins = self.games
+        elo, margin = self.elo()
+        return (f"{sum(self.pairs)} pairs: +{wins} ={draws} -{losses}  Elo {elo:+.1f} +-{margin:.1f}  "
+                f"LLR {self.llr():.2f} [{self.lower:.2f}, {self.upper:.2f}]")
+
+
+def play_pair(job):
+    """Play both colors from one opening; return the candidate's two scores,
+    or None if either game was aborted."""
+    global _engine_pool
+    baseline, candidate, opening, max_moves, game_cls, time_control = job
+    if _engine_pool is None:
+        _engine_pool = arena.EnginePool()
+    results = []
+    try:
+        for candidate_color in (hasamiShogi.BLACK, hasamiShogi.WHITE):
+            black, white = (candidate, baseline) if candidate_color == hasamiShogi.BLACK else (baseline, candidate)
+            winner = arena.run_arena(black, white, max_moves, game_cls, headless=True, pool=_engine_pool,
+                                     time_control=time_control, opening=opening)
+            results.append(0.5 if winner is None else float(winner == candidate_color))
+    except Exception as e:
+        print(f"pair from {' '.join(opening)}: aborted ({e!r})", file=sys.stderr)
+        return None
+    return results
+
+
+def run_sprt(baseline, candidate, elo0=0.0, elo1=5.0, alpha=0.05, beta=0.05, max_pairs=5000, workers=None,
+             opening_plies=4, seed=None, max_moves=500, game_cls=hasamiShogi.HasamiShogi, time_control=None):
+    """Play pairs until the test accepts H0 or H1 or max_pairs is reached.
+    Returns (verdict or None, SPRT)."""
+    test = SPRT(elo0, elo1, alpha, beta)
+    rng = random.Random(seed)
+    jobs = ((baseline, candidate, random_opening(rng, opening_plies, game_cls), max_moves, game_cls, time_control)
+            for _ in range(max_pairs))
+    # python players import hasamiShogi from the repository root
+    os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))
+    for spec in (baseline, candidate):
+        if not supports_opening(spec):
+            raise ValueError(f"{spec!r} does not support OPENING; run it as inproc: or add the feature")
+
+    start = time.perf_counter()
+    verdict = None
+    errors = 0
+    with Pool(workers) as pool:
+        # leaving the with block terminates the workers, so pairs still in
+        # flight when the test stops are simply dropped
+        for results in pool.imap_unordered(play_pair, jobs):
+            if results is None:
+                errors += 1
+                continue
+            test.add(results)
+            print(test.status(), flush=True)
+            verdict = test.verdict()
+            if verdict:
+                break
+    elapsed = time.perf_counter() - start
+
+    games = 2 * sum(test.pairs)
+    print(f"\n{games} games in {elapsed:.1f}s" + (f", {errors} pairs aborted" if errors else ""))
+    if verdict == "H1":
+        print(f"H1 accepted: the candidate is stronger (elo1 = {elo1:+g})")
+    elif verdict == "H0":
+        print(f"H0 accepted: the candidate is not stronger (elo0 = {elo0:+g})")
+    else:
+        print("No verdict: --max-pairs reached")
+    return verdict, test
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SPRT match between a baseline and a candidate Hasami Shogi engine.")
+    parser.add_argument("baseline", help='engine spec, e.g. "python players/Itoh.py" or "inproc:players/Itoh.py"')
+    parser.add_argument("candidate", help="engine spec of the changed engine")
+    parser.add_argument("--elo0", type=float, default=0.0, help="Elo difference under H0 (default 0)")
+    parser.add_argument("--elo1", type=float, default=5.0, help="Elo difference under H1 (default 5)")
+    parser.add_argument("--alpha", type=float, default=0.05, help="false positive rate (default 0.05)")
+    parser.add_argument("--beta", type=float, default=0.05, help="false negative rate (default 0.05)")
+    parser.add_argument("--max-pairs", type=int, default=5000, help="give up after this many pairs (default 5000)")
+    parser.add_argument("--workers", type=int, help="number of parallel pairs (default: one per CPU)")
+    parser.add_argument("--opening-plies", type=int, default=4, help="random plies per opening, even (default 4)")
+    parser.add_argument("--seed", type=int, help="seed for the openings, to replay a run")
+    parser.add_argument("--max-moves", type=int, default=500)
+    parser.add_argument("--bitboard", action="store_true", help="referee with hasamiBitboard.BitboardHasamiShogi")
+    parser.add_argument("--time", type=arena.parse_time_control, metavar="BASE+INC",
+                        help="clock per game in seconds plus increment per move, e.g. 10+0.1")
+    args = parser.parse_args(argv)
+    if args.opening_plies % 2:
+        parser.error("--opening-plies must be even, so Black is on move after the opening")
+    if args.elo1 <= args.elo0:
+        parser.error("--elo1 must be greater than --elo0")
+
+    game_cls = hasamiBitboard.BitboardHasamiShogi if args.bitboard else hasamiShogi.HasamiShogi
+    try:
+        verdict, _ = run_sprt(args.baseline, args.candidate, args.elo0, args.elo1, args.alpha, args.beta,
+                              args.max_pairs, args.workers, args.opening_plies, args.seed, args.max_moves,
+                              game_cls, args.time)
+    except ValueError as e:
+        parser.error(str(e))
+    return {"H1": 0, "H0": 1}.get(verdict, 2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
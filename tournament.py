@@ -0,0 +1,164 @@
+"""Round-robin tournament between every engine in the repository.
+
+Usage:
+    python tournament.py [--rounds N] [--workers N] [--engines NAME ...] [--bitboard] [--in-process]
+                         [--time BASE+INC] [--ponder] [--stats FILE.json|FILE.csv]
+
+Engines are discovered automatically: randomPlayer.py, every players/*.py,
+and any executable found under a players/ subdirectory (e.g. a compiled
+Kumon or Matsumoto build). Every pair plays N games with each color, all
+games run headless through arena.run_arena in a process pool, and the
+results are printed as a crosstable of points (win 1, draw 1/2). With
+--in-process, Python players run inside the worker (arena.InProcessEngine)
+instead of as subprocesses.
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+from multiprocessing import Pool
+import arena
+import hasamiShogi
+import hasamiBitboard
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# engines kept alive between the games a worker process plays (see arena.EnginePool)
+_engine_pool = None
+
+
+def discover_engines(root=ROOT, in_process=False):
+    """Return {name: command line} for every engine found under root."""
+    players_dir = os.path.join(root, "players")
+    engines = {}
+    scripts = [os.path.join(root, "randomPlayer.py")]
+    if os.path.isdir(players_dir):
+        scripts += [os.path.join(players_dir, f) for f in sorted(os.listdir(players_dir)) if f.endswith(".py")]
+    for path in scripts:
+        if os.path.isfile(path):
+            engines[os.path.splitext(os.path.basename(path))[0]] = (
+                f"inproc:{path}" if in_process else f"{sys.executable} {path}")
+
+    # compiled players: the first executable file in each players/<name>/ tree
+    if os.path.isdir(players_dir):
+        for name in sorted(os.listdir(players_dir)):
+            subdir = os.path.join(players_dir, name)
+            if not os.path.isdir(subdir) or name.startswith("__"):
+                continue
+            for dirpath, dirnames, filenames in os.walk(subdir):
+                dirnames.sort()
+                binary = next((os.path.join(dirpath, f) for f in sorted(filenames)
+                               if os.access(os.path.join(dirpath, f), os.X_OK)
+                               and not f.endswith((".py", ".sh"))), None)
+                if binary:
+                    engines[name] = binary
+                    break
+    return engines
+
+
+def schedule(names, rounds=1):
+    """Every ordered pair (black, white) `rounds` times, so colors are swapped."""
+    return [pair for _ in range(rounds) for pair in itertools.permutations(names, 2)]
+
+
+def play_game(job):
+    global _engine_pool
+    black, black_cmd, white, white_cmd, max_moves, game_cls, time_control, ponder = job
+    if _engine_pool is None:
+        _engine_pool = arena.EnginePool()
+    try:
+        winner = arena.run_arena(black_cmd, white_cmd, max_moves, game_cls, headless=True, pool=_engine_pool,
+                                 time_control=time_control, ponder=ponder)
+    except Exception as e:
+        print(f"{black} (B) vs {white} (W): aborted ({e!r})", file=sys.stderr)
+        return black, white, "error", None
+    # label the timing record with the tournament's engine names
+    record = dict(arena.last_record, black=black, white=white)
+    return black, white, winner, record
+
+
+def crosstable(names, results):
+    """Return {name: {opponent: points}} from (black, white, winner, ...) tuples."""
+    table = {a: {b: 0.0 for b in names if b != a} for a in names}
+    for black, white, winner, *_ in results:
+        if winner == "error":
+            continue
+        if winner is None:
+            table[black][white] += 0.5
+            table[white][black] += 0.5
+        elif winner == hasamiShogi.BLACK:
+            table[black][white] += 1
+        else:
+            table[white][black] += 1
+    return table
+
+
+def print_crosstable(names, table, games_per_pair):
+    order = sorted(names, key=lambda n: -sum(table[n].values()))
+    width = max(6, max(len(n) for n in names) + 1)
+    print(" " * width + "".join(f"{n[:width - 1]:>{width}}" for n in order) + f"{'Score':>{width}}")
+    for a in order:
+        cells = "".join(f"{'-' if a == b else f'{table[a][b]:g}':>{width}}" for b in order)
+        total = sum(table[a].values())
+        print(f"{a:<{width}}{cells}{total:>{width}g}/{games_per_pair * (len(names) - 1)}")
+
+
+def run_tournament(engines, rounds=1, workers=None, max_moves=500, game_cls=hasamiShogi.HasamiShogi,
+                   time_control=None, ponder=False, stats_file=None):
+    names = sorted(engines)
+    jobs = [(b, engines[b], w, engines[w], max_moves, game_cls, time_control, ponder)
+            for b, w in schedule(names, rounds)]
+    # python players import hasamiShogi from the repository root
+    os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))
+
+    start = time.perf_counter()
+    results = []
+    with Pool(workers) as pool:
+        # records are written here, not in the workers, so lines never interleave
+        for result in pool.imap_unordered(play_game, jobs):
+            results.append(result)
+            if stats_file and result[3]:
+                arena.write_stats(stats_file, result[3])
+    elapsed = time.perf_counter() - start
+
+    errors = sum(1 for r in results if r[2] == "error")
+    print(f"\n{len(jobs)} games in {elapsed:.1f}s ({len(jobs) / elapsed:.2f} games/s)"
+          + (f", {errors} aborted" if errors else ""))
+    table = crosstable(names, results)
+    print_crosstable(names, table, 2 * rounds)
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Round-robin tournament between Hasami Shogi engines.")
+    parser.add_argument("--rounds", type=int, default=1, help="games per pair with each color (default 1)")
+    parser.add_argument("--workers", type=int, help="number of parallel games (default: one per CPU)")
+    parser.add_argument("--max-moves", type=int, default=500)
+    parser.add_argument("--engines", nargs="+", metavar="NAME", help="only these engines")
+    parser.add_argument("--bitboard", action="store_true", help="referee with hasamiBitboard.BitboardHasamiShogi")
+    parser.add_argument("--in-process", action="store_true", help="run Python players inside the workers, without pipes")
+    parser.add_argument("--time", type=arena.parse_time_control, metavar="BASE+INC",
+                        help="clock per game in seconds plus increment per move, e.g. 60+0.5")
+    parser.add_argument("--ponder", action="store_true",
+                        help="let engines that support it think on the opponent's time (uses more CPU per game)")
+    parser.add_argument("--stats", metavar="FILE", help="append per-game move timings (JSON lines, or CSV for *.csv)")
+    args = parser.parse_args(argv)
+
+    engines = discover_engines(in_process=args.in_process)
+    if args.engines:
+        missing = set(args.engines) - set(engines)
+        if missing:
+            parser.error(f"unknown engines: {', '.join(sorted(missing))} (found: {', '.join(sorted(engines))})")
+        engines = {name: engines[name] for name in args.engines}
+    if len(engines) < 2:
+        parser.error("need at least two engines")
+
+    print("Engines: " + ", ".join(f"{name} [{cmd}]" for name, cmd in sorted(engines.items())))
+    game_cls = hasamiBitboard.BitboardHasamiShogi if args.bitboard else hasamiShogi.HasamiShogi
+    run_tournament(engines, args.rounds, args.workers, args.max_moves, game_cls, args.time, args.ponder, args.stats)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())